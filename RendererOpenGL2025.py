@@ -1,3 +1,5 @@
+import argparse
+
 import pygame
 import pygame.display
 from pygame.locals import *
@@ -6,11 +8,23 @@ from OpenGL.GL import glFlush, glGetError, glFinish, GL_NO_ERROR
 
 import glm
 
+from assetLoader import AssetLoader
+from frameTiming import FrameTimer
 from gl import Renderer
-from model import Model
+from texture import textures
 from vertexShader import *
 from fragmentShader import *
 
+parser = argparse.ArgumentParser(description = "OpenGL Renderer 2025")
+parser.add_argument("--fps", type = int, default = 60, help = "Límite de FPS")
+parser.add_argument("--uncapped", action = "store_true", help = "Sin límite de FPS (modo benchmark)")
+parser.add_argument("--debug-gl", action = "store_true", help = "glFinish y glGetError en cada frame")
+parser.add_argument("--compress-textures", action = "store_true", help = "Texturas comprimidas (DXT1) en la GPU")
+parser.add_argument("--compact-vertices", action = "store_true", help = "Vertices de 16 bytes (int16 / half / 2_10_10_10)")
+parser.add_argument("--optimize-mesh", action = "store_true", help = "Reordenar triangulos y vertices para la cache de vertices (al generar la cache)")
+parser.add_argument("--upload-budget", type = float, default = 4.0, help = "ms por frame para subir assets a la GPU")
+args = parser.parse_args()
+
 width = 960
 height = 540
 
@@ -25,8 +39,11 @@ pygame.init()
 screen = pygame.display.set_mode((width, height), pygame.DOUBLEBUF | pygame.OPENGL)
 pygame.display.set_caption("OpenGL Renderer 2025")
 clock = pygame.time.Clock()
+timer = FrameTimer(clock, maxFps = 0 if args.uncapped else args.fps)
 
-rend = Renderer(screen)
+rend = Renderer(screen, shaderCacheDir = ".shadercache")
+textures.compressed = args.compress_textures
+rend.timer = timer
 
 # Lighting setup - Luz más fuerte y mejor posicionada
 rend.pointLight = glm.vec3(5, 5, 10)  # Luz desde arriba y adelante
@@ -54,16 +71,14 @@ skyboxTextures = ["skybox/right.jpg",
                   "skybox/bottom.jpg", 
                   "skybox/front.jpg", 
                   "skybox/back.jpg"]
-rend.CreateSkybox(skyboxTextures)
-print("✓ Skybox cargado exitosamente!")
 
-# Load Porsche model
-try:
-    car = Model("models/Porsche_911_GT2.obj")
-    
-    # Cargar textura principal del auto
-    car.AddTexture("models/car/0000.BMP")
-    
+# Carga en segundo plano: la ventana dibuja desde el primer frame y los
+# assets aparecen cuando terminan de decodificarse y subirse a la GPU
+loader = AssetLoader(uploadBudget = args.upload_budget / 1000.0)
+loader.LoadSkybox(rend, skyboxTextures)
+
+
+def OnCarLoaded(car):
     # Ajustar posición y escala
     car.position = glm.vec3(0, -0.2, 0)
     car.rotation.y = 180  # Que mire hacia la cámara al iniciar
@@ -71,12 +86,14 @@ try:
     
     rend.scene.append(car)
     print("✓ Porsche 911 GT2 cargado exitosamente!")
-    print(f"  Triángulos del modelo: {car.vertexCount // 3}")
-    print("  Usa la rueda del mouse para hacer zoom")
-    print("  Presiona ESPACIO para auto-rotar")
-except Exception as e:
-    print(f"⚠ Error al cargar modelo: {e}")
-    print("  Verifica que el archivo existe en models/Porsche_911_GT2.obj")
+    print(f"  Triángulos del modelo: {car.indexCount // 3}")
+
+
+# Load Porsche model (con su textura principal)
+loader.LoadModel("models/Porsche_911_GT2.obj", ["models/car/0000.BMP"], onLoaded = OnCarLoaded, compact = args.compact_vertices,
+                 optimize = args.optimize_mesh)
+print("  Usa la rueda del mouse para hacer zoom")
+print("  Presiona ESPACIO para auto-rotar")
 
 # Time and value uniforms for shaders
 elapsedTime = 0.0
@@ -103,6 +120,7 @@ print("  Z/X - Decrease/Increase shader value parameter")
 print("  Left/Right Click - Rotate camera")
 print("  Mouse Wheel - Zoom in/out")
 print("  F - Toggle wireframe mode")
+print("  G - Toggle GPU pass timing")
 print("  SPACE - Auto-rotate camera")
 print("  ESC - Quit")
 print("=======================\n")
@@ -111,6 +129,10 @@ autoRotate = False
 
 while isRunning:
     
+    # Único punto de pacing del loop
+    deltaTime = timer.Tick()
+    elapsedTime += deltaTime
+    
     keys = pygame.key.get_pressed()
     mouseVel = pygame.mouse.get_rel()
     
@@ -168,6 +190,15 @@ while isRunning:
                 rend.ToggleFilledMode()
                 print("Wireframe mode:", "ON" if not rend.filledMode else "OFF")
             
+            elif event.key == pygame.K_g:
+                if not rend.gpuTimer.supported:
+                    print("GPU timing: no soportado por el driver")
+                else:
+                    rend.gpuTimer.enabled = not rend.gpuTimer.enabled
+                    print("GPU timing:", "ON" if rend.gpuTimer.enabled else "OFF")
+                    if not rend.gpuTimer.enabled:
+                        pygame.display.set_caption("OpenGL Renderer 2025")
+            
             elif event.key == pygame.K_SPACE:
                 autoRotate = not autoRotate
                 print("Auto-rotate:", "ON" if autoRotate else "OFF")
@@ -175,8 +206,7 @@ while isRunning:
             elif event.key == pygame.K_ESCAPE:
                 isRunning = False
 
-    deltaTime = clock.tick(60) / 1000
-    elapsedTime += deltaTime
+    timer.Lap("events")
     
     # Handle Z/X keys for value control
     if keys[K_z]:
@@ -213,22 +243,40 @@ while isRunning:
         )
         
        
+    timer.Lap("camera")
+    
     # Pass time and value to renderer
     rend.elapsedTime = elapsedTime
     rend.value = value
 
+    # Subidas a la GPU de los assets ya decodificados, dentro del presupuesto
+    wasLoading = not loader.Done()
+    loader.Update()
+    if wasLoading and loader.Done():
+        print(loader.Summary())
+        print(textures.Report())
+    timer.Lap("assets")
+
     rend.Render()
     
-    # Asegurar que todo el rendering se complete
-    glFinish()
-
-    err = glGetError()
-    if err != GL_NO_ERROR:
-        print(f"GL ERROR: {err}")
-    if err != GL_NO_ERROR:
-        print(f"GL ERROR: {err}")
+    # Solo en modo debug: glFinish serializa CPU y GPU
+    if args.debug_gl:
+        glFinish()
+
+        err = glGetError()
+        if err != GL_NO_ERROR:
+            print(f"GL ERROR: {err}")
     
     pygame.display.flip()
-    clock.tick(60)  # Limitar a 60 FPS
+    loader.FrameShown()
+    timer.Lap("swap")
+    
+    # Tiempos GPU por pasada en el titulo de la ventana
+    if rend.gpuTimer.Active() and timer.frameCount % 30 == 0:
+        gpu = rend.gpuTimer.results
+        pygame.display.set_caption(f"OpenGL Renderer 2025 - GPU skybox {gpu['skybox']:.2f} ms | scene {gpu['scene']:.2f} ms")
+
+print(timer.Summary())
 
+loader.Shutdown()
 pygame.quit()
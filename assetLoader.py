@@ -0,0 +1,192 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import os
+import queue
+import time
+
+import pygame
+
+from material import LoadMaterialLibrary
+from model import LoadMesh, Model
+from skybox import DecodeFaces, Skybox
+from texture import DecodeTexture, MipChain, textures
+
+
+class AssetLoader(object):
+    # Parses meshes and decodes images on worker threads; the GL thread calls
+    # Update() once per frame and uploads the finished work within a time
+    # budget, so the window keeps drawing while assets pop in.
+    #
+    # Each request has a CPU stage (worker) and a GL stage: a generator that
+    # yields between uploads so the budget can be checked in between.
+
+    def __init__(self, workers = 2, uploadBudget = 0.004):
+        self.pool = ThreadPoolExecutor(max_workers = workers)
+        self.uploadBudget = uploadBudget
+
+        # Worker -> GL thread: (label, GL stage generator or exception)
+        self.finished = queue.Queue()
+        self.uploads = deque()
+        self.outstanding = 0
+
+        # Metrics, seconds since the loader was created
+        self.start = time.perf_counter()
+        self.firstFrame = None
+        self.fullyLoaded = None
+        self.frames = 0
+        self.uploadTime = 0.0
+        self.maxFrameUpload = 0.0
+
+        # A step runs to completion even past the budget: frames that went
+        # over it, and the longest single step (e.g. allocating the whole
+        # skybox cube map on the first face)
+        self.overBudgetFrames = 0
+        self.maxStep = 0.0
+
+
+    def _Submit(self, label, decode, upload):
+        # decode() runs on a worker; upload(result) must return the GL stage generator
+        self.outstanding += 1
+        self.fullyLoaded = None
+
+        def Work():
+            try:
+                self.finished.put((label, upload(decode())))
+            except Exception as e:
+                self.finished.put((label, e))
+
+        self.pool.submit(Work)
+
+
+    def LoadModel(self, filename, textureFiles = (), onLoaded = None, useCache = True, interleaved = True, compact = False,
+                  optimize = False):
+        # onLoaded(model) runs on the GL thread once the Model is ready to draw
+        def Decode():
+            mesh, _ = LoadMesh(filename, useCache, compact, optimize)
+
+            # Images of the model's materials and of textureFiles, decoded here
+            images = [name for name in textureFiles if not textures.Has(name)]
+            for library in mesh.metadata.get("materialLibraries", []):
+                path = os.path.join(os.path.dirname(filename), library)
+                try:
+                    images += [material.diffuseMap for material in LoadMaterialLibrary(path).values()
+                               if material.diffuseMap is not None and not textures.Has(material.diffuseMap)]
+                except OSError:
+                    pass  # Model.LoadMaterials reports it
+
+            decoded = []
+            for image in dict.fromkeys(images):
+                try:
+                    start = time.perf_counter()
+                    pixels = DecodeTexture(image, textures.useDiskCache)
+                    # Filtered here so the GL stage only uploads, in bands
+                    decoded.append((image, pixels, MipChain(pixels), time.perf_counter() - start))
+                except (OSError, ValueError, pygame.error) as e:
+                    print(f"No se pudo decodificar '{image}': {e}")
+            return mesh, decoded
+
+        def Upload(result):
+            mesh, decoded = result
+
+            def Stage():
+                for image, pixels, mips, decodeTime in decoded:
+                    yield from textures.AddSteps(image, pixels, decodeTime, mips)
+                    yield
+
+                model = Model(filename, useCache, interleaved, mesh = mesh)
+                for name in textureFiles:
+                    model.AddTexture(name)
+                if onLoaded is not None:
+                    onLoaded(model)
+
+            return Stage()
+
+        self._Submit(filename, Decode, Upload)
+
+
+    def LoadSkybox(self, renderer, textureList):
+        def Upload(faces):
+            def Stage():
+                # Bands of rows of one face per step; the skybox is shown once
+                # it is complete
+                skybox = Skybox(textureList, faces = [])
+                for i, face in enumerate(faces):
+                    yield
+                    yield from skybox.UploadFaceSteps(i, face)
+                renderer.SetSkybox(skybox)
+
+            return Stage()
+
+        self._Submit("skybox", lambda: DecodeFaces(textureList), Upload)
+
+
+    def Update(self):
+        # GL thread, once per frame: runs GL stages until the budget is spent.
+        # At least one step runs every frame so loading always progresses.
+        start = time.perf_counter()
+
+        while True:
+            try:
+                label, stage = self.finished.get_nowait()
+            except queue.Empty:
+                break
+            if isinstance(stage, Exception):
+                print(f"Error al cargar '{label}': {stage}")
+                self.outstanding -= 1
+            else:
+                self.uploads.append(stage)
+
+        while self.uploads:
+            stepStart = time.perf_counter()
+            try:
+                next(self.uploads[0])
+            except StopIteration:
+                self.uploads.popleft()
+                self.outstanding -= 1
+            except Exception as e:
+                print(f"Error al subir un asset a la GPU: {e}")
+                self.uploads.popleft()
+                self.outstanding -= 1
+
+            now = time.perf_counter()
+            self.maxStep = max(self.maxStep, now - stepStart)
+            if now - start >= self.uploadBudget:
+                break
+
+        spent = time.perf_counter() - start
+        self.uploadTime += spent
+        self.maxFrameUpload = max(self.maxFrameUpload, spent)
+        if spent > self.uploadBudget:
+            self.overBudgetFrames += 1
+
+        if self.outstanding == 0 and self.fullyLoaded is None:
+            self.fullyLoaded = time.perf_counter() - self.start
+
+
+    def FrameShown(self):
+        # Call after each swap; the first one is the time to first frame
+        self.frames += 1
+        if self.firstFrame is None:
+            self.firstFrame = time.perf_counter() - self.start
+
+
+    def Done(self):
+        return self.outstanding == 0
+
+
+    def Summary(self):
+        lines = ["Asset loading:"]
+        if self.firstFrame is not None:
+            lines.append(f"  time to first frame:   {self.firstFrame * 1000:8.1f} ms")
+        if self.fullyLoaded is not None:
+            lines.append(f"  time to fully loaded:  {self.fullyLoaded * 1000:8.1f} ms")
+        else:
+            lines.append(f"  still loading: {self.outstanding} assets")
+        lines.append(f"  GL upload time:        {self.uploadTime * 1000:8.1f} ms total, "
+                     f"{self.maxFrameUpload * 1000:.1f} ms max per frame (budget {self.uploadBudget * 1000:.1f} ms)")
+        lines.append(f"  over budget:           {self.overBudgetFrames} frames, longest step {self.maxStep * 1000:.1f} ms")
+        return "\n".join(lines)
+
+
+    def Shutdown(self):
+        self.pool.shutdown(wait = False, cancel_futures = True)
@@ -0,0 +1,976 @@
+# Antes que cualquier modulo que importe OpenGL: los benchmarks usan un
+# contexto sin ventana (EGL / OSMesa)
+import headless
+
+import argparse
+import collections
+import copy
+import os
+import sys
+import time
+
+import numpy as np
+
+import meshcache
+from model import BuildMesh
+from obj import Obj
+
+
+def Measure(function, repeat):
+	# Mejor tiempo de varias corridas, en segundos
+	best = float("inf")
+	for _ in range(repeat):
+		start = time.perf_counter()
+		function()
+		best = min(best, time.perf_counter() - start)
+	return best
+
+
+# Casos borde para comparar los parsers con el original linea por linea
+# (solo formatos que el original entiende: sin "//" ni indices negativos)
+PARSER_CASES = {
+	"formatos mezclados": "v 0 0 0\nv 1 0 0\nv 0 1 0\nv 1 1 0\nvt 0 0\nvt 1 0\nvt 0 1\nvn 0 0 1\n"
+						  "f 1/1 2/2 3/3\nf 1 2 3\nf 2/1/1 4/2/1 3/3/1\n",
+	"triangulos y quads": "v 0 0 0\nv 1 0 0\nv 0 1 0\nv 1 1 0\nvt 0 0\nvt 1 0\n"
+						  "f 1/1 2/2 3/1\nf 1/1 2/2 4/1 3/2\n",
+}
+
+
+def CheckParsers():
+	# Sale con error si el parser vectorizado, el streaming o el de trozos
+	# (workers = 1) no dan las mismas caras que el original
+	import tempfile
+
+	modes = (("vectorizado", dict(workers = 0, streaming = False)),
+			 ("streaming", dict(workers = 0, streaming = True)),
+			 ("trozos", dict(workers = 1)))
+	failed = []
+	with tempfile.TemporaryDirectory() as directory:
+		for name, text in PARSER_CASES.items():
+			filename = os.path.join(directory, "case.obj")
+			with open(filename, "w") as file:
+				file.write(text)
+
+			legacy = [[corner + [0] * (3 - len(corner)) for corner in face] for face in Obj(filename, vectorized = False).faces]
+			for label, options in modes:
+				faces = [np.asarray(face).tolist() for face in Obj(filename, **options).faces]
+				if faces != legacy:
+					failed.append(f"{name} ({label})")
+
+	print(f"  equivalencia con el parser original: {len(PARSER_CASES)} casos, {'OK' if not failed else 'DIFERENTE: ' + ', '.join(failed)}")
+	if failed:
+		sys.exit("Los parsers vectorizados no dan las mismas caras que el original")
+
+
+def BenchmarkObj(args):
+	CheckParsers()
+
+	legacy = Measure(lambda: Obj(args.filename, vectorized = False), args.repeat)
+	vectorized = Measure(lambda: Obj(args.filename, vectorized = True), args.repeat)
+
+	objFile = Obj(args.filename)
+	print(f"{args.filename}: v:{len(objFile.vertices)} vt:{len(objFile.texCoords)} vn:{len(objFile.normals)} f:{len(objFile.faceSizes)}")
+	print(f"  per-line parser:   {legacy * 1000:8.1f} ms")
+	print(f"  vectorized parser: {vectorized * 1000:8.1f} ms  ({legacy / vectorized:.1f}x)")
+
+
+def WriteGridObj(filename, faces):
+	# OBJ sintetico: una grilla de n x n vertices con v/vt/vn, dos triangulos por celda
+	n = int(np.ceil(np.sqrt(faces / 2))) + 1
+	u, v = np.meshgrid(np.linspace(0, 1, n), np.linspace(0, 1, n))
+	u, v = u.reshape(-1), v.reshape(-1)
+	heights = 0.1 * np.sin(u * 20) * np.cos(v * 20)
+
+	cells = (np.arange(n - 1)[:, None] * n + np.arange(n - 1)[None, :]).reshape(-1) + 1
+	triangles = np.concatenate([np.stack([cells, cells + 1, cells + n], axis = 1),
+								np.stack([cells + 1, cells + n + 1, cells + n], axis = 1)])[:faces]
+
+	with open(filename, "w") as file:
+		np.savetxt(file, np.stack([u, heights, v], axis = 1), fmt = "v %.6f %.6f %.6f")
+		np.savetxt(file, np.stack([u, v], axis = 1), fmt = "vt %.6f %.6f")
+		file.write("vn 0 1 0\n")
+		# Cada esquina usa el mismo indice para v y vt
+		np.savetxt(file, np.repeat(triangles, 2, axis = 1), fmt = "f %d/%d/1 %d/%d/1 %d/%d/1")
+
+
+def BenchmarkParallelObj(args):
+	import tempfile
+	import obj
+
+	filename = args.filename or os.path.join(tempfile.gettempdir(), f"grid_{args.faces}.obj")
+	if not os.path.exists(filename):
+		print(f"Generando {filename} ...")
+		WriteGridObj(filename, args.faces)
+
+	size = os.path.getsize(filename)
+	chunks = -(-size // obj.CHUNK_BYTES)
+	print(f"{filename}: {size / 2 ** 20:.0f} MB, {chunks} trozos de {obj.CHUNK_BYTES >> 20} MB, {os.cpu_count()} nucleos")
+
+	single = Measure(lambda: Obj(filename, workers = 0), args.repeat)
+	print(f"  un proceso, archivo entero: {single * 1000:8.1f} ms")
+
+	reference = Obj(filename, workers = 0)
+	for workers in args.workers:
+		parallel = Measure(lambda: Obj(filename, workers = workers), args.repeat)
+		parsed = Obj(filename, workers = workers)
+		same = all(np.array_equal(getattr(parsed, name), getattr(reference, name))
+				   for name in ("vertices", "texCoords", "normals", "faceCorners", "faceSizes"))
+		print(f"  {workers:2d} procesos, mmap + trozos: {parallel * 1000:8.1f} ms  ({single / parallel:.2f}x)"
+			  f"{'' if same else '  DIFERENTE'}")
+
+
+def BenchmarkStreamObj(args):
+	import tempfile
+	import tracemalloc
+	import obj
+
+	filename = args.filename or os.path.join(tempfile.gettempdir(), f"grid_{args.faces}.obj")
+	if not os.path.exists(filename):
+		print(f"Generando {filename} ...")
+		WriteGridObj(filename, args.faces)
+
+	def Peak(function):
+		# Pico de memoria (tracemalloc, incluye los arreglos de NumPy) y resultado
+		tracemalloc.start()
+		result = function()
+		peak = tracemalloc.get_traced_memory()[1]
+		tracemalloc.stop()
+		return peak, result
+
+	size = os.path.getsize(filename)
+	print(f"{filename}: {size / 2 ** 20:.1f} MB, bloques de {obj.BLOCK_BYTES >> 20} MB")
+	print(f"  {'lectura':>22s} {'ms':>8s} {'pico MB':>8s} {'pico / archivo':>15s}")
+
+	modes = (("archivo entero", dict(workers = 0, streaming = False)),
+			 ("streaming", dict(workers = 0, streaming = True)))
+	for label, options in modes:
+		elapsed = Measure(lambda: Obj(filename, **options), args.repeat)
+		peak, parsed = Peak(lambda: Obj(filename, **options))
+		print(f"  {label:>24s} {elapsed * 1000:8.1f} {peak / 2 ** 20:8.1f} {peak / size:15.2f}")
+
+	# La cota documentada en obj.py, con los arreglos de la ultima lectura
+	arrays = sum(getattr(parsed, name).nbytes for name in ("vertices", "texCoords", "normals", "faceCorners", "faceSizes"))
+	bound = 3 * arrays + obj.BLOCK_OVERHEAD * obj.BLOCK_BYTES
+	print(f"  arreglos {arrays / 2 ** 20:.1f} MB; cota del streaming 3 * arreglos + {obj.BLOCK_OVERHEAD} * bloque = "
+		  f"{bound / 2 ** 20:.1f} MB -> {'OK' if peak <= bound else 'EXCEDIDA'}")
+	if peak > bound:
+		sys.exit(f"El pico del streaming ({peak / 2 ** 20:.1f} MB) supera la cota de obj.py ({bound / 2 ** 20:.1f} MB)")
+
+
+def LegacyBuildArrays(objFile):
+	# BuildBuffers original sin las llamadas GL: bounds y normalizacion
+	# vertice por vertice, y listas de floats por cara (solo triangulos y quads)
+	vertices = objFile.vertices
+	min_x = min_y = min_z = float("inf")
+	max_x = max_y = max_z = float("-inf")
+	for v in vertices:
+		min_x = min(min_x, v[0])
+		max_x = max(max_x, v[0])
+		min_y = min(min_y, v[1])
+		max_y = max(max_y, v[1])
+		min_z = min(min_z, v[2])
+		max_z = max(max_z, v[2])
+
+	center_x, center_y, center_z = (min_x + max_x) / 2.0, (min_y + max_y) / 2.0, (min_z + max_z) / 2.0
+	max_size = max(max_x - min_x, max_y - min_y, max_z - min_z)
+	scale = 2.0 / max_size if max_size > 0 else 1.0
+
+	for v in vertices:
+		v[0] = (v[0] - center_x) * scale
+		v[1] = (v[1] - center_y) * scale
+		v[2] = (v[2] - center_z) * scale
+
+	positions = []
+	texCoords = []
+	normals = []
+	for face in objFile.faces:
+		order = (0, 1, 2, 0, 2, 3) if len(face) == 4 else (0, 1, 2)
+		for i in order:
+			for value in vertices[face[i][0] - 1]: positions.append(value)
+			for value in objFile.texCoords[face[i][1] - 1]: texCoords.append(value)
+			for value in objFile.normals[face[i][2] - 1]: normals.append(value)
+
+	return positions, texCoords, normals
+
+
+def VectorizedBuildArrays(objFile):
+	# Lo mismo con arreglos: bounds con min / ptp, normalizacion en un
+	# broadcast y de-indexado con indexado avanzado sobre las esquinas
+	from model import FanTriangles, NormalizeVertices
+
+	NormalizeVertices(objFile.vertices)
+	triangles, _ = FanTriangles(objFile.faceSizes)
+	corners = objFile.faceCorners[triangles.reshape(-1)]
+	return (objFile.vertices[corners[:, 0] - 1],
+			objFile.texCoords[corners[:, 1] - 1],
+			objFile.normals[corners[:, 2] - 1])
+
+
+def BenchmarkBuildArrays(args):
+	import contextlib
+	import io
+
+	# Las copias del parseo no se miden: la normalizacion trabaja en el lugar
+	legacySource = Obj(args.filename, vectorized = False)
+	source = Obj(args.filename)
+
+	def Legacy():
+		objFile = copy.copy(legacySource)
+		objFile.vertices = [list(v) for v in legacySource.vertices]
+		return LegacyBuildArrays(objFile)
+
+	def Vectorized():
+		objFile = copy.copy(source)
+		objFile.vertices = source.vertices.copy()
+		with contextlib.redirect_stdout(io.StringIO()):
+			return VectorizedBuildArrays(objFile)
+
+	legacy = Measure(Legacy, args.repeat)
+	vectorized = Measure(Vectorized, args.repeat)
+
+	positions, _, _ = Legacy()
+	arrays = Vectorized()
+	error = np.abs(np.array(positions, dtype = np.float32).reshape(-1, 3) - arrays[0]).max()
+
+	print(f"{args.filename}: {len(source.faceSizes)} caras -> {len(arrays[0])} vertices de-indexados")
+	print(f"  bucles Python:  {legacy * 1000:8.1f} ms")
+	print(f"  vectorizado:    {vectorized * 1000:8.1f} ms  ({legacy / vectorized:.0f}x, diferencia max {error:.2g})")
+
+
+def BenchmarkMeshCache(args):
+	mesh = BuildMesh(Obj(args.filename))
+	meshcache.Store(args.filename, mesh)
+
+	cold = Measure(lambda: BuildMesh(Obj(args.filename)), args.repeat)
+	warm = Measure(lambda: meshcache.Load(args.filename).arrays["vertices"].sum(), args.repeat)
+
+	print(f"{args.filename}: {len(mesh.arrays['vertices'])} vertices -> {meshcache.CachePath(args.filename)}")
+	print(f"  cold (parse + build): {cold * 1000:8.1f} ms")
+	print(f"  warm (memmap cache):  {warm * 1000:8.1f} ms  ({cold / warm:.1f}x)")
+
+
+def BenchmarkCompact(args):
+	from OpenGL import GL
+	from buffer import PackCompact, UnpackCompact
+	from model import LoadMesh, Model
+
+	context, target = CreateContext()
+
+	def BufferBytes(model):
+		GL.glBindBuffer(GL.GL_ARRAY_BUFFER, model.vertexBuffer.VBO)
+		size = GL.glGetBufferParameteriv(GL.GL_ARRAY_BUFFER, GL.GL_BUFFER_SIZE)
+		GL.glBindBuffer(GL.GL_ARRAY_BUFFER, 0)
+		return int(size)
+
+	print(f"{args.filename}")
+	print(f"  {'formato':>8s} {'bytes/vertice':>14s} {'VBO KB':>8s} {'cache KB':>9s}")
+	for compact in (False, True):
+		LoadMesh(args.filename, compact = compact)
+		model = Model(args.filename, compact = compact)
+		cache = os.path.getsize(meshcache.CachePath(args.filename, "cmesh" if compact else "mesh"))
+		print(f"  {'compacto' if compact else 'float32':>8s} {model.vertexBuffer.vertexBuffer.strides[0]:14d} "
+			  f"{BufferBytes(model) / 1024:8.0f} {cache / 1024:9.0f}")
+
+	# Error maximo de cada atributo al decodificar como lo hace GL
+	vertices = np.asarray(meshcache.Load(args.filename).arrays["vertices"])
+	decoded = UnpackCompact(PackCompact(vertices))
+	normals, decodedNormals = vertices[:, 5:8], decoded[:, 5:8]
+	lengths = np.linalg.norm(normals, axis = 1) * np.linalg.norm(decodedNormals, axis = 1)
+	valid = lengths > 0
+	cosines = np.clip((normals[valid] * decodedNormals[valid]).sum(axis = 1) / lengths[valid], -1, 1)
+	print(f"  error max: posicion {np.abs(decoded[:, 0:3] - vertices[:, 0:3]).max():.2e} (el modelo mide 2), "
+		  f"uv {np.abs(decoded[:, 3:5] - vertices[:, 3:5]).max():.2e}, "
+		  f"normal {np.degrees(np.arccos(cosines)).max() if valid.any() else 0.0:.3f} grados")
+
+	context.Destroy()
+
+
+def BenchmarkVertexCache(args):
+	import tempfile
+	from meshopt import Acmr
+
+	grid = os.path.join(tempfile.gettempdir(), f"grid_{args.faces}.obj")
+	if not os.path.exists(grid):
+		WriteGridObj(grid, args.faces)
+
+	# ACMR: vertices transformados por triangulo con una cache FIFO. El minimo
+	# posible es vertices / triangulos (cada vertice transformado una vez).
+	for filename in (args.filename, grid):
+		objFile = Obj(filename)
+		rows = []
+		for optimize, overdraw in ((False, False), (True, False), (True, True)):
+			start = time.perf_counter()
+			mesh = BuildMesh(copy.deepcopy(objFile), optimize, overdraw)
+			elapsed = time.perf_counter() - start
+			indices = np.asarray(mesh.arrays["indices"])
+			label = ("tipsify + overdraw" if overdraw else "tipsify") if optimize else "orden del OBJ"
+			rows.append((label, Acmr(indices, 16), Acmr(indices, 32), elapsed))
+
+		print(f"{filename}: {len(indices) // 3} triangulos, {len(mesh.arrays['vertices'])} vertices "
+			  f"(ACMR minimo {len(mesh.arrays['vertices']) / (len(indices) // 3):.3f})")
+		print(f"  {'orden':>20s} {'ACMR 16':>8s} {'ACMR 32':>8s} {'BuildMesh ms':>13s}")
+		for label, acmr16, acmr32, elapsed in rows:
+			print(f"  {label:>20s} {acmr16:8.3f} {acmr32:8.3f} {elapsed * 1000:13.1f}")
+
+
+def CheckLayouts(args):
+	# Prueba headless: el mismo modelo con VBO intercalado y con un VBO por
+	# atributo tiene que dar exactamente los mismos pixeles
+	import glm
+	from OpenGL import GL
+	from gl import Renderer
+	from model import Model
+	from vertexShader import vertex_shader
+	from fragmentShader import fragment_shader
+
+	width, height = 320, 240
+	context, target = CreateContext(width, height)
+
+	rend = Renderer(target)
+	rend.SetShaders(vertex_shader, fragment_shader)
+	rend.pointLight = glm.vec3(5, 5, 10)
+	rend.ambientLight = 0.8
+	rend.camera.viewMatrix = glm.lookAt(glm.vec3(0, 0.8, 2.2), glm.vec3(0, 0, 0), glm.vec3(0, 1, 0))
+
+	frames = {}
+	for interleaved in (True, False):
+		car = Model(args.filename, interleaved = interleaved)
+		if args.texture:
+			car.AddTexture(args.texture)
+		car.rotation.y = 150
+		rend.scene = [car]
+		rend.Render()
+		GL.glFinish()
+		frames[interleaved] = np.frombuffer(GL.glReadPixels(0, 0, width, height, GL.GL_RGBA, GL.GL_UNSIGNED_BYTE), dtype = np.uint8)
+		car.ReleaseTextures()
+
+	context.Destroy()
+
+	different = int((frames[True] != frames[False]).sum())
+	covered = int((frames[True].reshape(-1, 4)[:, :3] != frames[True][:3]).any(axis = 1).sum())
+	print(f"{args.filename}: {width}x{height}, {covered} pixeles del modelo, {different} bytes distintos")
+	if different > 0 or covered == 0:
+		sys.exit("Los layouts intercalado y separado no dan la misma imagen")
+
+
+def CreateContext(width = 64, height = 64):
+	# Contexto sin ventana con un FBO como framebuffer
+	context = headless.HeadlessContext(width, height)
+	target = headless.OffscreenTarget(width, height)
+	target.Bind()
+	return context, target
+
+
+def CountGLCalls(modules, function, frames):
+	# Reemplaza las funciones gl* de los modulos por contadores mientras corre function
+	counts = collections.Counter()
+	originals = []
+
+	for module in modules:
+		for name in dir(module):
+			original = getattr(module, name)
+			if name.startswith("gl") and callable(original):
+				def Counted(*args, _original = original, _name = name, **kwargs):
+					counts[_name] += 1
+					return _original(*args, **kwargs)
+				originals.append((module, name, original))
+				setattr(module, name, Counted)
+
+	try:
+		for _ in range(frames):
+			function()
+	finally:
+		for module, name, original in originals:
+			setattr(module, name, original)
+
+	return {name: count / frames for name, count in sorted(counts.items())}
+
+
+def LegacySkyboxRender(sky, camera):
+	# Camino anterior de Skybox.Render: busca los uniforms, re-sube el cubo
+	# y re-especifica el atributo en cada frame
+	import ctypes
+	import glm
+	from OpenGL import GL
+
+	vertices = sky.vertexBuffer.vertexBuffer
+	GL.glUseProgram(sky.shaders.program)
+	GL.glUniformMatrix4fv(GL.glGetUniformLocation(sky.shaders.program, "viewMatrix"),
+						  1, GL.GL_FALSE, glm.value_ptr(camera.viewMatrix))
+	GL.glUniformMatrix4fv(GL.glGetUniformLocation(sky.shaders.program, "projectionMatrix"),
+						  1, GL.GL_FALSE, glm.value_ptr(camera.projectionMatrix))
+	GL.glDepthMask(GL.GL_FALSE)
+	GL.glBindTexture(GL.GL_TEXTURE_CUBE_MAP, sky.texture)
+	GL.glBindBuffer(GL.GL_ARRAY_BUFFER, sky.vertexBuffer.VBO)
+	GL.glBufferData(GL.GL_ARRAY_BUFFER, vertices.nbytes, vertices, GL.GL_STATIC_DRAW)
+	GL.glEnableVertexAttribArray(0)
+	GL.glVertexAttribPointer(0, 3, GL.GL_FLOAT, GL.GL_FALSE, 4 * 3, ctypes.c_void_p(0))
+	GL.glDrawArrays(GL.GL_TRIANGLES, 0, 36)
+	GL.glDisableVertexAttribArray(0)
+	GL.glDepthMask(GL.GL_TRUE)
+
+
+def BenchmarkSkybox(args):
+	import glm
+	import shaderProgram
+	import skybox
+	from camera import Camera
+	from frameUniforms import FrameUniforms
+
+	context, target = CreateContext()
+
+	textures = [f"skybox/{face}.jpg" for face in ("right", "left", "top", "bottom", "front", "back")]
+	start = time.perf_counter()
+	sky = skybox.Skybox(textures)
+	print(f"Skybox.__init__: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+	camera = Camera(64, 64)
+	camera.viewMatrix = glm.mat4(1)
+
+	# Las matrices de la camara llegan por el buffer de FrameUniforms
+	frameUniforms = FrameUniforms()
+	frameUniforms.Update(camera, glm.vec3(0), 0.2, 0.0, 0.5)
+
+	from OpenGL import GL
+	legacy = CountGLCalls([GL], lambda: LegacySkyboxRender(sky, camera), args.frames)
+	current = CountGLCalls([skybox, shaderProgram], sky.Render, args.frames)
+
+	for label, counts in (("anterior", legacy), ("actual", current)):
+		print(f"  {label}: {sum(counts.values()):.2f} llamadas GL por frame")
+		for name, count in counts.items():
+			print(f"    {name:28s} {count:.2f}")
+
+	context.Destroy()
+
+
+def GridMatrices(count, spacing = 2.5, scale = 0.5):
+	# Matrices de modelo (column-major, como glm) de una grilla de count copias
+	side = int(np.ceil(np.sqrt(count)))
+	index = np.arange(count)
+	matrices = np.tile(np.identity(4, dtype = np.float32) * scale, (count, 1, 1))
+	matrices[:, 3, 0] = (index % side - side / 2) * spacing * scale
+	matrices[:, 3, 2] = -(index // side) * spacing * scale
+	matrices[:, 3, 3] = 1
+	return matrices
+
+
+def BenchmarkInstancing(args):
+	import glm
+	from OpenGL.GL import glFinish
+	from gl import Renderer
+	from model import Model, InstancedModel
+	from vertexShader import vertex_shader
+	from fragmentShader import fragment_shader
+
+	context, target = CreateContext(320, 180)
+
+	rend = Renderer(target)
+	rend.SetShaders(vertex_shader, fragment_shader)
+	rend.camera.viewMatrix = glm.lookAt(glm.vec3(0, 20, 20), glm.vec3(0, 0, -10), glm.vec3(0, 1, 0))
+
+	car = Model(args.filename)
+	group = InstancedModel(car)
+
+	def Frame():
+		rend.Render()
+		if args.finish:
+			glFinish()
+
+	print(f"{args.filename}: {car.indexCount // 3} triangulos por copia"
+		  f" ({'CPU + GPU' if args.finish else 'solo CPU de envio'}, ms por frame)")
+	print(f"  {'copias':>7s} {'por objeto':>12s} {'instanciado':>12s} {'speedup':>8s} {'triangulos (objeto / instanciado)':>34s}")
+
+	count = 1
+	while count <= args.max:
+		matrices = GridMatrices(count)
+
+		# Camino por objeto: un uniform modelMatrix y un draw call por copia
+		copies = []
+		for matrix in matrices:
+			clone = copy.copy(car)
+			clone.position = glm.vec3(*matrix[3, :3])
+			clone.rotation = glm.vec3(0, 0, 0)
+			clone.scale = glm.vec3(matrix[0, 0])
+			copies.append(clone)
+		rend.scene = copies
+		Frame()
+		perObject = Measure(Frame, args.repeat)
+		perObjectTriangles = rend.trianglesDrawn
+
+		# Camino instanciado: un solo glDrawElementsInstanced
+		group.SetMatrices(matrices)
+		rend.scene = [group]
+		Frame()
+		instanced = Measure(Frame, args.repeat)
+
+		# Los dos caminos eligen el nivel de detalle; los triangulos muestran
+		# que dibujan lo mismo (el grupo usa el nivel de su copia mas cercana)
+		print(f"  {count:7d} {perObject * 1000:12.2f} {instanced * 1000:12.2f} {perObject / instanced:7.1f}x"
+			  f" {perObjectTriangles:>16d} / {rend.trianglesDrawn:<d}")
+		count *= 10
+
+	context.Destroy()
+
+
+def GlmModelMatrix(position, rotation, scale):
+	# GetModelMatrix tal como era antes del TransformSystem
+	import glm
+	identity = glm.mat4(1)
+	return (glm.translate(identity, position) *
+			glm.rotate(identity, glm.radians(rotation.x), glm.vec3(1, 0, 0)) *
+			glm.rotate(identity, glm.radians(rotation.y), glm.vec3(0, 1, 0)) *
+			glm.rotate(identity, glm.radians(rotation.z), glm.vec3(0, 0, 1)) *
+			glm.scale(identity, scale))
+
+
+def BenchmarkTransforms(args):
+	import glm
+	from transform import TransformSystem
+
+	random = np.random.default_rng(0)
+
+	print(f"Matrices de modelo por frame (ms), {args.dirty:.0%} de objetos en movimiento")
+	print(f"  {'objetos':>8s} {'glm por objeto':>15s} {'batch todos':>12s} {'batch dirty':>12s}")
+
+	count = 100
+	while count <= args.max:
+		positions = random.normal(size = (count, 3)).astype(np.float32)
+		rotations = random.uniform(-180, 180, (count, 3)).astype(np.float32)
+		scales = random.uniform(0.5, 2, (count, 3)).astype(np.float32)
+
+		objects = [(glm.vec3(*p), glm.vec3(*r), glm.vec3(*s)) for p, r, s in zip(positions, rotations, scales)]
+		perObject = Measure(lambda: [GlmModelMatrix(*transform) for transform in objects], args.repeat)
+
+		system = TransformSystem(count)
+		for p, r, s in zip(positions, rotations, scales):
+			system.Add(p, r, s)
+
+		def UpdateAll():
+			system.dirty[:count] = True
+			system.Update()
+
+		moving = random.choice(count, max(1, int(count * args.dirty)), replace = False)
+
+		def UpdateMoving():
+			system.rotations[moving, 1] += 1
+			system.dirty[moving] = True
+			system.Update()
+
+		batchAll = Measure(UpdateAll, args.repeat)
+		batchDirty = Measure(UpdateMoving, args.repeat)
+
+		print(f"  {count:8d} {perObject * 1000:15.2f} {batchAll * 1000:12.2f} {batchDirty * 1000:12.2f}")
+		count *= 10
+
+
+def BenchmarkSceneGraph(args):
+	from sceneGraph import SceneNode
+	from transform import TransformSystem
+
+	random = np.random.default_rng(0)
+
+	def Build(shape):
+		system = TransformSystem(args.nodes)
+		nodes = [SceneNode(system = system)]
+		for i in range(1, args.nodes):
+			# deep: una cadena; wide: todos hijos de la raiz
+			nodes.append(nodes[-1 if shape == "deep" else 0].AddChild(SceneNode(system = system)))
+		system.Update()
+		return system, nodes
+
+	print(f"Update() de un arbol de {args.nodes} nodos (ms; nodos recalculados)")
+	for shape in ("deep", "wide"):
+		system, nodes = Build(shape)
+		leaves = random.choice(np.arange(1, args.nodes), max(1, args.nodes // 100), replace = False)
+
+		cases = (("nada", []),
+				 ("1 hoja", [nodes[-1]]),
+				 ("1% de nodos", [nodes[i] for i in leaves]),
+				 ("nodo a la mitad", [nodes[args.nodes // 2]]),
+				 ("raiz", [nodes[0]]))
+
+		print(f"  {shape}:")
+		for label, changed in cases:
+			def Change():
+				for node in changed:
+					node.rotation.y += 1
+				return system.Update()
+			recomputed = Change()
+			print(f"    {label:16s} {Measure(Change, args.repeat) * 1000:9.3f} ms  {recomputed:7d} nodos")
+
+
+def BenchmarkCulling(args):
+	import glm
+	from gl import Renderer
+	from model import Model
+	from vertexShader import vertex_shader
+	from fragmentShader import fragment_shader
+
+	context, target = CreateContext(320, 180)
+
+	rend = Renderer(target)
+	rend.SetShaders(vertex_shader, fragment_shader)
+	rend.camera.viewMatrix = glm.lookAt(glm.vec3(0, 2, 5), glm.vec3(0, 0, -5), glm.vec3(0, 1, 0))
+
+	# Copias repartidas delante y detras de la camara: parte queda fuera del frustum
+	car = Model(args.filename)
+	rend.scene = []
+	for matrix in GridMatrices(args.count, spacing = 4.0, scale = 1.0):
+		clone = copy.copy(car)
+		clone.position = glm.vec3(matrix[3, 0], 0, matrix[3, 2] + (args.count ** 0.5))
+		rend.scene.append(clone)
+
+	print(f"{args.count} copias de {args.filename} (ms por frame, solo CPU de envio)")
+	for culling in (False, True):
+		rend.frustumCulling = culling
+		rend.Render()
+		frame = Measure(rend.Render, args.repeat)
+		print(f"  culling {'on ' if culling else 'off'}: {frame * 1000:8.2f} ms  dibujados {rend.drawnCount:5d}  descartados {rend.culledCount:5d}")
+
+	context.Destroy()
+
+
+def WriteMultiMaterialObj(directory, materials, facesPerMaterial):
+	# OBJ de prueba: una tira de quads por material, cada uno con su textura
+	import pygame
+
+	os.makedirs(directory, exist_ok = True)
+	with open(os.path.join(directory, "materials.mtl"), "w") as mtl:
+		for i in range(materials):
+			surface = pygame.Surface((16, 16))
+			surface.fill(((i * 67) % 256, (i * 131) % 256, (i * 29) % 256))
+			pygame.image.save(surface, os.path.join(directory, f"texture{i}.bmp"))
+			mtl.write(f"newmtl material{i}\nKd 1 1 1\nmap_Kd texture{i}.bmp\n\n")
+
+	with open(os.path.join(directory, "materials.obj"), "w") as obj:
+		obj.write("mtllib materials.mtl\nvt 0 0\nvt 1 0\nvt 1 1\nvt 0 1\nvn 0 0 1\n")
+		vertex = 1
+		for i in range(materials):
+			obj.write(f"g part{i}\nusemtl material{i}\n")
+			for j in range(facesPerMaterial):
+				x, y = j * 0.1, i * 0.1
+				obj.write(f"v {x} {y} 0\nv {x + 0.1} {y} 0\nv {x + 0.1} {y + 0.1} 0\nv {x} {y + 0.1} 0\n")
+				obj.write(f"f {vertex}/1/1 {vertex + 1}/2/1 {vertex + 2}/3/1 {vertex + 3}/4/1\n")
+				vertex += 4
+
+	return os.path.join(directory, "materials.obj")
+
+
+def BenchmarkMaterials(args):
+	import tempfile
+	import glm
+	from gl import Renderer
+	from model import Model, InstancedModel
+	from vertexShader import vertex_shader
+	from fragmentShader import fragment_shader
+
+	context, target = CreateContext(320, 180)
+
+	rend = Renderer(target)
+	rend.SetShaders(vertex_shader, fragment_shader)
+	rend.camera.viewMatrix = glm.lookAt(glm.vec3(0, 0, 8), glm.vec3(0, 0, 0), glm.vec3(0, 1, 0))
+
+	with tempfile.TemporaryDirectory() as directory:
+		model = Model(WriteMultiMaterialObj(directory, args.materials, 8), useCache = False)
+
+		# Copias con distintos materiales, intercaladas con grupos instanciados
+		# (otro programa) en el orden de la escena
+		scene = []
+		for matrix in GridMatrices(args.copies, spacing = 2.5, scale = 0.5):
+			clone = copy.copy(model)
+			clone.position = glm.vec3(*matrix[3, :3])
+			scene.append(clone)
+			scene.append(InstancedModel(model, 1))
+		rend.scene = scene
+
+		print(f"{args.copies} copias de un modelo con {args.materials} materiales + {args.copies} grupos instanciados")
+		print(f"  {'orden':>10s} {'ms/frame':>9s} {'binds':>6s} {'programas':>10s}")
+		for sortDraws in (False, True):
+			rend.sortDraws = sortDraws
+			rend.Render()
+			frame = Measure(rend.Render, args.repeat)
+			print(f"  {'ordenado' if sortDraws else 'escena':>10s} {frame * 1000:9.2f} {rend.textureBinds:6d} {rend.programSwitches:10d}")
+
+	context.Destroy()
+
+
+def BenchmarkLod(args):
+	import glm
+	from OpenGL import GL
+	from gl import Renderer
+	from model import Model
+	from vertexShader import vertex_shader
+	from fragmentShader import fragment_shader
+
+	context, target = CreateContext(640, 360)
+
+	rend = Renderer(target)
+	rend.SetShaders(vertex_shader, fragment_shader)
+	rend.camera.viewMatrix = glm.lookAt(glm.vec3(0, 3, 6), glm.vec3(0, 0, -10), glm.vec3(0, 1, 0))
+
+	car = Model(args.filename)
+	print(f"{args.filename} (error: distancia maxima que se mueve un vertice, el modelo mide 2)")
+	for level, (triangles, error) in enumerate(zip(car.lodTriangles, car.lodErrors)):
+		threshold = f">= {car.lodScreenRadii[level]:.0f} px" if level < len(car.lodScreenRadii) else "resto"
+		print(f"  LOD {level}: {triangles:7d} triangulos  error max {error:.4f}  radio en pantalla {threshold}")
+
+	# Grilla de copias que se alejan de la camara
+	rend.scene = []
+	for matrix in GridMatrices(args.count, spacing = 3.0, scale = 1.0):
+		clone = copy.copy(car)
+		clone.position = glm.vec3(*matrix[3, :3])
+		rend.scene.append(clone)
+
+	print(f"{args.count} copias (ms por frame, CPU + GPU)")
+	for levelOfDetail in (False, True):
+		rend.levelOfDetail = levelOfDetail
+
+		def Frame():
+			rend.Render()
+			GL.glFinish()
+
+		Frame()
+		frame = Measure(Frame, args.repeat)
+		levels = collections.Counter(obj.lod for obj in rend.scene)
+		print(f"  LOD {'on ' if levelOfDetail else 'off'}: {frame * 1000:8.2f} ms  triangulos {rend.trianglesDrawn:8d}"
+			  f"  copias por nivel {dict(sorted(levels.items()))}")
+
+	context.Destroy()
+
+
+def BenchmarkTextures(args):
+	import texture
+	from texture import DecodeTexture, TextureCache, UploadTexture2D
+
+	context, target = CreateContext()
+
+	pixels = texture._DecodeImage(args.filename)
+	print(f"{args.filename}: {pixels.shape[1]}x{pixels.shape[0]} RGB, {os.path.getsize(args.filename) / 1024:.0f} KB en disco")
+
+	decode = Measure(lambda: texture._DecodeImage(args.filename), args.repeat)
+	DecodeTexture(args.filename)
+	cached = Measure(lambda: DecodeTexture(args.filename).sum(), args.repeat)
+	print(f"  decodificar {decode * 1000:7.2f} ms   cache en disco (mmap + leer todo) {cached * 1000:7.2f} ms")
+
+	from OpenGL import GL
+	cache = TextureCache()
+	for compressed in (False, True):
+		if compressed and not cache.CompressionSupported():
+			print("  sin soporte para texturas comprimidas")
+			continue
+
+		def Upload():
+			tex, gpuBytes = UploadTexture2D(pixels, compressed)
+			GL.glFinish()
+			GL.glDeleteTextures([tex])
+			return gpuBytes
+
+		gpuBytes = Upload()
+		upload = Measure(Upload, args.repeat)
+		print(f"  subir {'DXT1' if compressed else 'RGB8'}  {upload * 1000:7.2f} ms  {gpuBytes / 1024:7.0f} KB en la GPU (con mipmaps)")
+
+	context.Destroy()
+
+
+SKYBOX_TEXTURES = ["skybox/right.jpg", "skybox/left.jpg", "skybox/top.jpg",
+				   "skybox/bottom.jpg", "skybox/front.jpg", "skybox/back.jpg"]
+
+
+def BenchmarkAssets(args):
+	import glm
+	from OpenGL import GL
+	from assetLoader import AssetLoader
+	from gl import Renderer
+	from model import Model
+	from texture import textures
+	from vertexShader import vertex_shader
+	from fragmentShader import fragment_shader
+
+	context, target = CreateContext(640, 360)
+
+	def NewRenderer():
+		textures.Clear()
+		rend = Renderer(target)
+		rend.SetShaders(vertex_shader, fragment_shader)
+		rend.camera.viewMatrix = glm.lookAt(glm.vec3(0, 1.2, 5), glm.vec3(0, 0.5, 0), glm.vec3(0, 1, 0))
+		return rend
+
+	def Frame(rend):
+		rend.Render()
+		GL.glFinish()
+
+	print(f"{args.filename} + skybox (ms desde el inicio, cache de mallas {'off' if args.no_cache else 'on'})")
+	print(f"  {'carga':>12s} {'1er frame':>10s} {'completo':>9s} {'frames':>7s} {'max frame':>10s}")
+
+	# Sincrona: nada se dibuja hasta que todo esta cargado
+	rend = NewRenderer()
+	start = time.perf_counter()
+	rend.CreateSkybox(SKYBOX_TEXTURES)
+	car = Model(args.filename, useCache = not args.no_cache)
+	car.AddTexture("models/car/0000.BMP")
+	rend.scene.append(car)
+	Frame(rend)
+	loaded = time.perf_counter() - start
+	print(f"  {'sincrona':>12s} {loaded * 1000:10.1f} {loaded * 1000:9.1f} {1:7d} {loaded * 1000:10.1f}")
+
+	# En segundo plano: frames desde el principio, los assets aparecen al subirse
+	rend = NewRenderer()
+	loader = AssetLoader(workers = args.workers, uploadBudget = args.budget / 1000.0)
+	loader.LoadSkybox(rend, SKYBOX_TEXTURES)
+	loader.LoadModel(args.filename, ["models/car/0000.BMP"], onLoaded = rend.scene.append, useCache = not args.no_cache)
+
+	longest = 0.0
+	while not loader.Done():
+		frameStart = time.perf_counter()
+		loader.Update()
+		Frame(rend)
+		loader.FrameShown()
+		longest = max(longest, time.perf_counter() - frameStart)
+	loader.Shutdown()
+
+	print(f"  {'2o plano':>12s} {loader.firstFrame * 1000:10.1f} {loader.fullyLoaded * 1000:9.1f} "
+		  f"{loader.frames:7d} {longest * 1000:10.1f}")
+	print(f"  subida GL: {loader.uploadTime * 1000:.1f} ms en total, {loader.maxFrameUpload * 1000:.1f} ms max por frame "
+		  f"(presupuesto {args.budget:.1f} ms)")
+	# Un paso no se corta a la mitad: las texturas se suben por bandas de filas,
+	# pero reservar el cube map del skybox o crear el Model es un solo paso
+	print(f"  presupuesto excedido en {loader.overBudgetFrames} de {loader.frames} frames, "
+		  f"paso mas largo {loader.maxStep * 1000:.1f} ms")
+
+	context.Destroy()
+
+
+def BenchmarkFrameUniforms(args):
+	import glm
+	import frameUniforms
+	import gl
+	import shaderProgram
+	from model import Model, InstancedModel
+	from vertexShader import vertex_shader
+	from fragmentShader import fragment_shader
+
+	context, target = CreateContext(320, 180)
+
+	rend = gl.Renderer(target)
+	rend.SetShaders(vertex_shader, fragment_shader)
+	rend.CreateSkybox(SKYBOX_TEXTURES)
+
+	car = Model(args.filename)
+	group = InstancedModel(car)
+	group.SetMatrices(GridMatrices(16))
+
+	def Frame():
+		# La camara y el tiempo cambian en cada frame
+		rend.elapsedTime += 1 / 60
+		eye = glm.vec3(6 * np.sin(rend.elapsedTime), 2, 6 * np.cos(rend.elapsedTime))
+		rend.camera.viewMatrix = glm.lookAt(eye, glm.vec3(0, 0, 0), glm.vec3(0, 1, 0))
+		rend.Render()
+
+	# Subidas por frame: glUniform* (estado de cada programa) y glBufferSubData (el UBO)
+	print(f"  {'escena':>24s} {'programas':>10s} {'glUniform*':>11s} {'glBufferSubData':>16s}")
+	for label, scene in (("skybox + modelo", [car]), ("skybox + modelo + inst.", [car, group])):
+		rend.scene = scene
+		Frame()
+		counts = CountGLCalls([gl, shaderProgram, frameUniforms], Frame, args.frames)
+		uniforms = sum(count for name, count in counts.items() if name.startswith("glUniform") and "Block" not in name)
+		print(f"  {label:>24s} {len(rend.FramePrograms()):10d} {uniforms:11.2f} {counts.get('glBufferSubData', 0):16.2f}")
+
+	context.Destroy()
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description = "Benchmarks del renderer")
+	parser.add_argument("--repeat", type = int, default = 5)
+	commands = parser.add_subparsers(dest = "command", required = True)
+
+	objCommand = commands.add_parser("obj", help = "Parser OBJ por linea vs vectorizado")
+	objCommand.add_argument("filename", nargs = "?", default = "models/Porsche_911_GT2.obj")
+	objCommand.set_defaults(run = BenchmarkObj)
+
+	parallelCommand = commands.add_parser("parallel", help = "Parseo OBJ en paralelo por trozos, escalando con los procesos")
+	parallelCommand.add_argument("filename", nargs = "?", help = "OBJ a parsear (por defecto una grilla sintetica)")
+	parallelCommand.add_argument("--faces", type = int, default = 1000000, help = "Caras de la grilla sintetica")
+	parallelCommand.add_argument("--workers", type = lambda text: [int(n) for n in text.split(",")],
+								 default = [2 ** i for i in range(8) if 2 ** i <= (os.cpu_count() or 1)],
+								 help = "Cantidades de procesos separadas por coma")
+	parallelCommand.set_defaults(run = BenchmarkParallelObj)
+
+	streamCommand = commands.add_parser("stream", help = "Pico de memoria (tracemalloc) leyendo el OBJ entero vs en streaming")
+	streamCommand.add_argument("filename", nargs = "?", help = "OBJ a parsear (por defecto una grilla sintetica)")
+	streamCommand.add_argument("--faces", type = int, default = 1000000, help = "Caras de la grilla sintetica")
+	streamCommand.set_defaults(run = BenchmarkStreamObj)
+
+	buildCommand = commands.add_parser("buildarrays", help = "Normalizacion y de-indexado: bucles Python vs arreglos")
+	buildCommand.add_argument("filename", nargs = "?", default = "models/Porsche_911_GT2.obj")
+	buildCommand.set_defaults(run = BenchmarkBuildArrays)
+
+	cacheCommand = commands.add_parser("meshcache", help = "Carga en frio vs cache binaria")
+	cacheCommand.add_argument("filename", nargs = "?", default = "models/Porsche_911_GT2.obj")
+	cacheCommand.set_defaults(run = BenchmarkMeshCache)
+
+	skyboxCommand = commands.add_parser("skybox", help = "Llamadas GL por frame de Skybox.Render")
+	skyboxCommand.add_argument("--frames", type = int, default = 100)
+	skyboxCommand.set_defaults(run = BenchmarkSkybox)
+
+	instancingCommand = commands.add_parser("instancing", help = "Un draw por copia vs InstancedModel, de 1 a 10k copias")
+	instancingCommand.add_argument("filename", nargs = "?", default = "models/Porsche_911_GT2.obj")
+	instancingCommand.add_argument("--max", type = int, default = 10000)
+	instancingCommand.add_argument("--finish", action = "store_true", help = "Incluir glFinish (tiempo de GPU)")
+	instancingCommand.set_defaults(run = BenchmarkInstancing)
+
+	transformsCommand = commands.add_parser("transforms", help = "GetModelMatrix con glm por objeto vs TransformSystem")
+	transformsCommand.add_argument("--max", type = int, default = 100000)
+	transformsCommand.add_argument("--dirty", type = float, default = 0.05, help = "Fraccion de objetos que se mueven por frame")
+	transformsCommand.set_defaults(run = BenchmarkTransforms)
+
+	sceneGraphCommand = commands.add_parser("scenegraph", help = "Costo de Update() en arboles profundos y anchos")
+	sceneGraphCommand.add_argument("--nodes", type = int, default = 5000)
+	sceneGraphCommand.set_defaults(run = BenchmarkSceneGraph)
+
+	cullingCommand = commands.add_parser("culling", help = "Frame con y sin frustum culling")
+	cullingCommand.add_argument("filename", nargs = "?", default = "models/Porsche_911_GT2.obj")
+	cullingCommand.add_argument("--count", type = int, default = 400)
+	cullingCommand.set_defaults(run = BenchmarkCulling)
+
+	materialsCommand = commands.add_parser("materials", help = "Binds de texturas y cambios de programa con y sin ordenar los draws")
+	materialsCommand.add_argument("--materials", type = int, default = 8)
+	materialsCommand.add_argument("--copies", type = int, default = 50)
+	materialsCommand.set_defaults(run = BenchmarkMaterials)
+
+	lodCommand = commands.add_parser("lod", help = "Niveles de detalle: triangulos, error y costo por frame")
+	lodCommand.add_argument("filename", nargs = "?", default = "models/Porsche_911_GT2.obj")
+	lodCommand.add_argument("--count", type = int, default = 64)
+	lodCommand.set_defaults(run = BenchmarkLod)
+
+	compactCommand = commands.add_parser("compact", help = "Vertices compactos (int16 / half / 2_10_10_10) vs float32: memoria y error")
+	compactCommand.add_argument("filename", nargs = "?", default = "models/Porsche_911_GT2.obj")
+	compactCommand.set_defaults(run = BenchmarkCompact)
+
+	layoutsCommand = commands.add_parser("layouts", help = "Prueba: VBO intercalado vs separado dan los mismos pixeles (sale con error si no)")
+	layoutsCommand.add_argument("filename", nargs = "?", default = "models/Porsche_911_GT2.obj")
+	layoutsCommand.add_argument("--texture", default = "models/car/0000.BMP")
+	layoutsCommand.set_defaults(run = CheckLayouts)
+
+	vertexCacheCommand = commands.add_parser("vertexcache", help = "ACMR de la cache de vertices con el orden del OBJ vs optimizado")
+	vertexCacheCommand.add_argument("filename", nargs = "?", default = "models/Porsche_911_GT2.obj")
+	vertexCacheCommand.add_argument("--faces", type = int, default = 100000, help = "Triangulos de la grilla sintetica")
+	vertexCacheCommand.set_defaults(run = BenchmarkVertexCache)
+
+	texturesCommand = commands.add_parser("textures", help = "Decodificar vs cache en disco, y subir RGB8 vs DXT1")
+	texturesCommand.add_argument("filename", nargs = "?", default = "models/car/0000.BMP")
+	texturesCommand.set_defaults(run = BenchmarkTextures)
+
+	assetsCommand = commands.add_parser("assets", help = "Carga sincrona vs en segundo plano: tiempo al primer frame y a carga completa")
+	assetsCommand.add_argument("filename", nargs = "?", default = "models/Porsche_911_GT2.obj")
+	assetsCommand.add_argument("--workers", type = int, default = 2)
+	assetsCommand.add_argument("--budget", type = float, default = 4.0, help = "ms de subida a la GPU por frame")
+	assetsCommand.add_argument("--no-cache", action = "store_true", help = "Parsear el OBJ sin la cache binaria")
+	assetsCommand.set_defaults(run = BenchmarkAssets)
+
+	frameUniformsCommand = commands.add_parser("frameuniforms", help = "Subidas de uniforms por frame con la camara en movimiento y varios programas")
+	frameUniformsCommand.add_argument("filename", nargs = "?", default = "models/Porsche_911_GT2.obj")
+	frameUniformsCommand.add_argument("--frames", type = int, default = 100)
+	frameUniformsCommand.set_defaults(run = BenchmarkFrameUniforms)
+
+	args = parser.parse_args()
+	args.run(args)
@@ -1,15 +1,75 @@
 import glm  # pip install PyGLM
 from OpenGL.GL import *
-from numpy import array, float32
+from numpy import array, ascontiguousarray, float32
+from collections import namedtuple
 import ctypes
 
+import numpy as np
+
+
+# Declarative description of one attribute inside an interleaved vertex:
+# shader location, number of components, byte offset in the vertex, GL
+# component type and whether integers are normalized to [-1, 1] / [0, 1]
+VertexAttribute = namedtuple("VertexAttribute", ["location", "components", "offset", "type", "normalized"],
+                             defaults = (GL_FLOAT, GL_FALSE))
+
+# pos(3) | uv(2) | normal(3), 32 bytes per vertex
+MODEL_LAYOUT = (VertexAttribute(0, 3, 0),
+                VertexAttribute(1, 2, 3 * 4),
+                VertexAttribute(2, 3, 5 * 4))
+
+# Compact vertex, 16 bytes: position as normalized int16 (4th component is
+# padding), uv as half floats and the normal packed as 2_10_10_10_REV.
+# The shaders read the same vec3 / vec2 / vec3 values as with MODEL_LAYOUT.
+COMPACT_VERTEX = np.dtype([("position", np.int16, 4),
+                           ("texCoords", np.float16, 2),
+                           ("normal", np.uint32)])
+
+COMPACT_LAYOUT = (VertexAttribute(0, 3, 0, GL_SHORT, GL_TRUE),
+                  VertexAttribute(1, 2, 8, GL_HALF_FLOAT, GL_FALSE),
+                  VertexAttribute(2, 4, 12, GL_INT_2_10_10_10_REV, GL_TRUE))
+
+
+def PackCompact(vertices):
+    # (N, 8) float32 pos|uv|normal -> (N,) COMPACT_VERTEX.
+    # Positions are quantized over [-1, 1]: BuildMesh already maps the model
+    # AABB there (largest side from -1 to 1), so no dequantize step is needed
+    # in the shaders.
+    packed = np.zeros(len(vertices), dtype = COMPACT_VERTEX)
+    packed["position"][:, 0:3] = np.clip(np.round(vertices[:, 0:3] * 32767), -32767, 32767)
+    packed["texCoords"] = vertices[:, 3:5]
+
+    normals = np.clip(np.round(vertices[:, 5:8] * 511), -511, 511).astype(np.int32) & 0x3FF
+    packed["normal"] = normals[:, 0] | (normals[:, 1] << 10) | (normals[:, 2] << 20)
+    return packed
+
+
+def UnpackCompact(packed):
+    # COMPACT_VERTEX -> (N, 8) float32, decoded the way GL does it
+    vertices = np.empty((len(packed), 8), dtype = np.float32)
+    vertices[:, 0:3] = np.maximum(packed["position"][:, 0:3] / 32767.0, -1.0)
+    vertices[:, 3:5] = packed["texCoords"]
+
+    normals = (packed["normal"][:, None].astype(np.int32) >> np.array([0, 10, 20])) & 0x3FF
+    normals = np.where(normals >= 512, normals - 1024, normals)
+    vertices[:, 5:8] = np.maximum(normals / 511.0, -1.0)
+    return vertices
+
 
 class Buffer(object):
-    def __init__(self, data):
+    def __init__(self, data, layout = None):
         self.data = data
 
-        # Vertex Buffer
-        self.vertexBuffer = array(self.data, dtype = float32)
+        # Interleaved mode: data is (N, floatsPerVertex) and layout lists
+        # the attributes packed in each row
+        self.layout = layout
+
+        # Vertex Buffer: float32, unless data is a packed record array
+        # (e.g. COMPACT_VERTEX), which is uploaded as it is
+        if getattr(data, "dtype", None) is not None and data.dtype.names is not None:
+            self.vertexBuffer = ascontiguousarray(data)
+        else:
+            self.vertexBuffer = array(self.data, dtype = float32)
 
         # Vertex Buffer Object
         self.VBO = glGenBuffers(1)
@@ -32,6 +92,23 @@ class Buffer(object):
 
         glEnableVertexAttribArray(attribNumber)
 
+    def UseLayout(self):
+        # Sets up every attribute of the interleaved layout from this single VBO.
+        # Call it once while the VAO is bound; the VAO remembers the pointers.
+        glBindBuffer(GL_ARRAY_BUFFER, self.VBO)
+
+        stride = self.vertexBuffer.strides[0]
+
+        for attribute in self.layout:
+            glVertexAttribPointer(attribute.location,
+                                  attribute.components,
+                                  attribute.type,
+                                  attribute.normalized,
+                                  stride,
+                                  ctypes.c_void_p(attribute.offset))
+
+            glEnableVertexAttribArray(attribute.location)
+
     def Render(self):
         glBindBuffer(GL_ARRAY_BUFFER, self.VBO)
         glBindVertexArray(self.VAO)
@@ -56,3 +133,15 @@ class Buffer(object):
 
         glDrawArrays(GL_TRIANGLES, 0, int(len(self.vertexBuffer)/3))    
 
+
+
+class IndexBuffer(object):
+    def __init__(self, data):
+        # Element Buffer (uint16 / uint32)
+        self.indexBuffer = ascontiguousarray(data)
+
+        # Element Buffer Object, it is recorded in the VAO bound at creation
+        self.EBO = glGenBuffers(1)
+
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.EBO)
+        glBufferData(GL_ELEMENT_ARRAY_BUFFER, self.indexBuffer.nbytes, self.indexBuffer, GL_STATIC_DRAW)
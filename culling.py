@@ -0,0 +1,83 @@
+import numpy as np
+
+
+# Frustum culling on NumPy arrays only, no GL context needed.
+# Matrices use the glm / TransformSystem memory layout (column-major):
+# matrix[column, row], so matrix[3, :3] is the translation.
+
+
+def ToArray(matrix):
+	# glm.mat4 -> (4, 4) float32 array in the same column-major layout
+	return np.array(matrix.to_list(), dtype = np.float32)
+
+
+def ExtractFrustumPlanes(viewProjection):
+	# The six planes (left, right, bottom, top, near, far) of projection * view,
+	# as (6, 4) rows (a, b, c, d) with unit normals pointing inside:
+	# a point p is inside a plane when dot((a, b, c), p) + d >= 0
+	matrix = np.asarray(viewProjection, dtype = np.float64)
+	rows = matrix.T
+
+	planes = np.array([rows[3] + rows[0],
+					   rows[3] - rows[0],
+					   rows[3] + rows[1],
+					   rows[3] - rows[1],
+					   rows[3] + rows[2],
+					   rows[3] - rows[2]])
+
+	planes /= np.linalg.norm(planes[:, :3], axis = 1)[:, None]
+	return planes
+
+
+def WorldSpheres(matrices, centers, radii):
+	# Local bounding spheres (N, 3) / (N,) moved by (N, 4, 4) model matrices.
+	# The radius grows with the largest axis scale.
+	worldCenters = np.einsum("nc,ncr->nr", centers, matrices[:, :3, :3]) + matrices[:, 3, :3]
+	scales = np.linalg.norm(matrices[:, :3, :3], axis = 2).max(axis = 1)
+	return worldCenters, radii * scales
+
+
+def WorldBoxes(matrices, boundsMin, boundsMax):
+	# Local AABBs (N, 3) moved by (N, 4, 4) model matrices, as the center and
+	# half extents of the world AABB that encloses the transformed box
+	centers = (boundsMin + boundsMax) * 0.5
+	extents = (boundsMax - boundsMin) * 0.5
+	worldCenters = np.einsum("nc,ncr->nr", centers, matrices[:, :3, :3]) + matrices[:, 3, :3]
+	worldExtents = np.einsum("nc,ncr->nr", extents, np.abs(matrices[:, :3, :3]))
+	return worldCenters, worldExtents
+
+
+def SpheresVisible(planes, centers, radii):
+	# (N,) bool: False only for spheres completely outside some plane
+	distances = centers @ planes[:, :3].T + planes[:, 3]
+	return (distances >= -radii[:, None]).all(axis = 1)
+
+
+def BoxesVisible(planes, centers, extents):
+	# (N,) bool: False only for boxes completely outside some plane
+	distances = centers @ planes[:, :3].T + planes[:, 3]
+	reach = extents @ np.abs(planes[:, :3]).T
+	return (distances >= -reach).all(axis = 1)
+
+
+def CullModels(planes, matrices, boundsMin, boundsMax, centers, radii):
+	# Visibility mask of N objects: cheap sphere test, refined with the AABB.
+	# Both tests are conservative, so an object is only culled when it is
+	# certainly outside the frustum.
+	visible = SpheresVisible(planes, *WorldSpheres(matrices, centers, radii))
+
+	candidates = np.flatnonzero(visible)
+	if len(candidates) > 0:
+		boxCenters, boxExtents = WorldBoxes(matrices[candidates], boundsMin[candidates], boundsMax[candidates])
+		visible[candidates] = BoxesVisible(planes, boxCenters, boxExtents)
+
+	return visible
+
+
+def ProjectedRadii(view, projection, centers, radii, height):
+	# Approximate on-screen radius in pixels of world bounding spheres, from
+	# their depth in view space. Spheres around (or behind) the camera get inf.
+	depths = -(centers @ view[:3, 2] + view[3, 2])
+	scale = projection[1, 1] * height * 0.5
+	with np.errstate(divide = "ignore"):
+		return np.where(depths > radii, radii * scale / np.maximum(depths, 1e-6), np.inf)
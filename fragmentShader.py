@@ -1,5 +1,7 @@
 # GLSL
 
+from frameUniforms import FRAME_UNIFORMS_BLOCK
+
 fragment_shader = '''
 #version 330 core
 
@@ -10,8 +12,7 @@ in vec4 fragPosition;
 out vec4 fragColor;
 
 uniform sampler2D tex0;
-uniform vec3 pointLight;
-uniform float ambientLight;
+''' + FRAME_UNIFORMS_BLOCK + '''
 
 void main()
 {
@@ -33,9 +34,7 @@ in vec4 fragPosition;
 out vec4 fragColor;
 
 uniform sampler2D tex0;
-uniform vec3 pointLight;
-uniform float ambientLight;
-uniform float time;
+''' + FRAME_UNIFORMS_BLOCK + '''
 
 void main()
 {
@@ -83,9 +82,7 @@ in vec4 fragPosition;
 out vec4 fragColor;
 
 uniform sampler2D tex0;
-uniform float time;
-uniform vec3 pointLight;
-uniform float ambientLight;
+''' + FRAME_UNIFORMS_BLOCK + '''
 
 void main()
 {
@@ -140,9 +137,7 @@ in vec4 fragPosition;
 out vec4 fragColor;
 
 uniform sampler2D tex0;
-uniform float time;
-uniform vec3 pointLight;
-uniform float ambientLight;
+''' + FRAME_UNIFORMS_BLOCK + '''
 
 // Pseudo-random function
 float random(vec2 st) {
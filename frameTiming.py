@@ -0,0 +1,121 @@
+import time
+
+import numpy as np
+
+
+# CPU phases of one frame of the main loop, in order
+PHASES = ("events", "camera", "assets", "skybox", "scene", "swap")
+
+
+class FrameTimer(object):
+    def __init__(self, clock, maxFps = 60, capacity = 1024):
+        # maxFps = 0 runs uncapped (benchmark mode)
+        self.clock = clock
+        self.maxFps = maxFps
+
+        # Ring buffers with the last `capacity` frames, in seconds
+        self.capacity = capacity
+        self.frameTimes = np.zeros(capacity)
+        self.phaseTimes = np.zeros((capacity, len(PHASES)))
+        self.frameCount = 0
+
+        # GPU pass times (ms) reported by gpuTiming.GpuTimer, if enabled.
+        # NaN where no GPU result was recorded for that frame.
+        self.gpuPasses = ()
+        self.gpuTimes = None
+
+        self.phaseIndex = {phase: i for i, phase in enumerate(PHASES)}
+        self.current = np.zeros(len(PHASES))
+        self.frameStart = None
+        self.lapStart = None
+
+
+    def Tick(self):
+        # The single pacing point of the loop. Closes the previous frame and
+        # starts the next one; returns deltaTime in seconds.
+        deltaTime = self.clock.tick(self.maxFps) / 1000
+
+        now = time.perf_counter()
+        if self.frameStart is not None:
+            row = self.frameCount % self.capacity
+            self.frameTimes[row] = now - self.frameStart
+            self.phaseTimes[row] = self.current
+            self.frameCount += 1
+
+        self.current[:] = 0
+        if self.gpuTimes is not None:
+            self.gpuTimes[self.frameCount % self.capacity] = np.nan
+        self.frameStart = now
+        self.lapStart = now
+
+        return deltaTime
+
+
+    def Lap(self, phase):
+        # Charges the time since the previous lap (or the frame start) to phase
+        now = time.perf_counter()
+        if self.lapStart is not None:
+            self.current[self.phaseIndex[phase]] += now - self.lapStart
+        self.lapStart = now
+
+
+    def RecordGpu(self, results):
+        # results: pass name -> GPU milliseconds. GPU results arrive a frame
+        # late, they are stored alongside the CPU times of the current frame.
+        if self.gpuTimes is None:
+            self.gpuPasses = tuple(results)
+            self.gpuTimes = np.full((self.capacity, len(self.gpuPasses)), np.nan)
+
+        self.gpuTimes[self.frameCount % self.capacity] = [results[name] for name in self.gpuPasses]
+
+
+    def GpuMeans(self):
+        # Mean GPU time per pass in milliseconds, over frames that have one
+        if self.gpuTimes is None:
+            return {}
+        times = self.gpuTimes[:min(self.frameCount, self.capacity)]
+        valid = ~np.isnan(times).any(axis = 1)
+        if not valid.any():
+            return {}
+        return dict(zip(self.gpuPasses, times[valid].mean(axis = 0)))
+
+
+    def Recorded(self):
+        count = min(self.frameCount, self.capacity)
+        return self.frameTimes[:count], self.phaseTimes[:count]
+
+
+    def Percentiles(self, percentiles = (50, 95, 99)):
+        # Frame time percentiles in milliseconds
+        frameTimes, _ = self.Recorded()
+        if len(frameTimes) == 0:
+            return {p: 0.0 for p in percentiles}
+        values = np.percentile(frameTimes, percentiles) * 1000
+        return dict(zip(percentiles, values))
+
+
+    def PhaseMeans(self):
+        # Mean CPU time per phase in milliseconds
+        _, phaseTimes = self.Recorded()
+        if len(phaseTimes) == 0:
+            return {phase: 0.0 for phase in PHASES}
+        return dict(zip(PHASES, phaseTimes.mean(axis = 0) * 1000))
+
+
+    def Summary(self):
+        frameTimes, _ = self.Recorded()
+        if len(frameTimes) == 0:
+            return "Frame timing: no frames recorded"
+
+        p = self.Percentiles()
+        lines = [f"Frame timing ({len(frameTimes)} of {self.frameCount} frames, "
+                 f"{'uncapped' if self.maxFps == 0 else f'cap {self.maxFps} FPS'}):",
+                 f"  avg FPS: {1.0 / frameTimes.mean():.1f}",
+                 f"  frame ms  p50: {p[50]:.2f}  p95: {p[95]:.2f}  p99: {p[99]:.2f}"]
+
+        gpuMeans = self.GpuMeans()
+        for phase, mean in self.PhaseMeans().items():
+            gpu = f"   GPU {gpuMeans[phase]:7.3f} ms" if phase in gpuMeans else ""
+            lines.append(f"  {phase:8s} {mean:7.3f} ms{gpu}")
+
+        return "\n".join(lines)
@@ -0,0 +1,82 @@
+from OpenGL.GL import *
+import numpy as np
+
+
+# Uniform buffer binding point of the FrameUniforms block. Every ShaderProgram
+# that declares the block is linked to it (see shaderProgram.ShaderProgram),
+# so all programs read the same buffer.
+FRAME_UNIFORMS_BINDING = 0
+
+# GLSL declaration pasted into every shader (vertexShader.py, fragmentShader.py,
+# skybox.py). Must match FRAME_UNIFORMS_DTYPE.
+FRAME_UNIFORMS_BLOCK = '''
+layout (std140) uniform FrameUniforms
+{
+    mat4 viewMatrix;
+    mat4 projectionMatrix;
+    vec3 pointLight;
+    float ambientLight;
+    float time;
+    float value;
+};
+'''
+
+# std140 layout of the block: mat4 columns are vec4 (16-byte aligned), a float
+# fills the last slot of the preceding vec3, the size rounds up to 16
+FRAME_UNIFORMS_DTYPE = np.dtype({"names":   ["viewMatrix", "projectionMatrix", "pointLight", "ambientLight", "time", "value"],
+                                 "formats": [(np.float32, (4, 4)), (np.float32, (4, 4)), (np.float32, 3), np.float32, np.float32, np.float32],
+                                 "offsets": [0, 64, 128, 140, 144, 148],
+                                 "itemsize": 160})
+
+
+class FrameUniforms(object):
+    # Per-frame camera and lighting values in one std140 uniform buffer,
+    # written at most once per frame and shared by every program
+    def __init__(self, binding = FRAME_UNIFORMS_BINDING):
+        self.binding = binding
+        self.data = np.zeros(1, dtype = FRAME_UNIFORMS_DTYPE)
+
+        # Bytes of the last upload, so frames where nothing moved skip it
+        self.uploaded = None
+
+        self.UBO = glGenBuffers(1)
+        glBindBuffer(GL_UNIFORM_BUFFER, self.UBO)
+        glBufferData(GL_UNIFORM_BUFFER, self.data.nbytes, None, GL_DYNAMIC_DRAW)
+        glBindBuffer(GL_UNIFORM_BUFFER, 0)
+        glBindBufferBase(GL_UNIFORM_BUFFER, self.binding, self.UBO)
+
+        # Uploads issued / skipped (unchanged) in the last frame
+        self.uploads = 0
+        self.skipped = 0
+
+
+    def Update(self, camera, pointLight, ambientLight, time, value):
+        # to_list() gives the glm columns, the layout GLSL expects
+        block = self.data[0]
+        block["viewMatrix"] = camera.viewMatrix.to_list()
+        block["projectionMatrix"] = camera.projectionMatrix.to_list()
+        block["pointLight"] = pointLight
+        block["ambientLight"] = ambientLight
+        block["time"] = time
+        block["value"] = value
+
+        data = self.data.tobytes()
+        if data == self.uploaded:
+            self.skipped += 1
+            return
+
+        glBindBuffer(GL_UNIFORM_BUFFER, self.UBO)
+        glBufferSubData(GL_UNIFORM_BUFFER, 0, len(data), data)
+        glBindBuffer(GL_UNIFORM_BUFFER, 0)
+        self.uploaded = data
+        self.uploads += 1
+
+
+    def ResetCounters(self):
+        self.uploads = 0
+        self.skipped = 0
+
+
+    def Delete(self):
+        glDeleteBuffers(1, [self.UBO])
+        self.UBO = None
@@ -1,12 +1,20 @@
 import glm  # pip install PyGLM
 from OpenGL.GL import *
-from OpenGL.GL.shaders import compileProgram, compileShader
+import numpy as np
 
 from camera import Camera
+from culling import ExtractFrustumPlanes, CullModels, ProjectedRadii, WorldSpheres, ToArray
+from frameUniforms import FrameUniforms
+from gpuTiming import GpuTimer
+from sceneGraph import BuildDrawList
+from shaderProgram import ProgramRegistry, programState
 from skybox import Skybox
+from texture import textures
+from transform import transforms
+from vertexShader import MakeInstanced
 
 class Renderer(object):
-    def __init__(self, screen):
+    def __init__(self, screen, shaderCacheDir = None):
         self.screen = screen
         _,_, self.width, self.height = screen.get_rect()
 
@@ -24,6 +32,16 @@ class Renderer(object):
         self.scene = []
         self.activeShader = None
         
+        # Instanced variant of the active program, compiled the first time
+        # the scene contains an InstancedModel
+        self.instancedShader = None
+        self.shaderSources = (None, None)
+        
+        # Compiled programs per (vertex, fragment) source pair, so switching
+        # shaders at runtime does not recompile (or leak) programs.
+        # shaderCacheDir optionally keeps driver program binaries on disk.
+        self.programs = ProgramRegistry(binaryCacheDir = shaderCacheDir)
+        
         # Shader uniforms
         self.elapsedTime = 0.0
         self.value = 0.5
@@ -32,17 +50,59 @@ class Renderer(object):
         self.pointLight = glm.vec3(0, 0, 0)
         self.ambientLight = 0.2
         
+        # Camera, lighting, time and value above reach every program (skybox
+        # included) through one uniform buffer, written once per frame
+        self.frameUniforms = FrameUniforms()
+        
         # Skybox
         self.skybox = None
         
+        # Optional frameTiming.FrameTimer, charged with the skybox and scene passes
+        self.timer = None
+        
+        # GL_TIME_ELAPSED queries around the skybox and scene passes.
+        # Off by default; gpuTimer.results is a no-op dict of zeros when
+        # the driver has no timer queries.
+        self.gpuTimer = GpuTimer()
+        
+        # World matrices recomputed in the last frame (dirty transforms and their subtrees)
+        self.matrixUpdates = 0
+        
+        # View-frustum culling of Models, and of the OBJ groups of the Models
+        # that pass, against their bounding volumes. Counts are for the last
+        # frame; instanced groups are always drawn.
+        self.frustumCulling = True
+        self.culledCount = 0
+        self.culledGroups = 0
+        self.drawnCount = 0
+        
+        # Level of detail per Model from its projected radius in pixels;
+        # triangles drawn in the last frame
+        self.levelOfDetail = True
+        self.trianglesDrawn = 0
+        
+        # Draws are sorted by (program, material, VAO) to minimize state
+        # changes; texture binds and program switches of the last frame
+        self.sortDraws = True
+        self.textureBinds = 0
+        self.programSwitches = 0
+        
+        # Uniform uploads issued / skipped (unchanged value) in the last frame,
+        # FrameUniforms buffer included
+        self.uniformUploads = 0
+        self.uniformSkips = 0
+        
         # Filled mode - Iniciar con modelo sólido
         self.filledMode = False
         self.ToggleFilledMode()
         
     
-    def CreateSkybox(self, textureList):
-        self.skybox = Skybox(textureList)
-        self.skybox.cameraRef = self.camera
+    def CreateSkybox(self, textureList, faces = None):
+        self.SetSkybox(Skybox(textureList, faces))
+
+
+    def SetSkybox(self, skybox):
+        self.skybox = skybox
         
         
     def ToggleFilledMode(self):
@@ -56,65 +116,227 @@ class Renderer(object):
     
     
     def SetShaders(self, vertexShader, fragmentShader):
+        self.shaderSources = (vertexShader, fragmentShader)
+        self.instancedShader = None
+        
         if vertexShader is not None and fragmentShader is not None:
-            self.activeShader = compileProgram(compileShader(vertexShader, GL_VERTEX_SHADER),
-                                               compileShader(fragmentShader, GL_FRAGMENT_SHADER))
+            self.activeShader = self.programs.Get(vertexShader, fragmentShader)
         else:
             self.activeShader = None
     
 
         
 
+    def GetInstancedShader(self):
+        if self.instancedShader is None and self.activeShader is not None:
+            vertexShader, fragmentShader = self.shaderSources
+            self.instancedShader = self.programs.Get(MakeInstanced(vertexShader), fragmentShader)
+        return self.instancedShader
+
+
+    def FramePrograms(self):
+        # Shader programs used by Render
+        programs = []
+        if self.skybox is not None:
+            programs.append(self.skybox.shaders)
+        if self.activeShader is not None:
+            programs.append(self.activeShader)
+        if self.instancedShader is not None:
+            programs.append(self.instancedShader)
+        return programs
+
+
+    def SetFrameUniforms(self, program):
+        program.Use()
+        
+        # The per-frame values are in the FrameUniforms buffer; only the
+        # texture sampler is program state (uploaded once, then skipped)
+        program.SetUniform("tex0", 0)
+
+
+    def CullDrawList(self, drawList):
+        # Drops the objects whose world bounds are outside the camera frustum,
+        # then marks the groups of multi-group Models that are outside
+        candidates = [obj for obj in drawList if hasattr(obj, "boundsMin")]
+        if not self.frustumCulling or not candidates:
+            for obj in candidates:
+                obj.groupCulled[:] = False
+            return drawList
+
+        planes = ExtractFrustumPlanes(ToArray(self.camera.projectionMatrix * self.camera.viewMatrix))
+        matrices = np.stack([obj.transforms.matrices[obj.transformIndex] for obj in candidates])
+        visible = CullModels(planes, matrices,
+                             np.stack([obj.boundsMin for obj in candidates]),
+                             np.stack([obj.boundsMax for obj in candidates]),
+                             np.stack([obj.boundingCenter for obj in candidates]),
+                             np.array([obj.boundingRadius for obj in candidates], dtype = np.float32))
+
+        culled = {id(obj) for obj, inside in zip(candidates, visible) if not inside}
+        self.culledCount = len(culled)
+
+        # All the groups of the surviving models in one test
+        grouped = [i for i in np.flatnonzero(visible) if len(candidates[i].groups) > 1]
+        for i in np.flatnonzero(visible):
+            candidates[i].groupCulled[:] = False
+
+        if grouped:
+            groupCounts = [len(candidates[i].groups) for i in grouped]
+            groupVisible = CullModels(planes, np.repeat(matrices[grouped], groupCounts, axis = 0),
+                                      np.concatenate([candidates[i].groupBoundsMin for i in grouped]),
+                                      np.concatenate([candidates[i].groupBoundsMax for i in grouped]),
+                                      np.concatenate([candidates[i].groupCenters for i in grouped]),
+                                      np.concatenate([candidates[i].groupRadii for i in grouped]))
+
+            for i, mask in zip(grouped, np.split(groupVisible, np.cumsum(groupCounts)[:-1])):
+                candidates[i].groupCulled[:] = ~mask
+            self.culledGroups = int((~groupVisible).sum())
+
+        return [obj for obj in drawList if id(obj) not in culled]
+
+
+    def SelectLods(self, drawList):
+        # Picks the level of every Model with simplified levels, in one pass.
+        # Instance groups take the level of their largest instance on screen,
+        # so the nearest copies keep full detail.
+        models = [obj for obj in drawList if len(getattr(obj, "lodScreenRadii", ())) > 0]
+        groups = [obj for obj in drawList
+                  if getattr(obj, "instanced", False) and len(obj.model.lodScreenRadii) > 0 and len(obj.instances) > 0]
+        if not models and not groups:
+            return
+
+        if not self.levelOfDetail:
+            for obj in models + groups:
+                obj.lod = 0
+            return
+
+        # One sphere per Model, one per instance of each group
+        sources = [(obj.boundingCenter, obj.boundingRadius) for obj in models]
+        sources += [(obj.model.boundingCenter, obj.model.boundingRadius) for obj in groups]
+        counts = [1] * len(models) + [len(obj.instances) for obj in groups]
+
+        matrices = np.concatenate([obj.transforms.matrices[obj.transformIndex][None] for obj in models] +
+                                  [obj.instances["modelMatrix"] for obj in groups])
+        centers, radii = WorldSpheres(matrices,
+                                      np.repeat(np.stack([center for center, _ in sources]), counts, axis = 0),
+                                      np.repeat(np.array([radius for _, radius in sources], dtype = np.float32), counts))
+        screenRadii = ProjectedRadii(ToArray(self.camera.viewMatrix), ToArray(self.camera.projectionMatrix),
+                                     centers, radii, self.height)
+        screenRadii = np.maximum.reduceat(screenRadii, np.concatenate([[0], np.cumsum(counts)[:-1]]))
+
+        # Level = how many thresholds the object is below
+        for i, (obj, screenRadius) in enumerate(zip(models + groups, screenRadii)):
+            thresholds = obj.lodScreenRadii if i < len(models) else obj.model.lodScreenRadii
+            obj.lod = int(sum(screenRadius < threshold for threshold in thresholds))
+
+
+    def BuildBatches(self, drawList):
+        # (program, textures, VAO, object, counts, offsets) per material of each
+        # object. counts is None for objects that draw themselves (instance groups).
+        batches = []
+        for obj in drawList:
+            if getattr(obj, "instanced", False):
+                # Binds the textures of each material itself; the first
+                # material's only serve as sort key
+                program = self.GetInstancedShader()
+                if program is not None:
+                    batches.append((program, obj.model.MaterialTextures(0), int(obj.VAO), obj, None, None))
+            elif hasattr(obj, "DrawRanges"):
+                for material, counts, offsets in obj.DrawRanges():
+                    batches.append((self.activeShader, obj.MaterialTextures(material), int(obj.VAO), obj, counts, offsets))
+            else:
+                batches.append((self.activeShader, (), 0, obj, None, None))
+
+        if self.sortDraws:
+            batches.sort(key = lambda batch: (batch[0].program if batch[0] is not None else 0, batch[1], batch[2]))
+        return batches
+
+
     def Render(self):
+        for program in self.FramePrograms():
+            program.ResetCounters()
+        textures.ResetBindings()
+        textures.ResetCounters()
+        programState.Reset()
+        programState.ResetCounters()
+        self.frameUniforms.ResetCounters()
+
+        # One upload for every program drawn this frame
+        self.frameUniforms.Update(self.camera, self.pointLight, self.ambientLight, self.elapsedTime, self.value)
+
         # Limpiar UNA SOLA VEZ al inicio
         glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
         
         # Render skybox primero con depth en modo fondo
+        self.gpuTimer.Begin("skybox")
         if self.skybox is not None:
             glDepthFunc(GL_LEQUAL)
             glDepthMask(GL_FALSE)
             self.skybox.Render()
             glDepthMask(GL_TRUE)
             glDepthFunc(GL_LESS)
+        self.gpuTimer.End("skybox")
+        
+        if self.timer is not None:
+            self.timer.Lap("skybox")
         
         # NO llamar camera.Update() - la viewMatrix ya está configurada en el loop principal
 
-        glUseProgram(self.activeShader)
-        
-        # Pass uniforms to shaders
-        if self.activeShader is not None:
-            # Time and value
-            timeLocation = glGetUniformLocation(self.activeShader, "time")
-            if timeLocation != -1:
-                glUniform1f(timeLocation, self.elapsedTime)
-            
-            valueLocation = glGetUniformLocation(self.activeShader, "value")
-            if valueLocation != -1:
-                glUniform1f(valueLocation, self.value)
-            
-            # Camera matrices
-            glUniformMatrix4fv(glGetUniformLocation(self.activeShader, "viewMatrix"),
-                              1, GL_FALSE, glm.value_ptr(self.camera.viewMatrix))
-            
-            glUniformMatrix4fv(glGetUniformLocation(self.activeShader, "projectionMatrix"),
-                              1, GL_FALSE, glm.value_ptr(self.camera.projectionMatrix))
-            
-            # Lighting
-            glUniform3fv(glGetUniformLocation(self.activeShader, "pointLight"),
-                        1, glm.value_ptr(self.pointLight))
-            
-            glUniform1f(glGetUniformLocation(self.activeShader, "ambientLight"), self.ambientLight)
-            
-            # Texture samplers
-            glUniform1i(glGetUniformLocation(self.activeShader, "tex0"), 0)
-
-        for obj in self.scene:
-            if self.activeShader is not None:
-                modelMatrix = obj.GetModelMatrix()
-                glUniformMatrix4fv(
-                    glGetUniformLocation(self.activeShader, "modelMatrix"),
-                    1,
-                    GL_FALSE,
-                    glm.value_ptr(modelMatrix)
-                )
-            obj.Render()
+        self.gpuTimer.Begin("scene")
+
+        # Every dirty model matrix in one vectorized pass
+        self.matrixUpdates = transforms.Update()
+
+        # scene holds the roots; their subtrees are drawn too
+        self.culledCount = 0
+        self.culledGroups = 0
+        drawList = self.CullDrawList(BuildDrawList(self.scene, sort = self.sortDraws))
+        self.drawnCount = len(drawList)
+        self.SelectLods(drawList)
+        self.trianglesDrawn = 0
+
+        # Program, textures and VAO only change between batches that differ
+        program = False
+        vertexArray = None
+        for batchProgram, batchTextures, batchVAO, obj, counts, offsets in self.BuildBatches(drawList):
+            if batchProgram is not program:
+                program = batchProgram
+                if program is None:
+                    programState.Use(0)
+                else:
+                    self.SetFrameUniforms(program)
+
+            # Instance groups (one draw call each, matrices from the instance VBO)
+            # and other objects bind their own state
+            if counts is None:
+                if program is not None and not getattr(obj, "instanced", False):
+                    program.SetUniform("modelMatrix", obj.GetModelMatrix())
+                obj.Render()
+                self.trianglesDrawn += getattr(obj, "trianglesDrawn", 0)
+                vertexArray = None
+                continue
+
+            if program is not None:
+                program.SetUniform("modelMatrix", obj.GetModelMatrix())
+            textures.BindAll(batchTextures)
+            if batchVAO != vertexArray:
+                glBindVertexArray(batchVAO)
+                vertexArray = batchVAO
+            obj.DrawRange(counts, offsets)
+            self.trianglesDrawn += int(counts.sum()) // 3
+
+        glBindVertexArray(0)
+
+        self.gpuTimer.End("scene")
+        self.gpuTimer.EndFrame()
+
+        if self.timer is not None:
+            self.timer.Lap("scene")
+            if self.gpuTimer.Active():
+                self.timer.RecordGpu(self.gpuTimer.results)
+
+        # State change counters for this frame
+        self.textureBinds = textures.binds
+        self.programSwitches = programState.switches
+        programs = self.FramePrograms()
+        self.uniformUploads = sum(program.uploads for program in programs) + self.frameUniforms.uploads
+        self.uniformSkips = sum(program.skipped for program in programs) + self.frameUniforms.skipped
@@ -0,0 +1,81 @@
+from OpenGL.GL import *
+from OpenGL.error import GLError, NullFunctionError
+import ctypes
+
+
+# GPU passes timed inside Renderer.Render, in order
+GPU_PASSES = ("skybox", "scene")
+
+
+def TimerQueriesSupported():
+    # GL_TIME_ELAPSED needs GL 3.3 / ARB_timer_query and a counter with
+    # non-zero resolution; some software rasterizers report 0 bits
+    try:
+        return glGetQueryiv(GL_TIME_ELAPSED, GL_QUERY_COUNTER_BITS) > 0
+    except (GLError, NullFunctionError):
+        return False
+
+
+class GpuTimer(object):
+    def __init__(self, passes = GPU_PASSES, latency = 2):
+        self.passes = passes
+        self.passIndex = {name: i for i, name in enumerate(passes)}
+        self.latency = latency
+
+        self.supported = TimerQueriesSupported()
+        self.enabled = False
+
+        # Last resolved GPU time per pass in milliseconds. Results arrive
+        # `latency - 1` frames late so reading them never stalls the pipeline.
+        self.results = {name: 0.0 for name in passes}
+
+        # One set of queries per in-flight frame: queries[frame][pass]
+        self.queries = []
+        self.issued = [False] * latency
+        self.frame = 0
+        if self.supported:
+            ids = glGenQueries(latency * len(passes))
+            self.queries = [ids[i * len(passes):(i + 1) * len(passes)] for i in range(latency)]
+
+        self.result = ctypes.c_uint64()
+
+
+    def Active(self):
+        return self.enabled and self.supported
+
+
+    def Begin(self, name):
+        if self.Active():
+            glBeginQuery(GL_TIME_ELAPSED, self.queries[self.frame][self.passIndex[name]])
+
+
+    def End(self, name):
+        if self.Active():
+            glEndQuery(GL_TIME_ELAPSED)
+
+
+    def EndFrame(self):
+        # Marks this frame's queries as issued and reads back the oldest set
+        if not self.Active():
+            self.issued = [False] * self.latency
+            return
+
+        self.issued[self.frame] = True
+        self.frame = (self.frame + 1) % self.latency
+
+        # The slot about to be reused holds the oldest frame still in flight
+        if not self.issued[self.frame]:
+            return
+
+        queries = self.queries[self.frame]
+        if not glGetQueryObjectiv(queries[-1], GL_QUERY_RESULT_AVAILABLE):
+            # Not finished yet: drop that frame's result rather than stall,
+            # the slot is reused for the next frame
+            self.issued[self.frame] = False
+            return
+
+        for name, query in zip(self.passes, queries):
+            glGetQueryObjectui64v(query, GL_QUERY_RESULT, ctypes.byref(self.result))
+            self.results[name] = self.result.value / 1e6
+
+        self.issued[self.frame] = False
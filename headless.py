@@ -0,0 +1,265 @@
+import os
+
+# PyOpenGL elige la plataforma al importarse, asi que este modulo debe
+# importarse antes que cualquier otro que use OpenGL.
+# EGL por defecto; PYOPENGL_PLATFORM=osmesa para OSMesa.
+os.environ.setdefault("PYOPENGL_PLATFORM", "egl")
+
+import ctypes
+import time
+from concurrent.futures import ThreadPoolExecutor
+from math import sin, cos, radians
+
+import numpy as np
+from OpenGL.GL import *
+
+
+# EGL_MESA_platform_surfaceless: contexto sin ventana ni display
+EGL_PLATFORM_SURFACELESS_MESA = 0x31DD
+
+
+class HeadlessContext(object):
+    def __init__(self, width, height):
+        self.platform = os.environ["PYOPENGL_PLATFORM"]
+
+        if self.platform == "osmesa":
+            self._CreateOSMesa(width, height)
+        else:
+            self._CreateEGL()
+
+
+    def _CreateEGL(self):
+        from OpenGL import EGL
+
+        major, minor = EGL.EGLint(), EGL.EGLint()
+
+        # Surfaceless (Mesa) primero; si no, el display por defecto del driver
+        self.display = EGL.eglGetPlatformDisplay(EGL_PLATFORM_SURFACELESS_MESA, EGL.EGL_DEFAULT_DISPLAY, None)
+        try:
+            EGL.eglInitialize(self.display, ctypes.pointer(major), ctypes.pointer(minor))
+        except EGL.EGLError:
+            self.display = EGL.eglGetDisplay(EGL.EGL_DEFAULT_DISPLAY)
+            EGL.eglInitialize(self.display, ctypes.pointer(major), ctypes.pointer(minor))
+
+        configAttributes = (EGL.EGLint * 5)(EGL.EGL_SURFACE_TYPE, EGL.EGL_PBUFFER_BIT,
+                                            EGL.EGL_RENDERABLE_TYPE, EGL.EGL_OPENGL_BIT,
+                                            EGL.EGL_NONE)
+        config = EGL.EGLConfig()
+        count = EGL.EGLint()
+        EGL.eglChooseConfig(self.display, configAttributes, ctypes.pointer(config), 1, ctypes.pointer(count))
+        if count.value == 0:
+            raise RuntimeError("EGL: no hay configuracion con soporte OpenGL")
+
+        # Compatibility profile, igual que la ventana de pygame
+        EGL.eglBindAPI(EGL.EGL_OPENGL_API)
+        contextAttributes = (EGL.EGLint * 7)(EGL.EGL_CONTEXT_MAJOR_VERSION, 4,
+                                             EGL.EGL_CONTEXT_MINOR_VERSION, 5,
+                                             EGL.EGL_CONTEXT_OPENGL_PROFILE_MASK,
+                                             EGL.EGL_CONTEXT_OPENGL_COMPATIBILITY_PROFILE_BIT,
+                                             EGL.EGL_NONE)
+        self.context = EGL.eglCreateContext(self.display, config, EGL.EGL_NO_CONTEXT, contextAttributes)
+
+        # Sin surface: todo el rendering va a un FBO
+        EGL.eglMakeCurrent(self.display, EGL.EGL_NO_SURFACE, EGL.EGL_NO_SURFACE, self.context)
+        self._egl = EGL
+
+
+    def _CreateOSMesa(self, width, height):
+        from OpenGL import arrays, osmesa
+
+        self.context = osmesa.OSMesaCreateContextExt(osmesa.OSMESA_RGBA, 24, 0, 0, None)
+        if not self.context:
+            raise RuntimeError("OSMesa: no se pudo crear el contexto")
+
+        # OSMesa necesita un buffer propio aunque se dibuje en un FBO
+        self.buffer = arrays.GLubyteArray.zeros((height, width, 4))
+        osmesa.OSMesaMakeCurrent(self.context, self.buffer, GL_UNSIGNED_BYTE, width, height)
+        self._osmesa = osmesa
+
+
+    def Destroy(self):
+        if self.platform == "osmesa":
+            self._osmesa.OSMesaDestroyContext(self.context)
+        else:
+            self._egl.eglMakeCurrent(self.display, self._egl.EGL_NO_SURFACE, self._egl.EGL_NO_SURFACE, self._egl.EGL_NO_CONTEXT)
+            self._egl.eglDestroyContext(self.display, self.context)
+            self._egl.eglTerminate(self.display)
+
+
+class OffscreenTarget(object):
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.frameBytes = width * height * 4
+
+        # Framebuffer Object con color RGBA8 y depth/stencil
+        self.FBO = glGenFramebuffers(1)
+        glBindFramebuffer(GL_FRAMEBUFFER, self.FBO)
+
+        self.colorBuffer, self.depthBuffer = glGenRenderbuffers(2)
+
+        glBindRenderbuffer(GL_RENDERBUFFER, self.colorBuffer)
+        glRenderbufferStorage(GL_RENDERBUFFER, GL_RGBA8, width, height)
+        glFramebufferRenderbuffer(GL_FRAMEBUFFER, GL_COLOR_ATTACHMENT0, GL_RENDERBUFFER, self.colorBuffer)
+
+        glBindRenderbuffer(GL_RENDERBUFFER, self.depthBuffer)
+        glRenderbufferStorage(GL_RENDERBUFFER, GL_DEPTH24_STENCIL8, width, height)
+        glFramebufferRenderbuffer(GL_FRAMEBUFFER, GL_DEPTH_STENCIL_ATTACHMENT, GL_RENDERBUFFER, self.depthBuffer)
+
+        status = glCheckFramebufferStatus(GL_FRAMEBUFFER)
+        if status != GL_FRAMEBUFFER_COMPLETE:
+            raise RuntimeError(f"Framebuffer incompleto: {status}")
+
+        # Dos Pixel Buffer Objects: glReadPixels del frame N va a un PBO
+        # mientras se lee el del frame N-1, sin esperar a la GPU
+        self.PBOs = glGenBuffers(2)
+        for pbo in self.PBOs:
+            glBindBuffer(GL_PIXEL_PACK_BUFFER, pbo)
+            glBufferData(GL_PIXEL_PACK_BUFFER, self.frameBytes, None, GL_STREAM_READ)
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, 0)
+
+        self.frame = 0
+
+
+    def get_rect(self):
+        # Misma interfaz que la surface de pygame que recibe el Renderer
+        return (0, 0, self.width, self.height)
+
+
+    def Bind(self):
+        glBindFramebuffer(GL_FRAMEBUFFER, self.FBO)
+        glViewport(0, 0, self.width, self.height)
+
+
+    def Readback(self):
+        # Encola la lectura del frame recien dibujado y devuelve los pixeles
+        # del frame anterior (None en el primer frame)
+        glBindFramebuffer(GL_READ_FRAMEBUFFER, self.FBO)
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, self.PBOs[self.frame % 2])
+        glReadPixels(0, 0, self.width, self.height, GL_RGBA, GL_UNSIGNED_BYTE, ctypes.c_void_p(0))
+
+        pixels = self._Map(self.PBOs[(self.frame + 1) % 2]) if self.frame > 0 else None
+
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, 0)
+        self.frame += 1
+        return pixels
+
+
+    def Finish(self):
+        # Pixeles del ultimo frame encolado por Readback
+        if self.frame == 0:
+            return None
+        pixels = self._Map(self.PBOs[(self.frame - 1) % 2])
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, 0)
+        return pixels
+
+
+    def _Map(self, pbo):
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, pbo)
+        pointer = glMapBufferRange(GL_PIXEL_PACK_BUFFER, 0, self.frameBytes, GL_MAP_READ_BIT)
+
+        # OpenGL entrega las filas de abajo hacia arriba
+        pixels = np.empty((self.height, self.width, 4), dtype = np.uint8)
+        ctypes.memmove(pixels.ctypes.data, pointer, self.frameBytes)
+        glUnmapBuffer(GL_PIXEL_PACK_BUFFER)
+
+        return pixels[::-1]
+
+
+def SaveFrame(pixels, filename, fileFormat):
+    if fileFormat == "raw":
+        with open(filename, "wb") as file:
+            file.write(np.ascontiguousarray(pixels).tobytes())
+    else:
+        import pygame
+        height, width = pixels.shape[:2]
+        surface = pygame.image.frombuffer(np.ascontiguousarray(pixels).tobytes(), (width, height), "RGBA")
+        pygame.image.save(surface, filename)
+
+
+def RenderTurntable(args):
+    import glm
+
+    from gl import Renderer
+    from model import Model
+    from vertexShader import vertex_shader
+    from fragmentShader import fragment_shader
+
+    context = HeadlessContext(args.width, args.height)
+
+    target = OffscreenTarget(args.width, args.height)
+    target.Bind()
+
+    rend = Renderer(target, shaderCacheDir = ".shadercache")
+    rend.pointLight = glm.vec3(5, 5, 10)
+    rend.ambientLight = 0.8
+    rend.SetShaders(vertex_shader, fragment_shader)
+
+    rend.CreateSkybox([f"skybox/{face}.jpg" for face in ("right", "left", "top", "bottom", "front", "back")])
+
+    car = Model(args.model)
+    if args.texture:
+        car.AddTexture(args.texture)
+    car.position = glm.vec3(0, -0.2, 0)
+    car.rotation.y = 180
+    rend.scene.append(car)
+
+    os.makedirs(args.output, exist_ok = True)
+    extension = "rgba" if args.format == "raw" else "png"
+
+    # La escritura de archivos corre en otro hilo y se solapa con el rendering
+    writer = ThreadPoolExecutor(max_workers = 1)
+    pending = []
+
+    def Write(index, pixels):
+        filename = os.path.join(args.output, f"frame_{index:05d}.{extension}")
+        pending.append(writer.submit(SaveFrame, pixels, filename, args.format))
+
+    focus = glm.vec3(car.position.x, car.position.y + 0.5, car.position.z)
+
+    start = time.perf_counter()
+
+    for i in range(args.frames):
+        angle = 360.0 * i / args.frames
+        rend.camera.position = glm.vec3(focus.x + sin(radians(angle)) * args.distance,
+                                        focus.y + 0.8,
+                                        focus.z + cos(radians(angle)) * args.distance)
+        rend.camera.viewMatrix = glm.lookAt(rend.camera.position, focus, glm.vec3(0, 1, 0))
+        rend.elapsedTime = i / 60.0
+
+        rend.Render()
+
+        pixels = target.Readback()
+        if pixels is not None:
+            Write(i - 1, pixels)
+
+    Write(args.frames - 1, target.Finish())
+    renderTime = time.perf_counter() - start
+
+    for future in pending:
+        future.result()
+    totalTime = time.perf_counter() - start
+    writer.shutdown()
+
+    print(f"{args.frames} frames {args.width}x{args.height} -> {args.output}/ ({args.format})")
+    print(f"  render + readback: {args.frames / renderTime:.1f} frames/s")
+    print(f"  incluyendo escritura: {args.frames / totalTime:.1f} frames/s")
+
+    context.Destroy()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description = "Render offscreen (sin ventana) de un turntable del modelo")
+    parser.add_argument("--model", default = "models/Porsche_911_GT2.obj")
+    parser.add_argument("--texture", default = "models/car/0000.BMP")
+    parser.add_argument("--width", type = int, default = 960)
+    parser.add_argument("--height", type = int, default = 540)
+    parser.add_argument("--frames", type = int, default = 120)
+    parser.add_argument("--distance", type = float, default = 5.0)
+    parser.add_argument("--format", choices = ("png", "raw"), default = "png")
+    parser.add_argument("--output", default = "frames")
+    args = parser.parse_args()
+
+    RenderTurntable(args)
@@ -0,0 +1,93 @@
+import numpy as np
+
+
+# Grid resolution (cells along the largest side) of each generated level.
+# Level 0 is the full mesh.
+LOD_RESOLUTIONS = (64, 32, 16)
+
+# Minimum projected radius in pixels to use each level (level 0 first);
+# smaller objects fall through to the last level. The demo's default view
+# (960x540, camera 5 units away) shows the car at about 104 px: level 0.
+LOD_SCREEN_RADII = (64.0, 32.0, 16.0)
+
+
+def _Representatives(positions, texCoords, normals, resolution):
+	# Vertex clustering: vertices in the same grid cell collapse onto the vertex
+	# closest to the cluster mean. The cell of the texture coordinates and the
+	# normal octant are part of the cluster too, so vertices on either side of
+	# a UV seam or a hard edge are never merged. Returns the representative of
+	# every vertex.
+	low = positions.min(axis = 0)
+	size = float((positions.max(axis = 0) - low).max())
+	if size <= 0:
+		return np.arange(len(positions))
+
+	cells = np.clip(((positions - low) * (resolution / size)).astype(np.int64), 0, resolution)
+	uvCells = np.floor(texCoords * resolution).astype(np.int64)
+	octants = ((normals[:, 0] > 0) * 4 + (normals[:, 1] > 0) * 2 + (normals[:, 2] > 0)).astype(np.int64)
+	# Row-wise unique: UV cells are unbounded (tiled textures), no packed key
+	_, cluster = np.unique(np.column_stack([cells, uvCells, octants]), axis = 0, return_inverse = True)
+	cluster = cluster.reshape(-1)
+
+	counts = np.bincount(cluster)
+	means = np.stack([np.bincount(cluster, weights = positions[:, axis]) for axis in range(3)], axis = 1) / counts[:, None]
+	distances = np.linalg.norm(positions - means[cluster], axis = 1)
+
+	# Closest vertex to the mean = first of each cluster when sorted by (cluster, distance)
+	order = np.lexsort((distances, cluster))
+	firsts = order[np.concatenate([[True], cluster[order][1:] != cluster[order][:-1]])]
+	return firsts[cluster]
+
+
+def SimplifyLevel(vertices, indices, groupCounts, resolution):
+	# One LOD level over the same vertex table: an index list that only uses
+	# cluster representatives, without degenerate or repeated triangles.
+	# groupCounts: index count of each consecutive group range of indices.
+	# Returns (indices, group index counts, max error, mean error); errors are
+	# the distance each used vertex moves, in model units.
+	positions = vertices[:, 0:3]
+	representative = _Representatives(positions, vertices[:, 3:5], vertices[:, 5:8], resolution)
+
+	triangles = representative[indices.astype(np.int64)].reshape(-1, 3)
+	keep = ((triangles[:, 0] != triangles[:, 1]) & (triangles[:, 1] != triangles[:, 2]) &
+			(triangles[:, 0] != triangles[:, 2]))
+
+	# The same triangle can come out of several source triangles; keep the first
+	# (row-wise unique: a key packed from three vertex indices overflows int64
+	# past about 2M vertices)
+	ordered = np.sort(triangles, axis = 1)
+	candidates = np.flatnonzero(keep)
+	_, first = np.unique(ordered[candidates], axis = 0, return_index = True)
+	keep[:] = False
+	keep[candidates[first]] = True
+
+	triangleGroups = np.repeat(np.arange(len(groupCounts)), np.asarray(groupCounts) // 3)
+	levelCounts = np.bincount(triangleGroups[keep], minlength = len(groupCounts)) * 3
+
+	used = np.unique(indices)
+	moved = np.linalg.norm(positions[used] - positions[representative[used]], axis = 1)
+
+	levelIndices = triangles[keep].reshape(-1).astype(indices.dtype)
+	return levelIndices, levelCounts, float(moved.max()) if len(moved) else 0.0, float(moved.mean()) if len(moved) else 0.0
+
+
+def BuildLods(vertices, indices, groups, resolutions = LOD_RESOLUTIONS):
+	# Generated levels for BuildMesh: (index arrays, metadata per level).
+	# Group ranges keep their order, so level ranges follow from the counts.
+	groupCounts = [group["count"] for group in groups]
+	arrays = []
+	levels = []
+
+	for resolution in resolutions:
+		levelIndices, levelCounts, maxError, meanError = SimplifyLevel(vertices, indices, groupCounts, resolution)
+		firsts = np.concatenate([[0], np.cumsum(levelCounts)[:-1]])
+
+		arrays.append(levelIndices)
+		levels.append({"resolution": resolution,
+					   "triangles": len(levelIndices) // 3,
+					   "maxError": maxError,
+					   "meanError": meanError,
+					   "groupFirst": firsts.tolist(),
+					   "groupCount": levelCounts.tolist()})
+
+	return arrays, levels
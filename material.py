@@ -0,0 +1,86 @@
+import os
+
+from texture import textures
+
+
+class Material(object):
+	# One newmtl entry of a .mtl file. Only the diffuse map is bound when
+	# drawing; the colors are kept for shaders that want them.
+
+	def __init__(self, name):
+		self.name = name
+		self.ambient = (1.0, 1.0, 1.0)
+		self.diffuse = (0.8, 0.8, 0.8)
+		self.specular = (0.0, 0.0, 0.0)
+		self.shininess = 0.0
+		self.opacity = 1.0
+		self.illumination = 2
+
+		# Path of map_Kd, and its GL texture once LoadTextures runs
+		self.diffuseMap = None
+		self.diffuseTexture = None
+
+
+	def LoadTextures(self):
+		if self.diffuseMap is not None and self.diffuseTexture is None:
+			try:
+				self.diffuseTexture = textures.Get(self.diffuseMap)
+			except (OSError, ValueError) as e:
+				print(f"No se pudo cargar la textura '{self.diffuseMap}' del material '{self.name}': {e}")
+				self.diffuseMap = None
+
+
+def _Floats(values, count):
+	return tuple(float(value) for value in values[:count])
+
+
+def ParseMaterialLibrary(filename):
+	# Devuelve nombre -> Material. Las rutas de los mapas son relativas al .mtl
+	directory = os.path.dirname(filename)
+	materials = {}
+	material = None
+
+	with open(filename, "r", encoding = "utf-8", errors = "replace") as file:
+		for line in file:
+			line = line.split("#", 1)[0].strip()
+			if not line:
+				continue
+
+			prefix, _, value = line.partition(" ")
+			values = value.split()
+
+			if prefix == "newmtl":
+				material = materials[value.strip()] = Material(value.strip())
+			elif material is None:
+				continue
+			elif prefix == "Ka":
+				material.ambient = _Floats(values, 3)
+			elif prefix == "Kd":
+				material.diffuse = _Floats(values, 3)
+			elif prefix == "Ks":
+				material.specular = _Floats(values, 3)
+			elif prefix == "Ns":
+				material.shininess = float(values[0])
+			elif prefix == "d":
+				material.opacity = float(values[-1])
+			elif prefix == "Tr":
+				material.opacity = 1.0 - float(values[-1])
+			elif prefix == "illum":
+				material.illumination = int(values[0])
+			elif prefix == "map_Kd" and values:
+				# Las opciones (-s, -o, -bm ...) van antes del nombre del archivo
+				material.diffuseMap = os.path.join(directory, values[-1].replace("\\", "/"))
+
+	return materials
+
+
+# Libraries already parsed, so models that share a .mtl share its Material
+# objects (and draws can be batched by material across models)
+_libraries = {}
+
+
+def LoadMaterialLibrary(filename):
+	key = os.path.abspath(filename)
+	if key not in _libraries:
+		_libraries[key] = ParseMaterialLibrary(filename)
+	return _libraries[key]
@@ -0,0 +1,206 @@
+import hashlib
+import json
+import os
+import struct
+import sys
+import threading
+
+import numpy as np
+
+
+# Formato del archivo de cache:
+#   MAGIC | uint32 largo del header | header JSON | arreglos alineados a ALIGNMENT
+# El header guarda la llave de la fuente (ruta, mtime, tamano, hash), los
+# metadatos del modelo y la ubicacion (dtype, shape, offset) de cada arreglo,
+# que se abren con numpy.memmap sin copiar ni parsear nada.
+# El mismo formato guarda las texturas decodificadas (extension "tex").
+MAGIC = b"MESHCACH"
+VERSION = 8
+ALIGNMENT = 64
+CACHE_DIR = ".meshcache"
+
+
+class Mesh(object):
+	def __init__(self, arrays, metadata):
+		# arrays: nombre -> numpy array (memmap cuando viene de la cache)
+		self.arrays = arrays
+		self.metadata = metadata
+
+
+def CachePath(filename, extension = "mesh"):
+	source = os.path.abspath(filename)
+	digest = hashlib.sha1(source.encode("utf-8")).hexdigest()[:12]
+	return os.path.join(os.path.dirname(source), CACHE_DIR, f"{os.path.basename(source)}.{digest}.{extension}")
+
+
+def ContentHash(filename):
+	digest = hashlib.sha1()
+	with open(filename, "rb") as file:
+		for block in iter(lambda: file.read(1 << 20), b""):
+			digest.update(block)
+	return digest.hexdigest()
+
+
+def _Align(offset):
+	return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def _Dtype(descr):
+	# dtype guardado con dtype_to_descr (como en .npy): un string para los
+	# tipos simples, una lista de campos para los registros (COMPACT_VERTEX).
+	# JSON devuelve listas donde descr_to_dtype espera tuplas.
+	if isinstance(descr, str):
+		return np.dtype(descr)
+	return np.lib.format.descr_to_dtype([tuple(tuple(part) if isinstance(part, list) else part for part in field) for field in descr])
+
+
+def _ReadHeader(path):
+	with open(path, "rb") as file:
+		if file.read(len(MAGIC)) != MAGIC:
+			return None
+		length, = struct.unpack("<I", file.read(4))
+		return json.loads(file.read(length))
+
+
+def _RewriteHeader(path, header):
+	# Reescribe el header en su lugar (los arreglos no se tocan), si entra en
+	# el espacio reservado; si no se puede, queda como estaba
+	data = json.dumps(header).encode("utf-8")
+	try:
+		with open(path, "r+b") as file:
+			file.seek(len(MAGIC))
+			length, = struct.unpack("<I", file.read(4))
+			if len(data) <= length:
+				file.write(data.ljust(length))
+	except OSError:
+		pass
+
+
+def Load(filename, extension = "mesh"):
+	# Devuelve el Mesh cacheado, o None si no existe o ya no corresponde a la fuente
+	path = CachePath(filename, extension)
+	try:
+		header = _ReadHeader(path)
+		stat = os.stat(filename)
+	except (OSError, ValueError):
+		return None
+
+	if header is None or header["version"] != VERSION:
+		return None
+
+	# mtime y tamano alcanzan para el caso comun; si cambiaron, el hash
+	# del contenido decide (p.ej. el archivo fue copiado o tocado sin cambios)
+	if header["mtime"] != stat.st_mtime_ns or header["size"] != stat.st_size:
+		if header["size"] != stat.st_size or header["hash"] != ContentHash(filename):
+			return None
+
+		# Mismo contenido: se guarda el mtime nuevo para no volver a calcular
+		# el hash en cada carga (p.ej. despues de un touch o un git checkout)
+		header["mtime"] = stat.st_mtime_ns
+		_RewriteHeader(path, header)
+
+	arrays = {}
+	for name, spec in header["arrays"].items():
+		shape = tuple(spec["shape"])
+		dtype = _Dtype(spec["dtype"])
+		if 0 in shape:
+			arrays[name] = np.zeros(shape, dtype = dtype)
+		else:
+			arrays[name] = np.memmap(path, dtype = dtype, mode = "r", offset = spec["offset"], shape = shape)
+
+	return Mesh(arrays, header["metadata"])
+
+
+def Store(filename, mesh, extension = "mesh"):
+	path = CachePath(filename, extension)
+	os.makedirs(os.path.dirname(path), exist_ok = True)
+
+	stat = os.stat(filename)
+	header = {"version": VERSION,
+			  "source": os.path.abspath(filename),
+			  "mtime": stat.st_mtime_ns,
+			  "size": stat.st_size,
+			  "hash": ContentHash(filename),
+			  "metadata": mesh.metadata,
+			  "arrays": {}}
+
+	arrays = {name: np.ascontiguousarray(array) for name, array in mesh.arrays.items()}
+
+	# Los offsets dependen del largo del header, que a su vez los contiene:
+	# se reserva espacio de sobra para los digitos de los offsets
+	for name, array in arrays.items():
+		header["arrays"][name] = {"dtype": np.lib.format.dtype_to_descr(array.dtype), "shape": list(array.shape), "offset": 0}
+	reserve = len(json.dumps(header)) + 24 * len(arrays)
+
+	offset = _Align(len(MAGIC) + 4 + reserve)
+	for name, array in arrays.items():
+		header["arrays"][name]["offset"] = offset
+		offset = _Align(offset + array.nbytes)
+
+	headerBytes = json.dumps(header).encode("utf-8").ljust(reserve)
+
+	# Se escribe a un temporal y se reemplaza, para que un proceso que lea
+	# en paralelo nunca vea un archivo a medias (un temporal por hilo: el
+	# cargador de assets puede guardar desde varios a la vez)
+	temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+	with open(temporary, "wb") as file:
+		file.write(MAGIC)
+		file.write(struct.pack("<I", len(headerBytes)))
+		file.write(headerBytes)
+		for name, array in arrays.items():
+			file.seek(header["arrays"][name]["offset"])
+			file.write(array.tobytes())
+	os.replace(temporary, path)
+
+	return path
+
+
+def Bake(directory, force = False, optimize = False, overdraw = False):
+	# Genera la cache de todos los .obj dentro de directory, con vertices
+	# float ("mesh") y compactos ("cmesh", Model(compact = True));
+	# optimize / overdraw aplican las pasadas de meshopt (ver model.BuildMesh)
+	from buffer import PackCompact
+	from model import BuildMesh
+	from obj import Obj
+
+	def UpToDate(filename, extension):
+		cached = None if force else Load(filename, extension)
+		if cached is None:
+			return False
+		settings = cached.metadata.get("optimize", {})
+		return (settings.get("enabled") or not optimize) and (settings.get("overdraw") or not (optimize and overdraw))
+
+	for root, dirs, files in os.walk(directory):
+		dirs[:] = [d for d in dirs if d != CACHE_DIR]
+		for name in sorted(files):
+			if not name.lower().endswith(".obj"):
+				continue
+
+			filename = os.path.join(root, name)
+			stale = [extension for extension in ("mesh", "cmesh") if not UpToDate(filename, extension)]
+			if not stale:
+				print(f"  {filename}: cache al dia")
+				continue
+
+			mesh = BuildMesh(Obj(filename), optimize, overdraw)
+			for extension in stale:
+				if extension == "cmesh":
+					mesh = Mesh(dict(mesh.arrays, vertices = PackCompact(mesh.arrays["vertices"])), mesh.metadata)
+				path = Store(filename, mesh, extension)
+				print(f"  {filename} -> {path}")
+
+
+if __name__ == "__main__":
+	import argparse
+
+	parser = argparse.ArgumentParser(description = "Pre-genera la cache binaria de los modelos OBJ")
+	parser.add_argument("directory", nargs = "?", default = "models")
+	parser.add_argument("--force", action = "store_true", help = "Regenerar aunque la cache este al dia")
+	parser.add_argument("--optimize", action = "store_true", help = "Reordenar para la cache de vertices (mas lento de generar)")
+	parser.add_argument("--overdraw", action = "store_true", help = "Con --optimize, ordenar tambien los clusters contra el overdraw")
+	args = parser.parse_args()
+
+	if not os.path.isdir(args.directory):
+		sys.exit(f"No existe el directorio '{args.directory}'")
+
+	Bake(args.directory, args.force, args.optimize, args.overdraw)
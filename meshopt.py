@@ -0,0 +1,172 @@
+from collections import deque
+
+import numpy as np
+
+
+# Post-transform vertex cache optimization (Tipsify, Sander et al. 2007) and
+# the matching vertex reorder, on NumPy index arrays only: no GL needed.
+
+# Cache size the triangle order is tuned for, and the FIFO size ACMR is
+# measured with
+CACHE_SIZE = 16
+
+# Clusters smaller than this (in triangles) are merged with the next one
+# before sorting them for overdraw
+MIN_CLUSTER = 64
+
+
+def Acmr(indices, cacheSize = CACHE_SIZE):
+	# Average cache miss ratio: transformed vertices per triangle with a FIFO
+	# post-transform cache of cacheSize entries. 3.0 is the worst case; about
+	# 0.5 is the limit for large regular meshes.
+	if len(indices) == 0:
+		return 0.0
+
+	cache = deque()
+	cached = set()
+	misses = 0
+	for index in indices.tolist():
+		if index in cached:
+			continue
+		misses += 1
+		cache.append(index)
+		cached.add(index)
+		if len(cache) > cacheSize:
+			cached.discard(cache.popleft())
+
+	return misses / (len(indices) // 3)
+
+
+def _Adjacency(triangles, vertexCount):
+	# Triangles around each vertex in CSR form: triangles of vertex v are
+	# adjacency[offsets[v]:offsets[v + 1]]
+	corners = triangles.reshape(-1)
+	adjacency = np.argsort(corners, kind = "stable") // 3
+	offsets = np.concatenate([[0], np.cumsum(np.bincount(corners, minlength = vertexCount))])
+	return adjacency, offsets
+
+
+def Tipsify(indices, vertexCount, cacheSize = CACHE_SIZE):
+	# Reorders the triangles of indices for a cacheSize vertex cache: it fans
+	# around one vertex at a time and picks the next one among the vertices
+	# just used that will still be in the cache.
+	# Returns the new triangle order and the positions in that order where
+	# a cluster starts (each jump to a vertex that is not in the cache).
+	triangles = indices.reshape(-1, 3).astype(np.int64)
+	if len(triangles) == 0:
+		return np.zeros(0, dtype = np.int64), [0]
+
+	adjacency, offsets = _Adjacency(triangles, vertexCount)
+	adjacency, offsets = adjacency.tolist(), offsets.tolist()
+	corners = triangles.tolist()
+
+	live = np.bincount(triangles.reshape(-1), minlength = vertexCount).tolist()
+	stamps = [0] * vertexCount
+	emitted = [False] * len(corners)
+	deadEnds = []
+	order = []
+	clusters = [0]
+
+	time = cacheSize + 1
+	cursor = 0
+	fan = int(triangles[0, 0])
+
+	while fan >= 0:
+		candidates = set()
+		for triangle in adjacency[offsets[fan]:offsets[fan + 1]]:
+			if emitted[triangle]:
+				continue
+			emitted[triangle] = True
+			order.append(triangle)
+			for vertex in corners[triangle]:
+				deadEnds.append(vertex)
+				candidates.add(vertex)
+				live[vertex] -= 1
+				if time - stamps[vertex] > cacheSize:
+					stamps[vertex] = time
+					time += 1
+
+		# Next fan: the candidate used longest ago that will still be cached
+		# after emitting its remaining triangles
+		fan = -1
+		best = -1
+		for vertex in candidates:
+			if live[vertex] > 0:
+				priority = 0
+				if time - stamps[vertex] + 2 * live[vertex] <= cacheSize:
+					priority = time - stamps[vertex]
+				if priority > best:
+					best = priority
+					fan = vertex
+
+		if fan < 0:
+			# Dead end: the most recent vertex with triangles left, or else
+			# the next one in index order. Either way a new cluster starts.
+			while deadEnds and fan < 0:
+				vertex = deadEnds.pop()
+				if live[vertex] > 0:
+					fan = vertex
+			while fan < 0 and cursor < vertexCount:
+				if live[cursor] > 0:
+					fan = cursor
+				cursor += 1
+			if fan >= 0:
+				clusters.append(len(order))
+
+	return np.array(order, dtype = np.int64), clusters
+
+
+def SortClusters(positions, triangles, clusters, minCluster = MIN_CLUSTER):
+	# Overdraw pass (Sander et al.): clusters that face away from the mesh
+	# center are drawn first, as they tend to occlude the rest. Small clusters
+	# are merged first so the cache order inside each one survives.
+	# Returns the new triangle order.
+	bounds = []
+	start = 0
+	for end in clusters[1:] + [len(triangles)]:
+		if end - start >= minCluster or end == len(triangles):
+			if end > start:
+				bounds.append((start, end))
+			start = end
+
+	corners = positions[triangles]
+	normals = np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0])
+	centroids = corners.mean(axis = 1)
+	center = centroids.mean(axis = 0)
+
+	scores = []
+	for start, end in bounds:
+		normal = normals[start:end].sum(axis = 0)
+		length = np.linalg.norm(normal)
+		scores.append(float(np.dot(centroids[start:end].mean(axis = 0) - center, normal / length)) if length > 0 else 0.0)
+
+	sortedBounds = [bounds[i] for i in np.argsort(scores, kind = "stable")[::-1]]
+	return np.concatenate([np.arange(start, end) for start, end in sortedBounds]) if sortedBounds else np.zeros(0, dtype = np.int64)
+
+
+def OptimizeRanges(indices, ranges, vertexCount, positions = None, cacheSize = CACHE_SIZE):
+	# Tipsify inside each (first, count) index range, so group / material
+	# ranges keep their place. With positions, clusters are also sorted for
+	# overdraw. Returns the reordered index array.
+	optimized = indices.copy()
+	for first, count in ranges:
+		triangles = indices[first:first + count].reshape(-1, 3)
+		order, clusters = Tipsify(triangles, vertexCount, cacheSize)
+		if positions is not None and len(order) > 0:
+			order = order[SortClusters(positions, triangles[order].astype(np.int64), clusters)]
+		optimized[first:first + count] = triangles[order].reshape(-1)
+	return optimized
+
+
+def VertexOrder(indices, vertexCount):
+	# Vertex fetch order: vertices renumbered by first use in indices,
+	# unreferenced ones last. Returns (old index of each new vertex,
+	# new index of each old vertex).
+	_, firstUse = np.unique(indices, return_index = True)
+	used = indices[np.sort(firstUse)].astype(np.int64)
+	unused = np.setdiff1d(np.arange(vertexCount), used)
+	order = np.concatenate([used, unused])
+
+	remap = np.empty(vertexCount, dtype = np.int64)
+	remap[order] = np.arange(vertexCount)
+	return order, remap
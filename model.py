@@ -1,183 +1,586 @@
 from OpenGL.GL import *
-from obj import Obj
-from buffer import Buffer
-
+from obj import Obj, FaceGroup
+from buffer import Buffer, IndexBuffer, MODEL_LAYOUT, COMPACT_LAYOUT, COMPACT_VERTEX, PackCompact
+from meshcache import Mesh
+from lod import BuildLods, LOD_SCREEN_RADII
+from meshopt import Acmr, OptimizeRanges, VertexOrder, CACHE_SIZE
+from material import LoadMaterialLibrary
+from texture import textures
+from transform import Transformable
+import meshcache
+
+import ctypes
 import glm
-
-import pygame
-
-class Model(object):
-	def __init__(self, filename):
-		self.objFile = Obj(filename)
-
-		self.position = glm.vec3(0,0,0)
-		self.rotation = glm.vec3(0,0,0)
-		self.scale = glm.vec3(1,1,1)
-
+import numpy as np
+import os
+
+
+# Rows gathered per step when filling the vertex table
+GATHER_ROWS = 1 << 16
+
+
+def _GatherInto(out, table, indices):
+	# out[i] = table[indices[i] - 1]. OBJ indices are 1-based and 0 marks a
+	# missing component (v//vn, v/vt, v), which gets zeros. Written straight
+	# into out in slices, so no temporary the size of the whole table is made.
+	for start in range(0, len(indices), GATHER_ROWS):
+		rows = indices[start:start + GATHER_ROWS]
+		block = out[start:start + len(rows)]
+		if len(table) == 0:
+			block[:] = 0
+			continue
+		block[:] = table[rows - 1]
+		block[rows == 0] = 0
+
+
+def _Deduplicate(corners, counts):
+	# Packs each (v, vt, vn) triplet into one int64 key and keeps the unique
+	# ones in order of first use, so that the vertex table stays close to the
+	# order in which the triangles reference it.
+	# Returns the corner rows of the unique vertices and the (C,) index list.
+	if (int(counts[0]) + 1) * (int(counts[1]) + 1) * (int(counts[2]) + 1) <= np.iinfo(np.int64).max:
+		keys = (corners[:, 0].astype(np.int64) * (counts[1] + 1) + corners[:, 1]) * (counts[2] + 1) + corners[:, 2]
+		_, first, inverse = np.unique(keys, return_index = True, return_inverse = True)
+	else:
+		# The packed key would overflow int64: slower row-wise unique
+		_, first, inverse = np.unique(corners, axis = 0, return_index = True, return_inverse = True)
+
+	order = np.argsort(first)
+	rank = np.empty_like(order)
+	rank[order] = np.arange(len(order))
+
+	return corners[first[order]], rank[inverse.reshape(-1)]
+
+def NormalizeVertices(vertices):
+	# Centers the (N, 3) positions on their bounding box and scales its largest
+	# side to 2, in place. Returns the bounds metadata of BuildMesh.
+	low = vertices.min(axis = 0)
+	size = np.ptp(vertices, axis = 0)
+	high = low + size
+	center = low + size / 2.0
+	maxSize = float(size.max())
+	scale = 2.0 / maxSize if maxSize > 0 else 1.0
+
+	print(f"Model bounds: X[{low[0]:.3f}, {high[0]:.3f}] Y[{low[1]:.3f}, {high[1]:.3f}] Z[{low[2]:.3f}, {high[2]:.3f}]")
+	print(f"Model size: {size[0]:.3f} x {size[1]:.3f} x {size[2]:.3f}")
+	print(f"Normalization scale: {scale:.3f}")
+
+	vertices -= center
+	vertices *= scale
+
+	return {"boundsMin": low.tolist(),
+			"boundsMax": high.tolist(),
+			"center": center.tolist(),
+			"scale": float(scale)}
+
+
+def FanTriangles(sizes):
+	# Fan triangulation of faces with sizes[i] corners, stored one after the
+	# other: face corners (0, t + 1, t + 2) for t < n - 2. Faces with fewer
+	# than 3 corners give no triangles.
+	# Returns the (T, 3) corner indices and the triangle count of each face.
+	triCounts = np.maximum(sizes.astype(np.int64) - 2, 0)
+	faceStarts = np.repeat(np.cumsum(sizes, dtype = np.int64) - sizes, triCounts)
+	triInFace = np.arange(len(faceStarts)) - np.repeat(np.cumsum(triCounts) - triCounts, triCounts)
+	triangles = faceStarts[:, None] + np.stack([np.zeros_like(triInFace), triInFace + 1, triInFace + 2], axis = 1)
+	return triangles, triCounts
+
+
+def BuildMesh(objFile, optimize = False, overdraw = False):
+	# Normalizes the OBJ data to unit size, triangulates the faces and builds
+	# the indexed geometry that gets uploaded (and cached): an interleaved
+	# pos|uv|normal table of unique vertices plus a uint16/uint32 index list.
+	# optimize reorders triangles (and vertices) for the post-transform vertex
+	# cache; overdraw also sorts the triangle clusters outside-in. Both are
+	# opt-in: the pass is pure Python and several times slower than the build.
+
+	vertices = objFile.vertices
+	metadata = {"sourceVertices": len(objFile.vertices),
+				"sourceFaces": len(objFile.faceSizes),
+				"materialLibraries": objFile.materialLibraries}
+
+	# First pass: calculate bounding box and normalize to unit size
+	if len(vertices) > 0:
+		metadata.update(NormalizeVertices(vertices))
+
+	# Triangles as (T, 3) corner indices, every n-gon fanned from its first corner
+	corners = objFile.faceCorners
+	sizes = objFile.faceSizes
+	triangles, triCounts = FanTriangles(sizes)
+
+	# Face groups (g / o / usemtl / s) become triangle ranges. Ranges that share
+	# a material are made adjacent so each material draws as few spans as possible.
+	faceGroups = objFile.faceGroups or [FaceGroup("default", None, None, None, 0, len(sizes))]
+	triangleStarts = np.concatenate([[0], np.cumsum(triCounts)])
+	groupOrder = sorted(range(len(faceGroups)), key = lambda i: (faceGroups[i].material is not None, faceGroups[i].material or ""))
+
+	triangleOrder = []
+	groups = []
+	first = 0
+	for i in groupOrder:
+		group = faceGroups[i]
+		start, end = triangleStarts[group.start], triangleStarts[group.start + group.count]
+		triangleOrder.append(np.arange(start, end))
+		groups.append({"name": group.name, "object": group.object, "material": group.material,
+					   "smoothing": group.smoothing, "first": int(first * 3), "count": int((end - start) * 3)})
+		first += end - start
+
+	if len(triangleOrder) > 0:
+		triangles = triangles[np.concatenate(triangleOrder)]
+	triangleCorners = corners[triangles.reshape(-1)]
+
+	counts = (len(vertices), len(objFile.texCoords), len(objFile.normals))
+	uniqueCorners, indices = _Deduplicate(triangleCorners, counts)
+
+	interleaved = np.empty((len(uniqueCorners), 8), dtype = np.float32)
+	_GatherInto(interleaved[:, 0:3], vertices, uniqueCorners[:, 0])
+	_GatherInto(interleaved[:, 3:5], objFile.texCoords, uniqueCorners[:, 1])
+	_GatherInto(interleaved[:, 5:8], objFile.normals, uniqueCorners[:, 2])
+
+	indexType = np.uint16 if len(interleaved) <= 0xFFFF else np.uint32
+	indices = indices.astype(indexType)
+
+	# Cache friendly triangle order inside each group range, then the vertices
+	# renumbered by first use so fetches follow the same order
+	metadata["optimize"] = {"enabled": bool(optimize), "overdraw": bool(optimize and overdraw), "cacheSize": CACHE_SIZE}
+	if optimize and len(indices) > 0:
+		acmrBefore = Acmr(indices)
+		ranges = [(group["first"], group["count"]) for group in groups]
+		indices = OptimizeRanges(indices, ranges, len(interleaved), interleaved[:, 0:3] if overdraw else None)
+		order, remap = VertexOrder(indices, len(interleaved))
+		interleaved = interleaved[order]
+		indices = remap[indices].astype(indexType)
+
+		metadata["optimize"]["acmrBefore"] = acmrBefore
+		metadata["optimize"]["acmrAfter"] = Acmr(indices)
+		print(f"ACMR ({CACHE_SIZE} vertices): {acmrBefore:.3f} -> {metadata['optimize']['acmrAfter']:.3f}")
+
+	# Per-group vertex range (for range checks) and bounds, in normalized space
+	for group in groups:
+		groupIndices = indices[group["first"]:group["first"] + group["count"]]
+		positions = interleaved[groupIndices, 0:3]
+		group["vertexStart"] = int(groupIndices.min()) if len(groupIndices) > 0 else 0
+		group["vertexEnd"] = int(groupIndices.max()) if len(groupIndices) > 0 else 0
+		group["boundsMin"] = positions.min(axis = 0).tolist() if len(positions) > 0 else [0.0, 0.0, 0.0]
+		group["boundsMax"] = positions.max(axis = 0).tolist() if len(positions) > 0 else [0.0, 0.0, 0.0]
+	metadata["groups"] = groups
+
+	# Simplified levels over the same vertex table, stored as one index array
+	lodArrays, lods = BuildLods(interleaved, indices, groups) if len(indices) > 0 else ([], [])
+	offset = len(indices)
+	for level, (lodIndices, lod) in enumerate(zip(lodArrays, lods), 1):
+		if optimize:
+			ranges = zip(lod["groupFirst"], lod["groupCount"])
+			lodArrays[level - 1] = lodIndices = OptimizeRanges(lodIndices, ranges, len(interleaved))
+		lod["first"] = offset
+		offset += len(lodIndices)
+		print(f"LOD {level}: {lod['triangles']} triangulos, error max {lod['maxError']:.4f} medio {lod['meanError']:.4f}")
+	metadata["lods"] = lods
+	lodIndices = np.concatenate(lodArrays) if lodArrays else np.zeros(0, dtype = indexType)
+
+	expandedBytes = len(indices) * interleaved.itemsize * 8
+	metadata["uniqueVertices"] = len(interleaved)
+	metadata["indexCount"] = len(indices)
+	metadata["bytesSaved"] = int(expandedBytes - interleaved.nbytes - indices.nbytes)
+
+	return Mesh({"vertices": interleaved, "indices": indices, "lodIndices": lodIndices}, metadata)
+
+
+def LoadMesh(filename, useCache = True, compact = False, optimize = False, overdraw = False):
+	# CPU side of loading a Model, safe on a worker thread: maps the baked mesh
+	# from the cache, or parses and builds it (and refreshes the cache).
+	# compact packs the vertices as COMPACT_VERTEX; that mesh has its own
+	# cache file ("cmesh"), half the size of the float one.
+	# optimize / overdraw: see BuildMesh. The cache keeps the optimized order
+	# (e.g. baked with meshcache.py --optimize), so any cache is used unless
+	# it lacks a pass that was asked for here.
+	# Returns (mesh, objFile); objFile is None on a cache hit.
+	extension = "cmesh" if compact else "mesh"
+	mesh = meshcache.Load(filename, extension) if useCache else None
+	if mesh is not None:
+		settings = mesh.metadata.get("optimize", {})
+		if (settings.get("enabled") or not optimize) and (settings.get("overdraw") or not (optimize and overdraw)):
+			return mesh, None
+
+	objFile = Obj(filename)
+	mesh = BuildMesh(objFile, optimize, overdraw)
+	if compact:
+		mesh.arrays["vertices"] = PackCompact(mesh.arrays["vertices"])
+
+	if useCache:
+		try:
+			meshcache.Store(filename, mesh, extension)
+		except OSError as e:
+			print(f"No se pudo guardar la cache de '{filename}': {e}")
+
+	return mesh, objFile
+
+
+class Model(Transformable):
+	def __init__(self, filename, useCache = True, interleaved = True, mesh = None, compact = False, optimize = False):
+		self.filename = filename
+
+		# Warm starts map the baked arrays straight from the mesh cache;
+		# objFile is only parsed (and kept) when the cache is missing or stale.
+		# mesh skips this step when it was already loaded (asset loader).
+		# compact: 16-byte vertices (buffer.COMPACT_VERTEX) instead of 32
+		self.objFile = None
+		if mesh is None:
+			mesh, self.objFile = LoadMesh(filename, useCache, compact, optimize)
+		self.mesh = mesh
+
+		# Compact vertices only exist interleaved
+		self.compact = mesh.arrays["vertices"].dtype == COMPACT_VERTEX
+		self.interleaved = interleaved or self.compact
+
+		# position / rotation / scale live in the shared TransformSystem
+		self.InitTransform()
+
+		self.ComputeBounds()
+		self.BuildGroups()
 		self.BuildBuffers()
 
+		# Textures added by hand; used by groups whose material has no map_Kd
 		self.textures = []
+		self.LoadMaterials()
 
 		self.visible = True
 
 
-	def GetModelMatrix(self):
+	def __copy__(self):
+		# Shallow copies share the GPU buffers but get their own transform slot
+		clone = object.__new__(type(self))
+		clone.__dict__.update(self.__dict__)
+		clone.AddTransform(self.position, self.rotation, self.scale)
+		clone.parent = None
+		clone.children = []
+		clone.textures = [textures.Acquire(texture) for texture in self.textures]
+
+		# Per-object draw state: culling and hiding one copy must not touch the others
+		clone.groupVisible = self.groupVisible.copy()
+		clone.groupCulled = self.groupCulled.copy()
+		clone.fullRanges = {}
+		return clone
+
+
+	def ComputeBounds(self):
+		# Local AABB and bounding sphere of the normalized mesh, used for culling.
+		# The mesh metadata keeps the source bounds from before normalization.
+		metadata = self.mesh.metadata
+		if "boundsMin" in metadata:
+			center = np.array(metadata["center"], dtype = np.float32)
+			self.boundsMin = (np.array(metadata["boundsMin"], dtype = np.float32) - center) * metadata["scale"]
+			self.boundsMax = (np.array(metadata["boundsMax"], dtype = np.float32) - center) * metadata["scale"]
+		else:
+			self.boundsMin = np.zeros(3, dtype = np.float32)
+			self.boundsMax = np.zeros(3, dtype = np.float32)
+
+		self.boundingCenter = (self.boundsMin + self.boundsMax) * 0.5
+		self.boundingRadius = float(np.linalg.norm(self.boundsMax - self.boundsMin) * 0.5)
+
+
+	def BuildGroups(self):
+		# Index ranges of the OBJ groups, drawn / hidden / culled independently.
+		# groupVisible is set by the user, groupCulled by the renderer each frame.
+		self.groups = self.mesh.metadata.get("groups") or [{"name": "default", "object": None, "material": None,
+															 "smoothing": None, "first": 0, "count": self.mesh.metadata["indexCount"],
+															 "boundsMin": self.boundsMin.tolist(), "boundsMax": self.boundsMax.tolist()}]
+
+		self.groupFirst = np.array([group["first"] for group in self.groups], dtype = np.int64)
+		self.groupCount = np.array([group["count"] for group in self.groups], dtype = np.int32)
+		self.groupBoundsMin = np.array([group["boundsMin"] for group in self.groups], dtype = np.float32).reshape(-1, 3)
+		self.groupBoundsMax = np.array([group["boundsMax"] for group in self.groups], dtype = np.float32).reshape(-1, 3)
+		self.groupCenters = (self.groupBoundsMin + self.groupBoundsMax) * 0.5
+		self.groupRadii = np.linalg.norm(self.groupBoundsMax - self.groupBoundsMin, axis = 1) * 0.5
+
+		# Material of each group, as an index into self.materials
+		self.materials = list(dict.fromkeys(group["material"] for group in self.groups))
+		self.groupMaterial = np.array([self.materials.index(group["material"]) for group in self.groups], dtype = np.int32)
+
+		self.groupVisible = np.ones(len(self.groups), dtype = bool)
+		self.groupCulled = np.zeros(len(self.groups), dtype = bool)
+
+		# Group ranges of every level of detail: level 0 is the full mesh,
+		# the simplified levels follow it in the same element buffer
+		lods = self.mesh.metadata.get("lods", [])
+		self.lodGroupFirst = np.array([self.groupFirst] + [level["first"] + np.array(level["groupFirst"], dtype = np.int64) for level in lods])
+		self.lodGroupCount = np.array([self.groupCount] + [level["groupCount"] for level in lods], dtype = np.int32)
+		self.lodTriangles = [self.mesh.metadata["indexCount"] // 3] + [level["triangles"] for level in lods]
+		self.lodErrors = [0.0] + [level["maxError"] for level in lods]
+
+		# Level drawn, chosen by the renderer from the projected size of the model
+		self.lod = 0
+		self.lodScreenRadii = LOD_SCREEN_RADII[:len(lods)]
+		self.fullRanges = {}
+
+
+	def SetGroupVisible(self, name, visible = True):
+		matches = np.array([group["name"] == name for group in self.groups], dtype = bool)
+		if not matches.any():
+			raise KeyError(f"El modelo '{self.filename}' no tiene el grupo '{name}'")
+		self.groupVisible[matches] = visible
+
+
+	def DrawRanges(self, lod = None, culling = True):
+		# (material, counts, byte offsets) per material for the visible groups.
+		# Adjacent ranges are merged, so a fully visible material is one span.
+		# lod defaults to the level picked by the renderer; culling = False
+		# ignores groupCulled (instance groups are not culled per group).
+		lod = self.lod if lod is None else lod
+		mask = self.groupVisible & ~self.groupCulled if culling else self.groupVisible
+		allVisible = mask.all()
+		if allVisible and lod in self.fullRanges:
+			return self.fullRanges[lod]
+
+		groupFirst = self.lodGroupFirst[lod]
+		groupCount = self.lodGroupCount[lod]
+
+		indexSize = 2 if self.indexType == GL_UNSIGNED_SHORT else 4
+
+		ranges = []
+		for material in range(len(self.materials)):
+			selected = np.flatnonzero(mask & (self.groupMaterial == material))
+			if len(selected) == 0:
+				continue
+
+			order = selected[np.argsort(groupFirst[selected])]
+			firsts = groupFirst[order]
+			ends = firsts + groupCount[order]
+
+			# A new span starts wherever a range does not continue the previous one
+			breaks = np.flatnonzero(firsts[1:] != ends[:-1]) + 1
+			spanFirsts = firsts[np.concatenate([[0], breaks])]
+			spanEnds = ends[np.concatenate([breaks - 1, [len(ends) - 1]])]
+
+			ranges.append((material, (spanEnds - spanFirsts).astype(np.int32), spanFirsts * indexSize))
+
+		if allVisible:
+			self.fullRanges[lod] = ranges
+		return ranges
+
+
+	def LoadMaterials(self):
+		# Materials of the mtllib files named by the OBJ, by group material index.
+		# Materials (and their textures) are shared with other models using the same .mtl
+		library = {}
+		for name in self.mesh.metadata.get("materialLibraries", []):
+			path = os.path.join(os.path.dirname(self.filename), name)
+			try:
+				library.update(LoadMaterialLibrary(path))
+			except OSError as e:
+				print(f"No se pudo cargar la biblioteca de materiales '{path}': {e}")
+
+		self.materialObjects = []
+		for name in self.materials:
+			material = library.get(name) if name is not None else None
+			if name is not None and material is None:
+				print(f"Material '{name}' no encontrado para '{self.filename}'")
+			if material is not None:
+				material.LoadTextures()
+			self.materialObjects.append(material)
+
+
+	def MaterialTextures(self, material):
+		# Textures bound for the groups of one material: its map_Kd on unit 0,
+		# otherwise the ones added with AddTexture
+		materialObject = self.materialObjects[material]
+		if materialObject is not None and materialObject.diffuseTexture is not None:
+			return (materialObject.diffuseTexture,) + tuple(self.textures[1:])
+		return tuple(self.textures)
 
-		identity = glm.mat4(1)
 
-		translateMat = glm.translate(identity, self.position)
+	def BuildBuffers(self):
 
-		pitchMat = glm.rotate(identity, glm.radians(self.rotation.x), glm.vec3(1,0,0))
-		yawMat =   glm.rotate(identity, glm.radians(self.rotation.y), glm.vec3(0,1,0))
-		rollMat =  glm.rotate(identity, glm.radians(self.rotation.z), glm.vec3(0,0,1))
+		vertices = self.mesh.arrays["vertices"]
+		indices = self.mesh.arrays["indices"]
 
-		rotationMat = pitchMat * yawMat * rollMat
+		metadata = self.mesh.metadata
+		self.vertexCount = len(vertices)
+		self.indexCount = len(indices)
+		self.bytesSaved = metadata["bytesSaved"]
+		self.indexType = GL_UNSIGNED_SHORT if indices.dtype == np.uint16 else GL_UNSIGNED_INT
 
-		scaleMat = glm.scale(identity, self.scale)
+		# Create VAO
+		self.VAO = glGenVertexArrays(1)
+		glBindVertexArray(self.VAO)
 
-		return translateMat * rotationMat * scaleMat
+		# Interleaved: one VBO with pos|uv|normal per vertex.
+		# Otherwise one VBO per attribute, as before.
+		if self.interleaved:
+			self.vertexBuffer = Buffer(vertices, COMPACT_LAYOUT if self.compact else MODEL_LAYOUT)
+		else:
+			self.posBuffer = Buffer(vertices[:, 0:3])
+			self.texCoordsBuffer = Buffer(vertices[:, 3:5])
+			self.normalsBuffer = Buffer(vertices[:, 5:8])
+
+		# The element buffer binding is part of the VAO state.
+		# It holds level 0 followed by the simplified levels.
+		lodIndices = self.mesh.arrays.get("lodIndices")
+		if lodIndices is not None and len(lodIndices) > 0:
+			indices = np.concatenate([indices, lodIndices.astype(indices.dtype)])
+		self.indexBuffer = IndexBuffer(indices)
+
+		print(f"Modelo '{self.filename}' -> vertices:{metadata['sourceVertices']} faces:{metadata['sourceFaces']} "
+			  f"uniqueVertices:{self.vertexCount} indices:{self.indexCount} bytesSaved:{self.bytesSaved}")
+		
+		# Setup vertex attributes while VAO is bound
+		if self.interleaved:
+			self.vertexBuffer.UseLayout()
+		else:
+			self.posBuffer.Use(0, 3)
+			self.texCoordsBuffer.Use(1, 2)
+			self.normalsBuffer.Use(2, 3)
+		
+		# Unbind VAO
+		glBindVertexArray(0)
 
 
-	def BuildBuffers(self):
+	def AddTexture(self, filename):
+		# Through the shared cache: the same file is uploaded only once
+		self.textures.append(textures.Get(filename))
 
-		# First pass: calculate bounding box and normalize to unit size
-		if len(self.objFile.vertices) > 0:
-			min_x = min_y = min_z = float('inf')
-			max_x = max_y = max_z = float('-inf')
-			for v in self.objFile.vertices:
-				min_x = min(min_x, v[0])
-				max_x = max(max_x, v[0])
-				min_y = min(min_y, v[1])
-				max_y = max(max_y, v[1])
-				min_z = min(min_z, v[2])
-				max_z = max(max_z, v[2])
-			
-			center_x = (min_x + max_x) / 2.0
-			center_y = (min_y + max_y) / 2.0
-			center_z = (min_z + max_z) / 2.0
-			size_x = max_x - min_x
-			size_y = max_y - min_y
-			size_z = max_z - min_z
-			max_size = max(size_x, size_y, size_z)
-			scale = 2.0 / max_size if max_size > 0 else 1.0
-			
-			print(f"Model bounds: X[{min_x:.3f}, {max_x:.3f}] Y[{min_y:.3f}, {max_y:.3f}] Z[{min_z:.3f}, {max_z:.3f}]")
-			print(f"Model size: {size_x:.3f} x {size_y:.3f} x {size_z:.3f}")
-			print(f"Normalization scale: {scale:.3f}")
-			
-			for v in self.objFile.vertices:
-				v[0] = (v[0] - center_x) * scale
-				v[1] = (v[1] - center_y) * scale
-				v[2] = (v[2] - center_z) * scale
 
-		# Create VAO
-		self.VAO = glGenVertexArrays(1)
-		glBindVertexArray(self.VAO)
+	def ReleaseTextures(self):
+		# Gives back the references taken by AddTexture; the cache deletes a
+		# texture when no Model uses it anymore
+		for texture in self.textures:
+			textures.Release(texture)
+		self.textures = []
+
+
+	def BindTextures(self, material = 0):
+		textures.BindAll(self.MaterialTextures(material))
+
 
-		positions = []
-		texCoords = []
-		normals = []
+	def DrawRange(self, counts, offsets):
+		# Expects the VAO bound; one span is a plain glDrawElements
+		if len(counts) == 1:
+			glDrawElements(GL_TRIANGLES, int(counts[0]), self.indexType, ctypes.c_void_p(int(offsets[0])))
+		else:
+			glMultiDrawElements(GL_TRIANGLES, counts, self.indexType,
+								(ctypes.c_void_p * len(offsets))(*offsets.tolist()), len(counts))
 
-		self.vertexCount = 0
 
-		for face in self.objFile.faces:
+	def Render(self):
 
-			facePositions = []
-			faceTexCoords = []
-			faceNormals = []
+		if not self.visible:
+			return
 
-			for i in range(len(face)):
-				facePositions.append( self.objFile.vertices [ face[i][0] - 1 ] )
-				faceTexCoords.append( self.objFile.texCoords[ face[i][1] - 1 ] )
-				faceNormals.append( self.objFile.normals[ face[i][2] - 1 ] )
+		# Bind VAO (contiene toda la configuración de atributos)
+		glBindVertexArray(self.VAO)
 
+		# One draw per material over the visible group ranges; a fully
+		# visible single-material model is one glDrawElements
+		for material, counts, offsets in self.DrawRanges():
+			self.BindTextures(material)
+			self.DrawRange(counts, offsets)
 
-			for value in facePositions[0]: positions.append(value)
-			for value in facePositions[1]: positions.append(value)
-			for value in facePositions[2]: positions.append(value)
+		# Unbind VAO
+		glBindVertexArray(0)
+		
+		# Unbind texture
+		textures.Bind(0, 0)
 
-			for value in faceTexCoords[0]: texCoords.append(value)
-			for value in faceTexCoords[1]: texCoords.append(value)
-			for value in faceTexCoords[2]: texCoords.append(value)
 
-			for value in faceNormals[0]: normals.append(value)
-			for value in faceNormals[1]: normals.append(value)
-			for value in faceNormals[2]: normals.append(value)
+# Per-instance data streamed to the instance VBO: one column-major model matrix
+INSTANCE_DTYPE = np.dtype([("modelMatrix", np.float32, (4, 4))])
 
-			self.vertexCount += 3
+# The instanced vertex shaders read the matrix as a mat4 attribute (4 locations)
+INSTANCE_MATRIX_LOCATION = 3
 
-			if len(face) == 4:
-				for value in facePositions[0]: positions.append(value)
-				for value in facePositions[2]: positions.append(value)
-				for value in facePositions[3]: positions.append(value)
 
-				for value in faceTexCoords[0]: texCoords.append(value)
-				for value in faceTexCoords[2]: texCoords.append(value)
-				for value in faceTexCoords[3]: texCoords.append(value)
+class InstancedModel(object):
+	# Draws many copies of one Model's geometry with a single instanced draw call.
+	# Renderer uses the instanced variant of the active vertex shader for it.
+	instanced = True
 
-				for value in faceNormals[0]: normals.append(value)
-				for value in faceNormals[2]: normals.append(value)
-				for value in faceNormals[3]: normals.append(value)
+	def __init__(self, model, count = 0):
+		self.model = model
+		self.instances = np.zeros(count, dtype = INSTANCE_DTYPE)
+		self.instances["modelMatrix"] = np.identity(4, dtype = np.float32)
+		self.dirty = True
+		self.visible = True
 
-				self.vertexCount += 3
+		# Level of detail of the whole group, picked by the renderer from its
+		# largest instance on screen; triangles drawn by the last Render
+		self.lod = 0
+		self.trianglesDrawn = 0
 
+		# Own VAO, sharing the model's vertex and element buffers
+		self.VAO = glGenVertexArrays(1)
+		glBindVertexArray(self.VAO)
 
-		self.posBuffer = Buffer(positions)
-		self.texCoordsBuffer = Buffer(texCoords)
-		self.normalsBuffer = Buffer(normals)
+		if model.interleaved:
+			model.vertexBuffer.UseLayout()
+		else:
+			model.posBuffer.Use(0, 3)
+			model.texCoordsBuffer.Use(1, 2)
+			model.normalsBuffer.Use(2, 3)
+		glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, model.indexBuffer.EBO)
+
+		# Instance VBO: a mat4 attribute takes four vec4 locations, advanced once per instance
+		self.instanceVBO = glGenBuffers(1)
+		glBindBuffer(GL_ARRAY_BUFFER, self.instanceVBO)
+
+		for column in range(4):
+			location = INSTANCE_MATRIX_LOCATION + column
+			glVertexAttribPointer(location, 4, GL_FLOAT, GL_FALSE, INSTANCE_DTYPE.itemsize,
+								  ctypes.c_void_p(column * 16))
+			glEnableVertexAttribArray(location)
+			glVertexAttribDivisor(location, 1)
 
-		print(f"Modelo '{getattr(self.objFile, 'name', 'N/A')}' -> vertices:{len(self.objFile.vertices)} faces:{len(self.objFile.faces)} bufferVertices:{self.vertexCount}")
-		
-		# Setup vertex attributes while VAO is bound
-		self.posBuffer.Use(0, 3)
-		self.texCoordsBuffer.Use(1, 2)
-		self.normalsBuffer.Use(2, 3)
-		
-		# Unbind VAO
 		glBindVertexArray(0)
 
 
-	def AddTexture(self, filename):
-		print(f"Cargando textura '{filename}'")
-		textureSurface = pygame.image.load(filename)
-		textureData = pygame.image.tostring(textureSurface, "RGB", True)
+	def SetMatrices(self, matrices):
+		# matrices: (N, 4, 4) array in glm memory (column-major) order,
+		# i.e. matrices[i, 3, :3] is the translation of instance i
+		matrices = np.asarray(matrices, dtype = np.float32)
+		if len(self.instances) != len(matrices):
+			self.instances = np.zeros(len(matrices), dtype = INSTANCE_DTYPE)
+		self.instances["modelMatrix"] = matrices
+		self.dirty = True
+
 
-		texture = glGenTextures(1)
-		glBindTexture(GL_TEXTURE_2D, texture)
+	def AddInstance(self, modelMatrix):
+		# modelMatrix: glm.mat4, or a (4, 4) array in column-major order
+		if isinstance(modelMatrix, glm.mat4):
+			modelMatrix = modelMatrix.to_list()
 
-		glTexImage2D(GL_TEXTURE_2D,
-					 0,
-					 GL_RGB,
-					 textureSurface.get_width(),
-					 textureSurface.get_height(),
-					 0,
-					 GL_RGB,
-					 GL_UNSIGNED_BYTE,
-					 textureData)
+		instance = np.zeros(1, dtype = INSTANCE_DTYPE)
+		instance["modelMatrix"] = np.array(modelMatrix, dtype = np.float32)
+		self.instances = np.concatenate([self.instances, instance])
+		self.dirty = True
+		return len(self.instances) - 1
 
-		glGenerateMipmap(GL_TEXTURE_2D)
 
-		self.textures.append(texture)
+	def Upload(self):
+		# Streams the instance array to the GPU. glBufferData orphans the old
+		# storage, so the driver never waits on the previous frame's draw.
+		glBindBuffer(GL_ARRAY_BUFFER, self.instanceVBO)
+		glBufferData(GL_ARRAY_BUFFER, self.instances.nbytes, self.instances, GL_STREAM_DRAW)
+		glBindBuffer(GL_ARRAY_BUFFER, 0)
+		self.dirty = False
 
 
 	def Render(self):
 
-		if not self.visible:
+		self.trianglesDrawn = 0
+		if not self.visible or len(self.instances) == 0:
 			return
 
-		# Bind textures
-		for i in range(len(self.textures)):
-			glActiveTexture(GL_TEXTURE0 + i)
-			glBindTexture(GL_TEXTURE_2D, self.textures[i])
+		if self.dirty:
+			self.Upload()
 
-		# Bind VAO (contiene toda la configuración de atributos)
 		glBindVertexArray(self.VAO)
 
-		# Draw the model
-		glDrawArrays(GL_TRIANGLES, 0, self.vertexCount)
+		# One instanced draw per span of each material, with that material's
+		# textures (group level of detail, groups hidden with SetGroupVisible skipped)
+		for material, counts, offsets in self.model.DrawRanges(lod = self.lod, culling = False):
+			self.model.BindTextures(material)
+			for count, offset in zip(counts.tolist(), offsets.tolist()):
+				glDrawElementsInstanced(GL_TRIANGLES, count, self.model.indexType,
+										ctypes.c_void_p(offset), len(self.instances))
+			self.trianglesDrawn += int(counts.sum()) // 3 * len(self.instances)
 
-		# Unbind VAO
 		glBindVertexArray(0)
-		
-		# Unbind texture
-		glBindTexture(GL_TEXTURE_2D, 0)
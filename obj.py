@@ -1,14 +1,518 @@
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import resource_tracker, shared_memory
+import mmap
+import os
+import re
+
+import numpy as np
+
+
+# Expresiones para extraer el cuerpo de cada tipo de registro en bloque,
+# sin recorrer el archivo linea por linea desde Python.
+# Se buscan despues de un salto de linea (el texto se parsea con un "\n"
+# al inicio) para que el motor de regex pueda saltar al prefijo literal.
+def _RecordPattern(prefix):
+	return re.compile(rb"\n" + prefix + rb"[ \t]+([^\r\n#]*)")
+
+_vertexPattern = _RecordPattern(rb"v")
+_texCoordPattern = _RecordPattern(rb"vt")
+_normalPattern = _RecordPattern(rb"vn")
+_facePattern = _RecordPattern(rb"f")
+_materialLibraryPattern = _RecordPattern(rb"mtllib")
+
+# Registros que agrupan las caras: grupo, objeto, material y smoothing group
+_groupPattern = re.compile(rb"\n(g|o|usemtl|s)(?:[ \t]+([^\r\n#]*))?(?=[\r\n#]|$)")
+
+
+# Tramo consecutivo de caras con el mismo grupo / objeto / material / smoothing.
+# start y count se cuentan en caras.
+FaceGroup = namedtuple("FaceGroup", ["name", "object", "material", "smoothing", "start", "count"])
+
+_GROUP_KEYS = {"g": "name", "o": "object", "usemtl": "material", "s": "smoothing"}
+_DEFAULT_GROUP = {"name": "default", "object": None, "material": None, "smoothing": None}
+
+
+class _GroupTracker(object):
+	# Arma la lista de FaceGroup a medida que aparecen los registros g/o/usemtl/s
+	def __init__(self):
+		self.state = dict(_DEFAULT_GROUP)
+		self.start = 0
+		self.groups = []
+
+
+	def Record(self, prefix, value, faceCount):
+		# faceCount: caras leidas antes de este registro
+		self.Close(faceCount)
+		value = value.split("#", 1)[0].strip() if value else ""
+		self.state[_GROUP_KEYS[prefix]] = value or None
+		if prefix == "g" and not self.state["name"]:
+			self.state["name"] = "default"
+
+
+	def Close(self, faceCount):
+		if faceCount > self.start:
+			self.groups.append(FaceGroup(start = self.start, count = faceCount - self.start, **self.state))
+			self.start = faceCount
+
+
+def _GroupRecords(data):
+	# Los registros de grupo son pocos: se recorren con finditer y las caras
+	# entre uno y otro se cuentan con bytes.count, sin tocar cada linea.
+	# Devuelve (prefijo, valor, caras antes del registro) de cada uno.
+	records = []
+	faces = 0
+	previous = 0
+
+	for match in _groupPattern.finditer(data):
+		faces += data.count(b"\nf ", previous, match.start()) + data.count(b"\nf\t", previous, match.start())
+		previous = match.start()
+		value = match.group(2)
+		records.append((match.group(1).decode(), value.decode("utf-8", "replace") if value is not None else None, faces))
+
+	return records
+
+
+def _ParseGroups(data, faceCount):
+	tracker = _GroupTracker()
+	for prefix, value, faces in _GroupRecords(data):
+		tracker.Record(prefix, value, faces)
+	tracker.Close(faceCount)
+	return tracker.groups
+
+
+def _TokenCounts(records):
+	# Cantidad de tokens de cada registro, contando sobre los bytes con numpy
+	# (un token empieza donde un caracter no blanco sigue a un blanco). Solo
+	# usa temporales de un byte por caracter o un int64 por token, para
+	# respetar la cota de memoria del streaming.
+	text = np.frombuffer(b"\n" + b"\n".join(records), dtype = np.uint8)
+	newline = text == ord("\n")
+	blank = text == ord(" ")
+	blank |= text == ord("\t")
+	blank |= text == ord("\r")
+	blank |= newline
+	starts = np.flatnonzero(blank[:-1] & ~blank[1:]) + 1
+	lines = np.searchsorted(np.flatnonzero(newline), starts, side = "right") - 1
+	return np.bincount(lines, minlength = len(records)).astype(np.int32)
+
+
+def _ParseFloats(records, width):
+	# Convierte una lista de registros "x y z ..." en un arreglo (N, width)
+	if len(records) == 0:
+		return np.zeros((0, width), dtype = np.float32)
+
+	counts = _TokenCounts(records)
+	columns = int(counts[0])
+	values = np.fromstring(b" ".join(records), dtype = np.float32, sep = " ")
+
+	# El reshape solo vale si todos los registros tienen el mismo ancho
+	if columns >= width and (counts == columns).all() and values.size == len(records) * columns:
+		values = values.reshape(-1, columns)[:, :width]
+	else:
+		# Registros con distinta cantidad de componentes (p.ej. "vt u" y "vt u v w")
+		values = np.zeros((len(records), width), dtype = np.float32)
+		for i, record in enumerate(records):
+			row = record.split()[:width]
+			values[i, :len(row)] = list(map(float, row))
+
+	return np.ascontiguousarray(values)
+
+
+def _SlashCounts(joined, count):
+	# Cantidad de "/" y de "//" de cada token de joined (registros unidos con
+	# " "), contando sobre los bytes con numpy como _TokenCounts
+	text = np.frombuffer(joined, dtype = np.uint8)
+	blank = text == ord(" ")
+	blank |= text == ord("\t")
+	blank |= text == ord("\r")
+	starts = np.flatnonzero(~blank[1:] & blank[:-1]) + 1
+	if len(text) > 0 and not blank[0]:
+		starts = np.concatenate([[0], starts])
+	del blank
+
+	slash = text == ord("/")
+	slashes = np.bincount(np.searchsorted(starts, np.flatnonzero(slash), side = "right") - 1, minlength = count)
+	doubles = np.bincount(np.searchsorted(starts, np.flatnonzero(slash[:-1] & slash[1:]), side = "right") - 1, minlength = count)
+	return slashes, doubles
+
+
+def _ParseCorners(records):
+	# Convierte los registros de caras en un arreglo (C, 3) de indices v/vt/vn
+	# y un arreglo (F,) con la cantidad de esquinas de cada cara.
+	# Los componentes ausentes ("v//vn", "v/vt", "v") se guardan como 0.
+	if len(records) == 0:
+		return np.zeros((0, 3), dtype = np.int32), np.zeros(0, dtype = np.int32)
+
+	joined = b" ".join(records)
+	sizes = _TokenCounts(records)
+	count = int(sizes.sum())
+
+	# Si todas las esquinas usan el mismo formato (los mismos "/" y "//" que
+	# la primera, token por token), se parsean de una sola vez, sin la lista
+	# de tokens, que ocupa varias veces el texto
+	values = None
+	if count > 0:
+		slashes, doubles = _SlashCounts(joined, count)
+		if (slashes == slashes[0]).all() and (doubles == doubles[0]).all():
+			text = joined.replace(b"//", b"/0/").replace(b"/", b" ")
+			values = np.fromstring(text, dtype = np.int32, sep = " ")
+			# Un componente vacio en otro lugar ("v/vt/") deja de menos
+			if values.size == count * (int(slashes[0]) + 1):
+				values = values.reshape(count, int(slashes[0]) + 1)
+			else:
+				values = None
+		del slashes, doubles
+
+	if values is None:
+		tokens = joined.split()
+		values = np.zeros((len(tokens), 3), dtype = np.int32)
+		for i, token in enumerate(tokens):
+			for j, index in enumerate(token.split(b"/")[:3]):
+				if index:
+					values[i, j] = int(index)
+
+	corners = np.zeros((count, 3), dtype = np.int32)
+	corners[:, :values.shape[1]] = values[:, :3]
+	return corners, sizes
+
+
+def _ResolveRelative(data, corners, sizes):
+	# Los indices negativos son relativos a la cantidad de elementos
+	# definidos hasta la linea de la cara: -1 es el ultimo definido.
+	facePositions = np.array([m.start() for m in _facePattern.finditer(data)])
+	cornerPositions = np.repeat(facePositions, sizes)
+
+	for column, pattern in enumerate((_vertexPattern, _texCoordPattern, _normalPattern)):
+		relative = corners[:, column] < 0
+		if not relative.any():
+			continue
+		positions = np.array([m.start() for m in pattern.finditer(data)])
+		defined = np.searchsorted(positions, cornerPositions[relative])
+		corners[relative, column] += defined.astype(np.int32) + 1
+
+
+# Parseo en paralelo: el archivo se abre con mmap y se corta en trozos de
+# CHUNK_BYTES en limites de linea; cada proceso parsea sus trozos con las
+# mismas funciones vectorizadas y devuelve los arreglos en un bloque de
+# memoria compartida (sin pickle). Solo se usa si se pide (workers > 0).
+#
+# Con workers > 1 los procesos del pool importan de nuevo el script principal
+# en las plataformas que usan "spawn" (Windows, macOS): el script que crea el
+# Obj tiene que tener su codigo dentro de un if __name__ == "__main__".
+CHUNK_BYTES = 16 << 20
+
+# Archivos desde este tamano se leen en streaming por defecto
+STREAMING_MIN_BYTES = 64 << 20
+
+
+def _ChunkBounds(view, chunkBytes):
+	# Offsets [inicio, fin) de cada trozo, cortados justo despues de un "\n"
+	bounds = [0]
+	while bounds[-1] < len(view):
+		cut = view.find(b"\n", min(bounds[-1] + chunkBytes, len(view)) - 1)
+		bounds.append(len(view) if cut < 0 else cut + 1)
+	return list(zip(bounds[:-1], bounds[1:]))
+
+
+def _ToShared(arrays):
+	# Copia los arreglos a un bloque de memoria compartida nuevo.
+	# Devuelve (nombre del bloque, {nombre: (dtype, shape, offset)}).
+	block = shared_memory.SharedMemory(create = True, size = max(sum(array.nbytes for array in arrays.values()), 1))
+	specs = {}
+	offset = 0
+	try:
+		for name, array in arrays.items():
+			np.ndarray(array.shape, dtype = array.dtype, buffer = block.buf, offset = offset)[...] = array
+			specs[name] = (array.dtype.str, array.shape, offset)
+			offset += array.nbytes
+	except BaseException:
+		block.close()
+		block.unlink()
+		raise
+	block.close()
+
+	# El bloque pasa a ser del proceso que lo une (y lo libera con unlink);
+	# si no, el resource_tracker de este proceso lo daria por perdido al salir.
+	# Solo POSIX usa el resource_tracker para la memoria compartida.
+	if os.name == "posix":
+		resource_tracker.unregister(block._name, "shared_memory")
+	return block.name, specs
+
+
+def _ReleaseShared(name):
+	# Libera un bloque de _ToShared (unlink), si todavia existe
+	try:
+		block = shared_memory.SharedMemory(name = name)
+	except FileNotFoundError:
+		return
+	block.close()
+	block.unlink()
+
+
+def _ParseBlock(data):
+	# Parsea un bloque de lineas completas (con un "\n" al inicio) por su
+	# cuenta. Los indices relativos (negativos) se resuelven contra lo definido
+	# dentro del bloque; se devuelve que esquinas eran relativas para sumarles
+	# despues lo definido en los bloques anteriores (Obj._MergeBlock).
+	arrays = {"vertices": _ParseFloats(_vertexPattern.findall(data), 3),
+			  "texCoords": _ParseFloats(_texCoordPattern.findall(data), 2),
+			  "normals": _ParseFloats(_normalPattern.findall(data), 3)}
+	arrays["faceCorners"], arrays["faceSizes"] = _ParseCorners(_facePattern.findall(data))
+
+	relative = [np.flatnonzero(arrays["faceCorners"][:, column] < 0) for column in range(3)]
+	if any(len(corners) > 0 for corners in relative):
+		_ResolveRelative(data, arrays["faceCorners"], arrays["faceSizes"])
+
+	return {"arrays": arrays,
+			"relative": relative,
+			"groups": _GroupRecords(data),
+			"materialLibraries": [name.decode("utf-8", "replace").strip() for name in _materialLibraryPattern.findall(data)]}
+
+
+def _ParseChunk(filename, start, end):
+	# Corre en un proceso del pool: parsea las lineas [start, end) del archivo
+	# y deja los arreglos en memoria compartida
+	with open(filename, "rb") as file, mmap.mmap(file.fileno(), 0, access = mmap.ACCESS_READ) as view:
+		data = b"\n" + view[start:end]
+
+	result = _ParseBlock(data)
+	result["block"], result["arrays"] = _ToShared(result["arrays"])
+	return result
+
+
+# Lectura en streaming: el archivo se lee de a BLOCK_BYTES y cada bloque se
+# parsea y se agrega a arreglos que crecen al doble, sin tener nunca el
+# texto entero ni una lista de registros de todo el archivo.
+#
+# Cota del pico de memoria (lo que mide tracemalloc), con A = bytes de los
+# arreglos finales (vertices, texCoords, normals, faceCorners, faceSizes):
+#   pico <= 3 * A + BLOCK_OVERHEAD * BLOCK_BYTES
+# 3 * A: al crecer conviven el arreglo viejo (hasta A) y el nuevo (hasta 2 * A).
+# Cada bloque se parsea con el texto, su copia con "\n", los registros de
+# findall (un objeto bytes por linea) y los arreglos del bloque.
+# Las caras con distinta cantidad de esquinas suman ademas la lista faces
+# de compatibilidad, un arreglo por cara.
+BLOCK_BYTES = 4 << 20
+BLOCK_OVERHEAD = 12
+
+
+def ReadBlocks(filename, blockBytes = BLOCK_BYTES):
+	# Generador de bloques de lineas completas de unos blockBytes cada uno
+	rest = b""
+	with open(filename, "rb") as file:
+		for block in iter(lambda: file.read(blockBytes), b""):
+			block = rest + block
+			cut = block.rfind(b"\n") + 1
+			rest = block[cut:]
+			if cut > 0:
+				yield block[:cut]
+	if rest:
+		yield rest
+
+
+class _GrowableArray(object):
+	# Arreglo (N, ...) que reserva de mas y duplica la capacidad al llenarse
+	def __init__(self, shape, dtype, capacity = 1024):
+		self.data = np.empty((capacity, ) + tuple(shape), dtype = dtype)
+		self.count = 0
+
+
+	def Extend(self, rows):
+		end = self.count + len(rows)
+		if end > len(self.data):
+			grown = np.empty((max(end, 2 * len(self.data)), ) + self.data.shape[1:], dtype = self.data.dtype)
+			grown[:self.count] = self.data[:self.count]
+			self.data = grown
+		self.data[self.count:end] = rows
+		self.count = end
+
+
+	def Array(self):
+		# Copia del tamano justo; la reserva se libera con el objeto
+		return self.data[:self.count].copy()
+
+
 class Obj(object):
-	def __init__(self, filename):
+	def __init__(self, filename, vectorized = True, workers = 0, streaming = None):
 		# Asumiendo que el archivo es un formato .obj
-		with open(filename, "r") as file:
-			lines = file.read().splitlines()
-			
+		# workers: procesos del parseo en paralelo; 0 (por defecto) no lo usa.
+		# Ver la nota de CHUNK_BYTES sobre el script principal.
+		# streaming: lectura por bloques con memoria acotada. Con None, los
+		# archivos desde STREAMING_MIN_BYTES se leen asi si no hay workers.
+		if streaming is None:
+			streaming = workers == 0 and os.path.getsize(filename) >= STREAMING_MIN_BYTES
+
+		if vectorized and streaming:
+			self._ParseStreaming(filename)
+		elif vectorized and workers > 0:
+			self._ParseParallel(filename, workers)
+		elif vectorized:
+			with open(filename, "rb") as file:
+				self._ParseVectorized(b"\n" + file.read())
+		else:
+			with open(filename, "r") as file:
+				self._ParseLines(file.read().splitlines())
+
+
+	def _ParseVectorized(self, data):
+		# Arreglos contiguos float32 (N, 3) / (N, 2) / (N, 3)
+		self.vertices = _ParseFloats(_vertexPattern.findall(data), 3)
+		self.texCoords = _ParseFloats(_texCoordPattern.findall(data), 2)
+		self.normals = _ParseFloats(_normalPattern.findall(data), 3)
+
+		# Esquinas de las caras (C, 3) int32 con indices base 1
+		self.faceCorners, self.faceSizes = _ParseCorners(_facePattern.findall(data))
+
+		if (self.faceCorners < 0).any():
+			_ResolveRelative(data, self.faceCorners, self.faceSizes)
+
+		# Tramos de caras por grupo / material (lista de FaceGroup)
+		self.faceGroups = _ParseGroups(data, len(self.faceSizes))
+
+		# Archivos .mtl referenciados, relativos al .obj
+		self.materialLibraries = [name.decode("utf-8", "replace").strip() for name in _materialLibraryPattern.findall(data)]
+
+		self._BuildFaces()
+
+
+	def _ParseParallel(self, filename, workers, chunkBytes = CHUNK_BYTES):
+		if os.path.getsize(filename) == 0:
+			# mmap no acepta archivos vacios
+			self._ParseVectorized(b"\n")
+			return
+
+		with open(filename, "rb") as file, mmap.mmap(file.fileno(), 0, access = mmap.ACCESS_READ) as view:
+			bounds = _ChunkBounds(view, chunkBytes)
+
+		# Los bloques compartidos de cada trozo se liberan al copiarlos; si algo
+		# falla (un trozo mal formado, la union) el finally libera los que queden,
+		# ya que los procesos los quitaron de su resource_tracker
+		results = []
+		try:
+			# Con un solo proceso los trozos se parsean aca mismo, en orden
+			if workers == 1:
+				for start, end in bounds:
+					results.append(_ParseChunk(filename, start, end))
+			else:
+				with ProcessPoolExecutor(max_workers = workers) as pool:
+					futures = [pool.submit(_ParseChunk, filename, start, end) for start, end in bounds]
+
+				# Al salir del with terminaron todos: se guardan los bloques de
+				# los que funcionaron antes de propagar el primer error
+				results = [future.result() for future in futures if future.exception() is None]
+				for future in futures:
+					future.result()
+
+			self._MergeShared(results)
+		finally:
+			for result in results:
+				if result["block"] is not None:
+					_ReleaseShared(result["block"])
+
+		self._BuildFaces()
+
+
+	def _MergeShared(self, results):
+		# Arreglos finales del tamano justo; cada trozo se copia una vez desde
+		# su bloque compartido, que se libera en cuanto se copio
+		names = ("vertices", "texCoords", "normals", "faceCorners", "faceSizes")
+		merged = {}
+		for name in names:
+			dtype, shape, _ = results[0]["arrays"][name]
+			total = sum(result["arrays"][name][1][0] for result in results)
+			merged[name] = np.empty((total, ) + tuple(shape[1:]), dtype = dtype)
+
+		offsets = dict.fromkeys(names, 0)
+		groups = _GroupTracker()
+		self.materialLibraries = []
+
+		for result in results:
+			block = shared_memory.SharedMemory(name = result["block"])
+			try:
+				cornerStart = offsets["faceCorners"]
+				for name in names:
+					dtype, shape, offset = result["arrays"][name]
+					merged[name][offsets[name]:offsets[name] + shape[0]] = np.ndarray(shape, dtype = dtype, buffer = block.buf, offset = offset)
+			finally:
+				block.close()
+				block.unlink()
+				result["block"] = None
+
+			self._MergeBlock(result, merged["faceCorners"][cornerStart:], offsets, groups)
+			for name in names:
+				offsets[name] += result["arrays"][name][1][0]
+
+		self.vertices = merged["vertices"]
+		self.texCoords = merged["texCoords"]
+		self.normals = merged["normals"]
+		self.faceCorners = merged["faceCorners"]
+		self.faceSizes = merged["faceSizes"]
+
+		groups.Close(len(self.faceSizes))
+		self.faceGroups = groups.groups
+
+
+	def _ParseStreaming(self, filename, blockBytes = BLOCK_BYTES):
+		merged = {"vertices": _GrowableArray((3, ), np.float32),
+				  "texCoords": _GrowableArray((2, ), np.float32),
+				  "normals": _GrowableArray((3, ), np.float32),
+				  "faceCorners": _GrowableArray((3, ), np.int32),
+				  "faceSizes": _GrowableArray((), np.int32)}
+		groups = _GroupTracker()
+		self.materialLibraries = []
+
+		for block in ReadBlocks(filename, blockBytes):
+			result = _ParseBlock(b"\n" + block)
+			del block
+
+			offsets = {name: array.count for name, array in merged.items()}
+			self._MergeBlock(result, result["arrays"]["faceCorners"], offsets, groups)
+			for name, array in merged.items():
+				array.Extend(result["arrays"][name])
+
+		self.vertices = merged.pop("vertices").Array()
+		self.texCoords = merged.pop("texCoords").Array()
+		self.normals = merged.pop("normals").Array()
+		self.faceCorners = merged.pop("faceCorners").Array()
+		self.faceSizes = merged.pop("faceSizes").Array()
+
+		groups.Close(len(self.faceSizes))
+		self.faceGroups = groups.groups
+
+		self._BuildFaces()
+
+
+	def _MergeBlock(self, result, corners, offsets, groups):
+		# Une un bloque parseado por separado (_ParseBlock) a lo anterior.
+		# corners: las esquinas del bloque; offsets: lo acumulado antes de el.
+		# Los indices absolutos de OBJ no dependen del bloque; los relativos se
+		# resolvieron contra el bloque y se corren por lo definido antes.
+		for column, name in enumerate(("vertices", "texCoords", "normals")):
+			corners[result["relative"][column], column] += offsets[name]
+
+		# El grupo activo sigue de un bloque al siguiente
+		for prefix, value, faces in result["groups"]:
+			groups.Record(prefix, value, offsets["faceSizes"] + faces)
+		self.materialLibraries += result["materialLibraries"]
+
+
+	def _BuildFaces(self):
+		# Vista compatible con el parser original: faces[i][j] = [v, vt, vn]
+		if len(self.faceSizes) > 0 and (self.faceSizes == self.faceSizes[0]).all():
+			self.faces = self.faceCorners.reshape(len(self.faceSizes), self.faceSizes[0], 3)
+		else:
+			self.faces = np.split(self.faceCorners, np.cumsum(self.faceSizes)[:-1])
+
+
+	def _ParseLines(self, lines):
 		self.vertices = []
 		self.texCoords = []
 		self.normals = []
 		self.faces = []
-		
+		self.materialLibraries = []
+		groups = _GroupTracker()
+
 		for line in lines:
 			# Si la linea no cuenta con un prefijo y un valor,
 			# seguimos a la siguiente la linea
@@ -19,22 +523,22 @@ class Obj(object):
 				prefix, value = line.split(" ", 1)
 			except:
 				continue
-			
+
 			# Dependiendo del prefijo, parseamos y guardamos
 			# la informacion en el contenedor correcto
-			
+
 			if prefix == "v": # Vertices
 				vert = list(map(float,value.split(" ")))
 				self.vertices.append(vert)
-				
+
 			elif prefix == "vt": # Coordenadas de textura
 				vts = list(map(float,value.split(" ")))
 				self.texCoords.append([vts[0],vts[1]])
-				
+
 			elif prefix == "vn": # Normales
 				norm = list(map(float,value.split(" ")))
 				self.normals.append(norm)
-				
+
 			elif prefix == "f": # Caras
 				face = []
 				verts = value.split(" ")
@@ -42,3 +546,12 @@ class Obj(object):
 					vert = list(map(int, vert.split("/")))
 					face.append(vert)
 				self.faces.append(face)
+
+			elif prefix in _GROUP_KEYS: # Grupos, objetos, materiales y smoothing
+				groups.Record(prefix, value, len(self.faces))
+
+			elif prefix == "mtllib": # Bibliotecas de materiales
+				self.materialLibraries.append(value.split("#", 1)[0].strip())
+
+		groups.Close(len(self.faces))
+		self.faceGroups = groups.groups
@@ -0,0 +1,41 @@
+from transform import Transformable
+
+
+class SceneNode(Transformable):
+	# Node without geometry: a pivot or group whose transform is applied to its
+	# children (wheels on a car, a light or camera rig, ...). Models are nodes too.
+
+	def __init__(self, name = "", system = None):
+		self.name = name
+		self.InitTransform(system)
+		self.visible = True
+
+
+	def Render(self):
+		pass
+
+
+def Traverse(roots):
+	# Depth-first walk over roots and their descendants, skipping hidden subtrees
+	pending = list(reversed(roots))
+	while pending:
+		node = pending.pop()
+		if not node.visible:
+			continue
+		yield node
+		pending.extend(reversed(getattr(node, "children", ())))
+
+
+def DrawKey(obj):
+	# Groups draws that share state: instanced groups last (they switch
+	# program), then by VAO and bound textures
+	return (getattr(obj, "instanced", False), int(getattr(obj, "VAO", 0)), tuple(getattr(obj, "textures", ())))
+
+
+def BuildDrawList(roots, sort = True):
+	# Flat list of everything that draws geometry under roots, sorted by DrawKey
+	# (or in traversal order)
+	drawList = [node for node in Traverse(roots) if not isinstance(node, SceneNode)]
+	if sort:
+		drawList.sort(key = DrawKey)
+	return drawList
@@ -0,0 +1,244 @@
+import glm  # pip install PyGLM
+from OpenGL.GL import *
+from OpenGL.GL.shaders import compileProgram, compileShader
+from OpenGL.error import GLError
+from collections import OrderedDict
+import ctypes
+import hashlib
+import os
+
+import numpy as np
+
+from frameUniforms import FRAME_UNIFORMS_BINDING
+
+
+# Upload function for each uniform type reported by glGetActiveUniform
+_uploaders = {
+    GL_FLOAT:          lambda location, value: glUniform1f(location, value),
+    GL_FLOAT_VEC2:     lambda location, value: glUniform2fv(location, 1, glm.value_ptr(value)),
+    GL_FLOAT_VEC3:     lambda location, value: glUniform3fv(location, 1, glm.value_ptr(value)),
+    GL_FLOAT_VEC4:     lambda location, value: glUniform4fv(location, 1, glm.value_ptr(value)),
+    GL_FLOAT_MAT3:     lambda location, value: glUniformMatrix3fv(location, 1, GL_FALSE, glm.value_ptr(value)),
+    GL_FLOAT_MAT4:     lambda location, value: glUniformMatrix4fv(location, 1, GL_FALSE, glm.value_ptr(value)),
+    GL_INT:            lambda location, value: glUniform1i(location, value),
+    GL_BOOL:           lambda location, value: glUniform1i(location, value),
+    GL_SAMPLER_2D:     lambda location, value: glUniform1i(location, value),
+    GL_SAMPLER_CUBE:   lambda location, value: glUniform1i(location, value),
+}
+
+
+class ProgramState(object):
+    # Program bound with glUseProgram, so redundant switches are skipped and
+    # the real ones can be counted per frame
+    def __init__(self):
+        self.current = None
+        self.switches = 0
+
+
+    def Use(self, program):
+        # program: GL program name, or 0 for the fixed pipeline
+        if program != self.current:
+            glUseProgram(program)
+            self.current = program
+            self.switches += 1
+
+
+    def Reset(self):
+        # Forget the tracked program (other code may have called glUseProgram)
+        self.current = None
+
+
+    def ResetCounters(self):
+        self.switches = 0
+
+
+# Shared by the whole process (one GL context)
+programState = ProgramState()
+
+
+def ProgramKey(vertexShader, fragmentShader):
+    return hashlib.sha1(f"{vertexShader}\0{fragmentShader}".encode("utf-8")).hexdigest()
+
+
+def _BinaryPath(binaryCacheDir, key):
+    # Program binaries are only valid for the driver that produced them
+    driver = "\0".join(glGetString(name).decode() for name in (GL_VENDOR, GL_RENDERER, GL_VERSION))
+    driverKey = hashlib.sha1(driver.encode("utf-8")).hexdigest()[:12]
+    return os.path.join(binaryCacheDir, f"{key}.{driverKey}.bin")
+
+
+def _LoadBinary(path):
+    # Returns the linked program, or None if there is no usable binary
+    try:
+        with open(path, "rb") as file:
+            binaryFormat = int.from_bytes(file.read(4), "little")
+            binary = np.frombuffer(file.read(), dtype = np.uint8)
+    except OSError:
+        return None
+
+    # Truncated files and formats this driver does not list are not worth
+    # handing to glProgramBinary (which raises GL_INVALID_ENUM for the latter)
+    formats = glGetIntegerv(GL_PROGRAM_BINARY_FORMATS)
+    if len(binary) == 0 or binaryFormat not in np.atleast_1d(formats).tolist():
+        return None
+
+    program = glCreateProgram()
+    try:
+        glProgramBinary(program, binaryFormat, binary.ctypes.data_as(ctypes.c_void_p), len(binary))
+        linked = glGetProgramiv(program, GL_LINK_STATUS) == GL_TRUE
+    except GLError:
+        linked = False
+
+    # The driver may also reject binaries from older versions of itself;
+    # the caller then compiles from source
+    if not linked:
+        glDeleteProgram(program)
+        return None
+
+    return program
+
+
+def _StoreBinary(path, program):
+    length = glGetProgramiv(program, GL_PROGRAM_BINARY_LENGTH)
+    if length <= 0:
+        return
+
+    binary = np.empty(length, dtype = np.uint8)
+    written = GLsizei()
+    binaryFormat = GLenum()
+    glGetProgramBinary(program, length, ctypes.byref(written), ctypes.byref(binaryFormat),
+                       binary.ctypes.data_as(ctypes.c_void_p))
+
+    os.makedirs(os.path.dirname(path), exist_ok = True)
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "wb") as file:
+        file.write(binaryFormat.value.to_bytes(4, "little"))
+        file.write(binary[:written.value].tobytes())
+    os.replace(temporary, path)
+
+
+class ShaderProgram(object):
+    def __init__(self, vertexShader, fragmentShader, binaryCacheDir = None):
+        self.key = ProgramKey(vertexShader, fragmentShader)
+
+        # Optional on-disk cache of driver program binaries, skips compile + link
+        useBinary = binaryCacheDir is not None and glGetIntegerv(GL_NUM_PROGRAM_BINARY_FORMATS) > 0
+        binaryPath = _BinaryPath(binaryCacheDir, self.key) if useBinary else None
+
+        self.program = _LoadBinary(binaryPath) if useBinary else None
+        if self.program is None:
+            self.program = compileProgram(compileShader(vertexShader, GL_VERTEX_SHADER),
+                                          compileShader(fragmentShader, GL_FRAGMENT_SHADER),
+                                          retrievable = useBinary)
+            if useBinary:
+                try:
+                    _StoreBinary(binaryPath, self.program)
+                except OSError as e:
+                    print(f"No se pudo guardar el binario del shader: {e}")
+
+        # Introspect the active uniforms once, at link time:
+        # name -> (location, type). Members of uniform blocks have no
+        # location and are left out; they are set through the block's buffer.
+        self.uniforms = {}
+        for i in range(glGetProgramiv(self.program, GL_ACTIVE_UNIFORMS)):
+            name, size, uniformType = glGetActiveUniform(self.program, i)
+            name = name.decode().removesuffix("[0]")
+            location = glGetUniformLocation(self.program, name)
+            if location != -1:
+                self.uniforms[name] = (location, int(uniformType))
+
+        # Point the per-frame block, if the shaders declare it, at the
+        # binding shared by every program
+        self.frameBlock = glGetUniformBlockIndex(self.program, "FrameUniforms")
+        if self.frameBlock != GL_INVALID_INDEX:
+            glUniformBlockBinding(self.program, self.frameBlock, FRAME_UNIFORMS_BINDING)
+
+        # Last value uploaded for each uniform. Uniform values are program
+        # state, so they survive glUseProgram switches and can be skipped
+        # while unchanged.
+        self.values = {}
+
+        # Counters, reset by the renderer at the start of every frame
+        self.uploads = 0
+        self.skipped = 0
+
+
+    def Use(self):
+        programState.Use(self.program)
+
+
+    def Delete(self):
+        if programState.current == self.program:
+            programState.Reset()
+        glDeleteProgram(self.program)
+        self.program = None
+
+
+    def ResetCounters(self):
+        self.uploads = 0
+        self.skipped = 0
+
+
+    def HasUniform(self, name):
+        return name in self.uniforms
+
+
+    def SetUniform(self, name, value):
+        # Uniforms that the compiler optimized out (or never declared) are ignored,
+        # the same as uploading to location -1
+        uniform = self.uniforms.get(name)
+        if uniform is None:
+            return
+
+        if name in self.values and self.values[name] == value:
+            self.skipped += 1
+            return
+
+        location, uniformType = uniform
+        _uploaders[uniformType](location, value)
+
+        # Keep a copy: glm vectors and matrices are mutable
+        self.values[name] = value if isinstance(value, (int, float)) else type(value)(value)
+        self.uploads += 1
+
+
+class ProgramRegistry(object):
+    def __init__(self, capacity = 16, binaryCacheDir = None):
+        # key (hash of both sources) -> ShaderProgram, least recently used first
+        self.programs = OrderedDict()
+        self.capacity = capacity
+        self.binaryCacheDir = binaryCacheDir
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+
+    def Get(self, vertexShader, fragmentShader):
+        # Each (vertex, fragment) combination is compiled once; later requests
+        # hand back the linked program
+        key = ProgramKey(vertexShader, fragmentShader)
+
+        program = self.programs.get(key)
+        if program is not None:
+            self.programs.move_to_end(key)
+            self.hits += 1
+            return program
+
+        program = ShaderProgram(vertexShader, fragmentShader, self.binaryCacheDir)
+        self.programs[key] = program
+        self.misses += 1
+
+        # The program just requested is the most recent, so it is never evicted here
+        while len(self.programs) > self.capacity:
+            _, evicted = self.programs.popitem(last = False)
+            evicted.Delete()
+            self.evictions += 1
+
+        return program
+
+
+    def Clear(self):
+        for program in self.programs.values():
+            program.Delete()
+        self.programs.clear()
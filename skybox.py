@@ -1,18 +1,19 @@
-from numpy import array, float32
-import glm
+from numpy import array, float32, frombuffer, uint8
 from OpenGL.GL import * 
-from OpenGL.GL.shaders import compileProgram, compileShader
 import pygame
+from concurrent.futures import ThreadPoolExecutor
+
+from buffer import Buffer, VertexAttribute
+from frameUniforms import FRAME_UNIFORMS_BLOCK
+from shaderProgram import ShaderProgram
+from texture import SubImageSteps
 
 
 skybox_vertex_shader = '''
 #version 450 core
 
 layout (location = 0) in vec3 inPosition;
-
-uniform mat4 viewMatrix;
-uniform mat4 projectionMatrix;
-
+''' + FRAME_UNIFORMS_BLOCK + '''
 
 out vec3 texCoords;
 
@@ -43,9 +44,26 @@ void main()
 '''
 
 
+SKYBOX_LAYOUT = (VertexAttribute(0, 3, 0), )
+
+
+def _DecodeFace(filename):
+	# Runs on a worker thread: decode only, no GL calls
+	texture = pygame.image.load(filename)
+	return texture.get_width(), texture.get_height(), pygame.image.tostring(texture, "RGB", False)
+
+
+def DecodeFaces(textureList):
+	# Decodes the six faces in parallel; no GL calls
+	with ThreadPoolExecutor(max_workers = len(textureList)) as pool:
+		return list(pool.map(_DecodeFace, textureList))
+
+
 class Skybox(object):
-	def __init__(self, textureList):
-		self.cameraRef = None
+	def __init__(self, textureList, faces = None):
+		# faces: the result of DecodeFaces, when decoded ahead (asset loader);
+		# an empty list leaves the faces to UploadFace.
+		# The camera matrices come from the renderer's FrameUniforms buffer.
 		
 		skyboxVertices = [-1.0,  1.0, -1.0,
 						  -1.0, -1.0, -1.0,
@@ -89,72 +107,74 @@ class Skybox(object):
 						  -1.0, -1.0,  1.0,
 						   1.0, -1.0,  1.0 ]
 		
-		self.vertexBuffer = array(skyboxVertices, dtype = float32 )
-		self.VBO = glGenBuffers(1)
+		# Persistent VAO/VBO: the cube is uploaded once here and every frame
+		# only binds the VAO and draws
+		self.VAO = glGenVertexArrays(1)
+		glBindVertexArray(self.VAO)
+		
+		self.vertexBuffer = Buffer(array(skyboxVertices, dtype = float32).reshape(-1, 3), SKYBOX_LAYOUT)
+		self.vertexBuffer.UseLayout()
+		
+		glBindVertexArray(0)
+		
+		self.shaders = ShaderProgram(skybox_vertex_shader, skybox_fragment_shader)
 		
-		self.shaders = compileProgram(compileShader(skybox_vertex_shader, GL_VERTEX_SHADER),
-									  compileShader(skybox_fragment_shader, GL_FRAGMENT_SHADER) )
+		# Decode the six faces in parallel, then upload them in one go
+		if faces is None:
+			faces = DecodeFaces(textureList)
 		
 		self.texture = glGenTextures(1)
 		glBindTexture(GL_TEXTURE_CUBE_MAP, self.texture)
 		
-		for i in range(len(textureList)):
-			texture = pygame.image.load(textureList[i])
-			textureData = pygame.image.tostring(texture, "RGB", False)
-			
-			glTexImage2D(GL_TEXTURE_CUBE_MAP_POSITIVE_X + i,
-						 0,
-						 GL_RGB,
-						 texture.get_width(),
-						 texture.get_height(),
-						 0,
-						 GL_RGB,
-						 GL_UNSIGNED_BYTE,
-						 textureData)
-			
 		glTexParameteri(GL_TEXTURE_CUBE_MAP, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
 		glTexParameteri(GL_TEXTURE_CUBE_MAP, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
 		glTexParameteri(GL_TEXTURE_CUBE_MAP, GL_TEXTURE_WRAP_S, GL_CLAMP_TO_EDGE)
 		glTexParameteri(GL_TEXTURE_CUBE_MAP, GL_TEXTURE_WRAP_T, GL_CLAMP_TO_EDGE)
 		glTexParameteri(GL_TEXTURE_CUBE_MAP, GL_TEXTURE_WRAP_R, GL_CLAMP_TO_EDGE)
 		
+		for i, face in enumerate(faces):
+			self.UploadFace(i, face)
+		
+	
+	def UploadFace(self, index, face):
+		# One decoded face (width, height, RGB bytes); the asset loader uploads
+		# them one per frame instead of all six at once
+		width, height, textureData = face
+		glBindTexture(GL_TEXTURE_CUBE_MAP, self.texture)
+		glTexImage2D(GL_TEXTURE_CUBE_MAP_POSITIVE_X + index,
+					 0,
+					 GL_RGB,
+					 width,
+					 height,
+					 0,
+					 GL_RGB,
+					 GL_UNSIGNED_BYTE,
+					 textureData)
+		
+	
+	def UploadFaceSteps(self, index, face):
+		# UploadFace for the asset loader: allocates the face, then uploads it in
+		# bands of rows, yielding after each step
+		width, height, textureData = face
+		glBindTexture(GL_TEXTURE_CUBE_MAP, self.texture)
+		glTexImage2D(GL_TEXTURE_CUBE_MAP_POSITIVE_X + index, 0, GL_RGB, width, height, 0, GL_RGB, GL_UNSIGNED_BYTE, None)
+		yield
+		
+		yield from SubImageSteps(self.texture, frombuffer(textureData, dtype = uint8).reshape(height, width, 3),
+								 target = GL_TEXTURE_CUBE_MAP_POSITIVE_X + index, bindTarget = GL_TEXTURE_CUBE_MAP)
+		
 
 	def Render(self):
+		# Depth writes are disabled by the Renderer around the skybox pass
 		if self.shaders == None:
 			return
 		
-		glUseProgram(self.shaders)
-		
-		if self.cameraRef is not None:
-			glUniformMatrix4fv( glGetUniformLocation(self.shaders, "viewMatrix"),
-								1, GL_FALSE, glm.value_ptr( self.cameraRef.viewMatrix) )
-			
-			glUniformMatrix4fv( glGetUniformLocation(self.shaders, "projectionMatrix"),
-								1, GL_FALSE, glm.value_ptr( self.cameraRef.projectionMatrix) )
-		
-		glDepthMask(GL_FALSE)
+		self.shaders.Use()
 		
 		glBindTexture(GL_TEXTURE_CUBE_MAP, self.texture)
 		
-		glBindBuffer(GL_ARRAY_BUFFER, self.VBO)
-		
-		glBufferData(GL_ARRAY_BUFFER,
-					 self.vertexBuffer.nbytes,
-					 self.vertexBuffer,
-					 GL_STATIC_DRAW)
-		
-		glEnableVertexAttribArray(0)
-		
-		glVertexAttribPointer(0,
-							  3,
-							  GL_FLOAT,
-							  GL_FALSE,
-							  4 * 3,
-							  ctypes.c_void_p(0) )
-		
+		glBindVertexArray(self.VAO)
 		
 		glDrawArrays(GL_TRIANGLES, 0, 36)
 		
-		glDisableVertexAttribArray(0)
-
-		glDepthMask(GL_TRUE)
+		glBindVertexArray(0)
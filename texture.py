@@ -0,0 +1,370 @@
+from OpenGL.GL import *
+from OpenGL.GL.EXT.texture_compression_s3tc import GL_COMPRESSED_RGB_S3TC_DXT1_EXT
+from OpenGL.extensions import hasGLExtension
+import os
+import time
+
+import numpy as np
+import pygame
+
+import meshcache
+
+
+# Internal format of compressed textures (TextureCache.compressed): DXT1,
+# 4 bits per pixel, encoded by the driver on upload
+COMPRESSED_FORMAT = GL_COMPRESSED_RGB_S3TC_DXT1_EXT
+COMPRESSION_EXTENSION = "GL_EXT_texture_compression_s3tc"
+
+
+def _DecodeImage(filename):
+	# One copy out of pygame (rows flipped bottom-up on the way, as OpenGL
+	# expects); frombuffer wraps those bytes without copying again
+	print(f"Cargando textura '{filename}'")
+	surface = pygame.image.load(filename)
+	data = pygame.image.tostring(surface, "RGB", True)
+	return np.frombuffer(data, dtype = np.uint8).reshape(surface.get_height(), surface.get_width(), 3)
+
+
+def DecodeTexture(filename, useCache = True):
+	# CPU only (safe on worker threads): (height, width, 3) uint8 RGB array,
+	# rows bottom-up as OpenGL expects. The decoded pixels are kept next to
+	# the image in the mesh cache format, so later loads map them from disk.
+	if useCache:
+		cached = meshcache.Load(filename, "tex")
+		if cached is not None:
+			return cached.arrays["pixels"]
+
+	pixels = _DecodeImage(filename)
+
+	if useCache:
+		try:
+			meshcache.Store(filename, meshcache.Mesh({"pixels": pixels}, {"width": pixels.shape[1], "height": pixels.shape[0]}), "tex")
+		except OSError as e:
+			print(f"No se pudo guardar la cache de '{filename}': {e}")
+
+	return pixels
+
+
+def MipChain(pixels):
+	# Every mip level of pixels, box filtered down to 1x1 (odd sizes drop the
+	# last row / column, like glGenerateMipmap)
+	levels = [pixels]
+	while max(pixels.shape[:2]) > 1:
+		level = pixels.astype(np.uint16)
+		for axis in (0, 1):
+			if level.shape[axis] > 1:
+				even = level.shape[axis] // 2 * 2
+				level = level.take(range(0, even, 2), axis) + level.take(range(1, even, 2), axis)
+			else:
+				level = level * 2
+		pixels = ((level + 2) // 4).astype(np.uint8)
+		levels.append(pixels)
+	return levels
+
+
+def _GpuBytes(levels):
+	# Size of the bound GL_TEXTURE_2D as reported by the driver, all levels
+	total = 0
+	for level in range(levels):
+		if glGetTexLevelParameteriv(GL_TEXTURE_2D, level, GL_TEXTURE_COMPRESSED):
+			total += glGetTexLevelParameteriv(GL_TEXTURE_2D, level, GL_TEXTURE_COMPRESSED_IMAGE_SIZE)
+		else:
+			width = glGetTexLevelParameteriv(GL_TEXTURE_2D, level, GL_TEXTURE_WIDTH)
+			height = glGetTexLevelParameteriv(GL_TEXTURE_2D, level, GL_TEXTURE_HEIGHT)
+			bits = sum(glGetTexLevelParameteriv(GL_TEXTURE_2D, level, size)
+					   for size in (GL_TEXTURE_RED_SIZE, GL_TEXTURE_GREEN_SIZE, GL_TEXTURE_BLUE_SIZE, GL_TEXTURE_ALPHA_SIZE))
+			total += width * height * bits // 8
+	return total
+
+
+def _CreateTexture2D(width, height, levels, internalFormat):
+	# New GL_TEXTURE_2D, left bound, with storage for levels mip levels
+	texture = glGenTextures(1)
+	glBindTexture(GL_TEXTURE_2D, texture)
+
+	if bool(glTexStorage2D):
+		glTexStorage2D(GL_TEXTURE_2D, levels, internalFormat, width, height)
+	else:
+		# GL < 4.2 without ARB_texture_storage: the same levels, mutable
+		for level in range(levels):
+			glTexImage2D(GL_TEXTURE_2D, level, internalFormat, max(width >> level, 1), max(height >> level, 1),
+						 0, GL_RGB, GL_UNSIGNED_BYTE, None)
+	return texture
+
+
+def UploadTexture2D(pixels, compressed = False, minFilter = GL_LINEAR_MIPMAP_LINEAR, magFilter = GL_LINEAR):
+	# Immutable storage with the full mip chain. Returns (texture, GPU bytes).
+	height, width = pixels.shape[:2]
+	levels = int(np.log2(max(width, height))) + 1
+	internalFormat = COMPRESSED_FORMAT if compressed else GL_RGB8
+
+	texture = _CreateTexture2D(width, height, levels, internalFormat)
+
+	# RGB rows are width * 3 bytes, not always a multiple of the default 4
+	glPixelStorei(GL_UNPACK_ALIGNMENT, 1)
+
+	if compressed:
+		# glGenerateMipmap can't render into compressed formats: the levels are
+		# filtered here and the driver encodes each one
+		for level, data in enumerate(MipChain(pixels)):
+			glTexSubImage2D(GL_TEXTURE_2D, level, 0, 0, data.shape[1], data.shape[0],
+							GL_RGB, GL_UNSIGNED_BYTE, np.ascontiguousarray(data))
+	else:
+		glTexSubImage2D(GL_TEXTURE_2D, 0, 0, 0, width, height, GL_RGB, GL_UNSIGNED_BYTE, np.ascontiguousarray(pixels))
+		glGenerateMipmap(GL_TEXTURE_2D)
+
+	glPixelStorei(GL_UNPACK_ALIGNMENT, 4)
+
+	glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, minFilter)
+	glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, magFilter)
+
+	gpuBytes = _GpuBytes(levels)
+	glBindTexture(GL_TEXTURE_2D, 0)
+
+	return texture, gpuBytes
+
+
+# Pixel bytes per glTexSubImage2D when an upload is split across frames
+# (asset loader): about 1 ms each on llvmpipe
+UPLOAD_CHUNK_BYTES = 1 << 20
+
+
+def SubImageSteps(texture, pixels, level = 0, target = GL_TEXTURE_2D, bindTarget = GL_TEXTURE_2D, chunkBytes = UPLOAD_CHUNK_BYTES):
+	# Uploads (height, width, 3) RGB pixels to one level / face of texture in
+	# bands of rows, yielding after each band. The texture is bound and unbound
+	# every band, since anything can be bound between two steps. Bands are a
+	# multiple of 4 rows, the DXT1 block height.
+	height, width = pixels.shape[:2]
+	rows = max(4, chunkBytes // (width * 3) // 4 * 4)
+	for row in range(0, height, rows):
+		band = np.ascontiguousarray(pixels[row:row + rows])
+		glBindTexture(bindTarget, texture)
+		glPixelStorei(GL_UNPACK_ALIGNMENT, 1)
+		glTexSubImage2D(target, level, 0, row, width, len(band), GL_RGB, GL_UNSIGNED_BYTE, band)
+		glPixelStorei(GL_UNPACK_ALIGNMENT, 4)
+		glBindTexture(bindTarget, 0)
+		yield
+
+
+def UploadTexture2DSteps(mips, compressed = False, minFilter = GL_LINEAR_MIPMAP_LINEAR, magFilter = GL_LINEAR,
+						 chunkBytes = UPLOAD_CHUNK_BYTES):
+	# UploadTexture2D split in steps, from the mip chain already filtered
+	# (MipChain, on a worker thread): a generator that yields after the
+	# storage and after each band of rows of each level, and returns
+	# (texture, GPU bytes)
+	height, width = mips[0].shape[:2]
+	texture = _CreateTexture2D(width, height, len(mips), COMPRESSED_FORMAT if compressed else GL_RGB8)
+	glBindTexture(GL_TEXTURE_2D, 0)
+	yield
+
+	for level, data in enumerate(mips):
+		yield from SubImageSteps(texture, data, level, chunkBytes = chunkBytes)
+
+	glBindTexture(GL_TEXTURE_2D, texture)
+	glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, minFilter)
+	glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, magFilter)
+	gpuBytes = _GpuBytes(len(mips))
+	glBindTexture(GL_TEXTURE_2D, 0)
+
+	return texture, gpuBytes
+
+
+class TextureEntry(object):
+	# One texture of the cache: its users and what it cost to load
+	def __init__(self, filename, texture, width, height):
+		self.filename = filename
+		self.texture = texture
+		self.width = width
+		self.height = height
+		self.references = 0
+
+		self.compressed = False
+		self.gpuBytes = 0
+		self.decodeTime = 0.0
+		self.uploadTime = 0.0
+		self.fromDiskCache = False
+
+
+class TextureCache(object):
+	# Textures shared by every Model and Material: each file is uploaded once
+	# and freed when its last reference is released.
+	# Also tracks what is bound to each texture unit, so redundant binds are
+	# skipped and the real ones can be counted per frame.
+
+	def __init__(self, compressed = False, minFilter = GL_LINEAR_MIPMAP_LINEAR, magFilter = GL_LINEAR, useDiskCache = True):
+		# Upload settings for textures loaded from now on
+		self.compressed = compressed
+		self.minFilter = minFilter
+		self.magFilter = magFilter
+		self.useDiskCache = useDiskCache
+
+		# absolute path -> TextureEntry, and GL texture -> absolute path
+		self.entries = {}
+		self.paths = {}
+
+		# texture unit -> GL texture bound there (GL_TEXTURE_2D)
+		self.bound = {}
+		self.activeUnit = None
+		self.binds = 0
+
+
+	def Has(self, filename):
+		return os.path.abspath(filename) in self.entries
+
+
+	def Get(self, filename):
+		# Takes one reference to the texture of filename, decoding and
+		# uploading it the first time
+		key = os.path.abspath(filename)
+		if key not in self.entries:
+			start = time.perf_counter()
+			pixels = DecodeTexture(filename, self.useDiskCache)
+			self.Add(filename, pixels, time.perf_counter() - start)
+		return self.Acquire(self.entries[key].texture)
+
+
+	def Add(self, filename, pixels, decodeTime = 0.0):
+		# Uploads pixels already decoded (e.g. by the asset loader) for filename.
+		# Takes no reference: that is up to Get / Acquire.
+		for _ in self.AddSteps(filename, pixels, decodeTime):
+			pass
+		return self.entries[os.path.abspath(filename)].texture
+
+
+	def AddSteps(self, filename, pixels, decodeTime = 0.0, mips = None):
+		# Add as a generator for the asset loader. With the mip chain of pixels
+		# filtered ahead (mips), the upload yields between bands of rows, so
+		# a large texture is spread over several frames.
+		key = os.path.abspath(filename)
+		if key in self.entries:
+			return
+
+		compressed = self.compressed and self.CompressionSupported()
+
+		# uploadTime only counts the GL work, not the frames in between
+		if mips is None:
+			start = time.perf_counter()
+			texture, gpuBytes = UploadTexture2D(pixels, compressed, self.minFilter, self.magFilter)
+			uploadTime = time.perf_counter() - start
+		else:
+			steps = UploadTexture2DSteps(mips, compressed, self.minFilter, self.magFilter)
+			uploadTime = 0.0
+			while True:
+				start = time.perf_counter()
+				try:
+					next(steps)
+				except StopIteration as done:
+					texture, gpuBytes = done.value
+					uploadTime += time.perf_counter() - start
+					break
+				uploadTime += time.perf_counter() - start
+				yield
+
+			# Someone else loaded the same file in the meantime
+			if key in self.entries:
+				glDeleteTextures([texture])
+				return
+
+		entry = TextureEntry(filename, texture, pixels.shape[1], pixels.shape[0])
+		entry.compressed = compressed
+		entry.gpuBytes = gpuBytes
+		entry.decodeTime = decodeTime
+		entry.uploadTime = uploadTime
+		entry.fromDiskCache = isinstance(pixels, np.memmap)
+
+		self.entries[key] = entry
+		self.paths[texture] = key
+
+		# The upload went through the active unit and left it unbound
+		self.bound.pop(self.activeUnit, None)
+
+
+	def Acquire(self, texture):
+		# One more user of a texture of the cache (e.g. a copied Model)
+		key = self.paths.get(texture)
+		if key is not None:
+			self.entries[key].references += 1
+		return texture
+
+
+	def Release(self, texture):
+		# Drops one reference; the GL texture is deleted with the last one
+		key = self.paths.get(texture)
+		if key is None:
+			return
+
+		entry = self.entries[key]
+		entry.references -= 1
+		if entry.references > 0:
+			return
+
+		glDeleteTextures([texture])
+		del self.entries[key]
+		del self.paths[texture]
+
+		# Deleting a bound texture unbinds it
+		for unit in [unit for unit, bound in self.bound.items() if bound == texture]:
+			del self.bound[unit]
+
+
+	def CompressionSupported(self):
+		supported = hasGLExtension(COMPRESSION_EXTENSION)
+		if not supported and self.compressed:
+			print(f"{COMPRESSION_EXTENSION} no disponible: texturas sin comprimir")
+			self.compressed = False
+		return supported
+
+
+	def Bind(self, unit, texture):
+		if self.bound.get(unit) == texture:
+			return
+		if self.activeUnit != unit:
+			glActiveTexture(GL_TEXTURE0 + unit)
+			self.activeUnit = unit
+		glBindTexture(GL_TEXTURE_2D, texture)
+		self.bound[unit] = texture
+		self.binds += 1
+
+
+	def BindAll(self, textures):
+		for unit, texture in enumerate(textures):
+			self.Bind(unit, texture)
+
+
+	def ResetBindings(self):
+		# Forgets the tracked state (other code may have bound textures) and
+		# leaves unit 0 active, as the skybox expects
+		self.bound.clear()
+		glActiveTexture(GL_TEXTURE0)
+		self.activeUnit = 0
+
+
+	def ResetCounters(self):
+		self.binds = 0
+
+
+	def GpuBytes(self):
+		return sum(entry.gpuBytes for entry in self.entries.values())
+
+
+	def Report(self):
+		lines = [f"Textures ({len(self.entries)}, {self.GpuBytes() / 1024:.0f} KB on the GPU):"]
+		for entry in self.entries.values():
+			source = "disk cache" if entry.fromDiskCache else "decoded"
+			lines.append(f"  {os.path.basename(entry.filename)} {entry.width}x{entry.height}"
+						 f"{' DXT1' if entry.compressed else ' RGB8'}  refs {entry.references}"
+						 f"  {source} {entry.decodeTime * 1000:.1f} ms  upload {entry.uploadTime * 1000:.1f} ms"
+						 f"  {entry.gpuBytes / 1024:.0f} KB")
+		return "\n".join(lines)
+
+
+	def Clear(self):
+		if self.paths:
+			glDeleteTextures(list(self.paths))
+		self.entries.clear()
+		self.paths.clear()
+		self.bound.clear()
+
+
+# Shared by the whole process (one GL context)
+textures = TextureCache()
@@ -0,0 +1,345 @@
+import glm
+import numpy as np
+import weakref
+
+
+class TransformSystem(object):
+	# Position / rotation (Euler degrees) / scale of every object in contiguous
+	# arrays. Model matrices are recomputed in one vectorized pass, only for
+	# the slots marked dirty, and cached in glm memory (column-major) order so
+	# they can be uploaded as-is, e.g. to an instance VBO.
+	#
+	# Slots can have a parent slot: localMatrices hold T * R * S of each slot
+	# and matrices the composed world matrix (parent world * local). A dirty
+	# slot recomputes its whole subtree and nothing else.
+
+	def __init__(self, capacity = 64):
+		self.count = 0
+		self._Allocate(capacity)
+
+		# parent slot -> list of child slots
+		self.children = {}
+
+		# Slots given back with Remove, reused by Add
+		self.free = []
+
+
+	def _Allocate(self, capacity):
+		old = self.count
+		positions = np.zeros((capacity, 3), dtype = np.float32)
+		rotations = np.zeros((capacity, 3), dtype = np.float32)
+		scales = np.ones((capacity, 3), dtype = np.float32)
+		localMatrices = np.tile(np.identity(4, dtype = np.float32), (capacity, 1, 1))
+		matrices = np.tile(np.identity(4, dtype = np.float32), (capacity, 1, 1))
+		dirty = np.zeros(capacity, dtype = bool)
+		parents = np.full(capacity, -1, dtype = np.int32)
+		depths = np.zeros(capacity, dtype = np.int32)
+		hasChildren = np.zeros(capacity, dtype = bool)
+
+		if old > 0:
+			positions[:old] = self.positions[:old]
+			rotations[:old] = self.rotations[:old]
+			scales[:old] = self.scales[:old]
+			localMatrices[:old] = self.localMatrices[:old]
+			matrices[:old] = self.matrices[:old]
+			dirty[:old] = self.dirty[:old]
+			parents[:old] = self.parents[:old]
+			depths[:old] = self.depths[:old]
+			hasChildren[:old] = self.hasChildren[:old]
+
+		self.positions = positions
+		self.rotations = rotations
+		self.scales = scales
+		self.localMatrices = localMatrices
+		self.matrices = matrices
+		self.dirty = dirty
+		self.parents = parents
+		self.depths = depths
+		self.hasChildren = hasChildren
+
+		# glm copies of the cached matrices, built on demand for the uniform
+		# uploads; None until first requested after an update
+		self.glmMatrices = getattr(self, "glmMatrices", []) + [None] * (capacity - old)
+
+
+	def Add(self, position = (0, 0, 0), rotation = (0, 0, 0), scale = (1, 1, 1)):
+		if self.free:
+			index = self.free.pop()
+		else:
+			if self.count == len(self.positions):
+				self._Allocate(2 * len(self.positions))
+			index = self.count
+			self.count += 1
+
+		self.positions[index] = position
+		self.rotations[index] = rotation
+		self.scales[index] = scale
+		self.dirty[index] = True
+		return index
+
+
+	def Remove(self, index):
+		# Frees the slot for a later Add. Its children become roots.
+		for child in list(self.children.get(index, ())):
+			self.SetParent(child, -1)
+		self.SetParent(index, -1)
+
+		self.positions[index] = 0
+		self.rotations[index] = 0
+		self.scales[index] = 1
+		self.dirty[index] = False
+		self.glmMatrices[index] = None
+		self.free.append(index)
+
+
+	def Descendants(self, roots):
+		# Every slot below the given ones, parents before children
+		found = []
+		pending = [int(root) for root in roots]
+		seen = set(pending)
+		while pending:
+			children = []
+			for index in pending:
+				for child in self.children.get(index, ()):
+					if child not in seen:
+						seen.add(child)
+						children.append(child)
+			found.extend(children)
+			pending = children
+		return found
+
+
+	def SetParent(self, index, parent):
+		# parent = -1 detaches the slot and makes it a root again
+		ancestor = parent
+		while ancestor >= 0:
+			if ancestor == index:
+				raise ValueError("SetParent crearia un ciclo en la jerarquia")
+			ancestor = self.parents[ancestor]
+
+		previous = int(self.parents[index])
+		if previous >= 0:
+			siblings = self.children[previous]
+			siblings.remove(index)
+			if not siblings:
+				del self.children[previous]
+				self.hasChildren[previous] = False
+
+		self.parents[index] = parent
+		if parent >= 0:
+			self.children.setdefault(parent, []).append(index)
+			self.hasChildren[parent] = True
+
+		self.depths[index] = self.depths[parent] + 1 if parent >= 0 else 0
+		for child in self.Descendants([index]):
+			self.depths[child] = self.depths[self.parents[child]] + 1
+
+		self.dirty[index] = True
+
+
+	def Update(self):
+		# Recomputes the local matrix of every dirty slot, M = T * Rx * Ry * Rz * S,
+		# and the world matrices of the dirty slots and their subtrees.
+		# Returns the number of world matrices recomputed.
+		dirty = np.flatnonzero(self.dirty[:self.count])
+		if len(dirty) == 0:
+			return 0
+
+		pitch, yaw, roll = np.radians(self.rotations[dirty]).T
+		cx, sx = np.cos(pitch), np.sin(pitch)
+		cy, sy = np.cos(yaw), np.sin(yaw)
+		cz, sz = np.cos(roll), np.sin(roll)
+
+		# Rx * Ry * Rz expanded, row-major (math) order
+		rotation = np.empty((len(dirty), 3, 3), dtype = np.float32)
+		rotation[:, 0, 0] = cy * cz
+		rotation[:, 0, 1] = -cy * sz
+		rotation[:, 0, 2] = sy
+		rotation[:, 1, 0] = sx * sy * cz + cx * sz
+		rotation[:, 1, 1] = -sx * sy * sz + cx * cz
+		rotation[:, 1, 2] = -sx * cy
+		rotation[:, 2, 0] = -cx * sy * cz + sx * sz
+		rotation[:, 2, 1] = cx * sy * sz + sx * cz
+		rotation[:, 2, 2] = cx * cy
+
+		# Column-major storage: matrices[i, column, row]
+		local = np.zeros((len(dirty), 4, 4), dtype = np.float32)
+		local[:, :3, :3] = (rotation * self.scales[dirty][:, None, :]).transpose(0, 2, 1)
+		local[:, 3, :3] = self.positions[dirty]
+		local[:, 3, 3] = 1
+		self.localMatrices[dirty] = local
+		self.dirty[dirty] = False
+
+		# Subtrees under the dirty slots need new world matrices too
+		affected = dirty
+		parentsDirty = dirty[self.hasChildren[dirty]]
+		if len(parentsDirty) > 0:
+			affected = np.union1d(dirty, self.Descendants(parentsDirty))
+
+		# Level by level from the roots down, so each parent is done before its
+		# children. Column-major storage turns parent * local into local @ parent.
+		order = affected[np.argsort(self.depths[affected], kind = "stable")]
+		levels, starts = np.unique(self.depths[order], return_index = True)
+		ends = np.append(starts[1:], len(order))
+
+		for depth, start, end in zip(levels, starts, ends):
+			level = order[start:end]
+			if depth == 0:
+				self.matrices[level] = self.localMatrices[level]
+			else:
+				self.matrices[level] = self.localMatrices[level] @ self.matrices[self.parents[level]]
+
+		for index in affected.tolist():
+			self.glmMatrices[index] = None
+
+		return len(affected)
+
+
+	def GetMatrix(self, index):
+		# World matrix of the slot as a glm.mat4. A child is also stale when
+		# any of its ancestors is dirty.
+		if self.dirty[index] or (self.parents[index] >= 0 and self.dirty[:self.count].any()):
+			self.Update()
+		matrix = self.glmMatrices[index]
+		if matrix is None:
+			matrix = self.glmMatrices[index] = glm.mat4.from_bytes(self.matrices[index].tobytes())
+		return matrix
+
+
+# Shared by every Model and SceneNode; Renderer.Render updates it once per frame
+transforms = TransformSystem()
+
+
+# Attribute names that write vec3 components (x, xy, rgb, ...)
+_COMPONENTS = set("xyzrgbstp")
+
+
+class TransformVector(glm.vec3):
+	# A glm.vec3 with the values of one row of a TransformSystem array, so it
+	# works anywhere the glm.vec3 Model attributes used to (arithmetic, glm
+	# functions, ==). Writes to it (components, swizzles, +=) go back to the
+	# row and mark the slot dirty.
+	# The owner lives in __dict__ directly: glm.vec3 reads attribute names
+	# as swizzles.
+
+	def __init__(self, system, name, index):
+		super().__init__(*getattr(system, name)[index].tolist())
+		self.__dict__["owner"] = (system, name, index)
+
+
+	def _Write(self):
+		system, name, index = self.__dict__["owner"]
+		getattr(system, name)[index] = self
+		system.dirty[index] = True
+
+
+	def __setattr__(self, name, value):
+		super().__setattr__(name, value)
+		if set(name) <= _COMPONENTS:
+			self._Write()
+
+
+	def __setitem__(self, component, value):
+		super().__setitem__(component, value)
+		self._Write()
+
+
+	def __iadd__(self, other):
+		super().__iadd__(other)
+		self._Write()
+		return self
+
+
+	def __isub__(self, other):
+		super().__isub__(other)
+		self._Write()
+		return self
+
+
+	def __imul__(self, other):
+		super().__imul__(other)
+		self._Write()
+		return self
+
+
+	def __itruediv__(self, other):
+		super().__itruediv__(other)
+		self._Write()
+		return self
+
+
+	def ToVec3(self):
+		return glm.vec3(self)
+
+
+	def __repr__(self):
+		return f"TransformVector({self.x}, {self.y}, {self.z})"
+
+
+class Transformable(object):
+	# position / rotation / scale stored in a TransformSystem slot, plus the
+	# parent / children links of the scene graph. Base of Model and SceneNode.
+
+	def InitTransform(self, system = None):
+		self.transforms = transforms if system is None else system
+		self.AddTransform()
+		self.parent = None
+		self.children = []
+
+
+	def AddTransform(self, position = (0, 0, 0), rotation = (0, 0, 0), scale = (1, 1, 1)):
+		# Takes a new slot, given back by ReleaseTransform or when the object
+		# is garbage collected
+		self.transformIndex = self.transforms.Add(position, rotation, scale)
+		self.transformRelease = weakref.finalize(self, self.transforms.Remove, self.transformIndex)
+
+
+	def ReleaseTransform(self):
+		# Frees the slot now (it runs at most once); the object must not be
+		# drawn or moved afterwards
+		for child in list(self.children):
+			child.SetParent(None)
+		if self.parent is not None:
+			self.parent.children.remove(self)
+			self.parent = None
+		self.transformRelease()
+
+
+	def _SetTransform(self, name, value):
+		getattr(self.transforms, name)[self.transformIndex] = value
+		self.transforms.dirty[self.transformIndex] = True
+
+
+	# Live views into the transform arrays: both `model.position = glm.vec3(...)`
+	# and `model.rotation.y = 180` mark the matrix dirty
+	position = property(lambda self: TransformVector(self.transforms, "positions", self.transformIndex),
+						lambda self, value: self._SetTransform("positions", value))
+	rotation = property(lambda self: TransformVector(self.transforms, "rotations", self.transformIndex),
+						lambda self, value: self._SetTransform("rotations", value))
+	scale = property(lambda self: TransformVector(self.transforms, "scales", self.transformIndex),
+					 lambda self, value: self._SetTransform("scales", value))
+
+
+	def SetParent(self, parent):
+		# parent = None detaches the node; its transform is then relative to the world
+		if parent is not None and parent.transforms is not self.transforms:
+			raise ValueError("Padre e hijo deben usar el mismo TransformSystem")
+
+		self.transforms.SetParent(self.transformIndex, -1 if parent is None else parent.transformIndex)
+
+		if self.parent is not None:
+			self.parent.children.remove(self)
+		self.parent = parent
+		if parent is not None:
+			parent.children.append(self)
+
+
+	def AddChild(self, child):
+		child.SetParent(self)
+		return child
+
+
+	def GetModelMatrix(self):
+		# Cached world matrix (parent world * T * Rx * Ry * Rz * S),
+		# recomputed in batch only when dirty
+		return self.transforms.GetMatrix(self.transformIndex)
@@ -1,3 +1,5 @@
+from frameUniforms import FRAME_UNIFORMS_BLOCK
+
 vertex_shader = '''
 #version 330 core
 
@@ -10,8 +12,7 @@ out vec3 fragNormal;
 out vec4 fragPosition;
 
 uniform mat4 modelMatrix;
-uniform mat4 viewMatrix;
-uniform mat4 projectionMatrix;
+''' + FRAME_UNIFORMS_BLOCK + '''
 
 void main()
 {
@@ -36,10 +37,7 @@ out vec3 fragNormal;
 out vec4 fragPosition;
 
 uniform mat4 modelMatrix;
-uniform mat4 viewMatrix;
-uniform mat4 projectionMatrix;
-uniform float time;
-uniform float value;
+''' + FRAME_UNIFORMS_BLOCK + '''
 
 void main()
 {
@@ -80,10 +78,7 @@ out vec3 fragNormal;
 out vec4 fragPosition;
 
 uniform mat4 modelMatrix;
-uniform mat4 viewMatrix;
-uniform mat4 projectionMatrix;
-uniform float time;
-uniform float value;
+''' + FRAME_UNIFORMS_BLOCK + '''
 
 void main()
 {
@@ -118,10 +113,7 @@ out vec3 fragNormal;
 out vec4 fragPosition;
 
 uniform mat4 modelMatrix;
-uniform mat4 viewMatrix;
-uniform mat4 projectionMatrix;
-uniform float time;
-uniform float value;
+''' + FRAME_UNIFORMS_BLOCK + '''
 
 void main()
 {
@@ -154,3 +146,14 @@ void main()
 }
 
 '''
+
+# INSTANCED VARIANTS: modelMatrix comes from a per-instance mat4 attribute
+# (locations 3-6, see model.InstancedModel) instead of a uniform
+def MakeInstanced(vertexShader):
+    return vertexShader.replace("uniform mat4 modelMatrix;",
+                                "layout (location = 3) in mat4 modelMatrix;")
+
+instanced_vertex_shader = MakeInstanced(vertex_shader)
+instanced_spiral_shader = MakeInstanced(spiral_shader)
+instanced_pulse_shader = MakeInstanced(pulse_shader)
+instanced_glitch_shader = MakeInstanced(glitch_shader)